@@ -5,6 +5,14 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Поток событий /events/ (SSE, tasks/views_events.py) работает только под ASGI-сервером:
+    uvicorn taskmanager.asgi:application --workers 4
+и включается настройкой SSE_ENABLED = True. По умолчанию он выключен: проект развёрнут через gunicorn
+(WSGI, taskmanager.wsgi), а там StreamingHttpResponse с асинхронным генератором сначала читается
+целиком — браузер получил бы события только через SSE_MAX_STREAM_SECONDS, а каждая вкладка держала бы
+синхронный воркер. Переход: запустить uvicorn вместо gunicorn (тот же сокет в nginx, с
+proxy_buffering off для /events/) и только после этого включить SSE_ENABLED.
 """
 
 import os
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'tasks.middleware.profiling.RequestProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,6 +72,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'tasks.context_processors.unread_notifications',
+                'tasks.context_processors.event_stream',
             ],
         },
     },
@@ -84,11 +86,72 @@ WSGI_APPLICATION = 'taskmanager.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 с WAL, busy_timeout и BEGIN IMMEDIATE (см. taskmanager/sqlite_backend/base.py)
+        'ENGINE': 'taskmanager.sqlite_backend',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # дополняют/переопределяют DEFAULT_PRAGMAS бэкенда
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 5000,
+            },
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # соединение переиспользуется между запросами воркера, перед повторным использованием проверяется
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Кеш общий для всех воркеров gunicorn (файловый, без внешних сервисов)
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': 300,
     }
 }
 
+# Сколько секунд держать в кеше сотрудника запроса (отдел, роль, замещение)
+EMPLOYEE_CONTEXT_CACHE_TIMEOUT = 300
+
+# Справочник сотрудников и отделов для форм выбора: сколько держать собранный JSON в кеше сервера
+# и сколько браузер хранит справочник по адресу с версией (после изменений адрес меняется)
+EMPLOYEE_DIRECTORY_CACHE_TIMEOUT = 24 * 60 * 60
+EMPLOYEE_DIRECTORY_MAX_AGE = 365 * 24 * 60 * 60
+
+# Сводка непрочитанных уведомлений для навбара (обновляется при записи)
+UNREAD_NOTIFICATIONS_CACHE_TIMEOUT = 600
+
+# Профилирование запросов (SQL, шаблоны, Server-Timing) для всех запросов.
+# Без этой настройки staff-пользователи могут включить его для одного запроса параметром ?_profile=1
+REQUEST_PROFILING = False
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'profiling_file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': BASE_DIR / 'profiling.log',
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'encoding': 'utf-8',
+        },
+    },
+    'loggers': {
+        'tasks.profiling': {
+            'handlers': ['profiling_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -141,3 +204,48 @@ LOGOUT_REDIRECT_URL = '/accounts/login/'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Кто передаёт файлы из представлений скачивания (tasks/views_files.py):
+# None — сам Django (потоково, с поддержкой Range); "x-accel-redirect" — nginx; "x-sendfile" — apache/lighttpd.
+# Для nginx: location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+FILE_DOWNLOAD_OFFLOAD = None
+FILE_DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# Хранилище с дедупликацией (tasks/utils/storage.py): файл без ссылок, сохранённый или переиспользованный
+# позже этого срока, не удаляется — его подберёт периодическая sweep_unreferenced
+CONTENT_STORAGE_GRACE_SECONDS = 15 * 60
+
+# Очередь фоновых задач в БД (tasks/utils/jobs.py), исполняется командой run_worker
+JOBS_RUN_INLINE = False        # True — выполнять сразу после коммита, без воркера (тесты, отладка)
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 10    # задержка повтора: 10 с, 20 с, 40 с, ...
+JOB_RETRY_MAX_SECONDS = 3600
+JOB_LEASE_SECONDS = 600        # задача в running дольше этого — воркер считается упавшим
+
+# Планировщик периодических задач (tasks/utils/scheduler.py), команда run_scheduler вместо cron
+SCHEDULER_LEASE_SECONDS = 90   # лидер, не продливший аренду за это время, считается упавшим
+TASK_REMINDER_DAYS = 1         # напоминать о задачах со сроком сегодня и в ближайшие N дней
+
+# Полнотекстовый поиск (tasks/utils/search.py); после смены токенизатора/конфигурации — rebuild_search_index
+SEARCH_FTS5_TOKENIZE = 'unicode61 remove_diacritics 2'  # SQLite FTS5: кириллица и казахские буквы
+SEARCH_CONFIG = 'russian'                               # PostgreSQL: конфигурация to_tsvector (казахской нет — 'simple')
+SEARCH_STEMMING_LANGUAGES = ('ru', 'kk')                # отсечение окончаний у слов запроса
+
+# Извлечение текста из планов и вложений (tasks/utils/text_extraction.py) — лимиты на один файл
+TEXT_EXTRACTION_MAX_CHARS = 2_000_000
+TEXT_EXTRACTION_MAX_ROWS = 100_000     # строк на лист xlsx
+TEXT_EXTRACTION_MAX_PAGES = 500        # страниц pdf
+
+# SSE-поток событий (tasks/utils/events.py, /events/): уведомления и изменения карточек без опроса.
+# Включать только под ASGI-сервером (uvicorn taskmanager.asgi:application, см. asgi.py): под WSGI (gunicorn)
+# ответ-поток собирается целиком до отправки, и каждая открытая вкладка занимает воркер на SSE_MAX_STREAM_SECONDS.
+# Выключено — страницы обновляют счётчики опросом, /events/ отвечает 204.
+SSE_ENABLED = False
+SSE_POLL_INTERVAL = 1.0          # как часто процесс читает новые события из БД (один запрос на процесс)
+SSE_KEEPALIVE_SECONDS = 15       # комментарий-пинг, чтобы прокси не закрывали простаивающее соединение
+SSE_MAX_STREAM_SECONDS = 300     # затем поток закрывается, браузер переподключается с Last-Event-ID
+SSE_EVENT_RETENTION_HOURS = 24   # старые события удаляет планировщик (prune_stream_events)
+SSE_REORDER_WINDOW_SECONDS = 5   # окно перечитывания: на PostgreSQL меньший id может закоммититься позже
+
+# Превью планов и вложений (tasks/utils/previews.py): строятся воркером очереди после сохранения файла
+PREVIEW_FONT_PATH = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
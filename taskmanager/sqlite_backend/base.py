@@ -0,0 +1,52 @@
+"""
+SQLite-бэкенд для продакшена под несколькими воркерами gunicorn.
+
+Отличия от django.db.backends.sqlite3:
+- при каждом подключении выполняются PRAGMA из OPTIONS["pragmas"] (по умолчанию WAL,
+  synchronous=NORMAL, busy_timeout, mmap и увеличенный кеш страниц);
+- транзакции atomic() открываются как BEGIN IMMEDIATE (OPTIONS["transaction_mode"]):
+  блокировка на запись берётся сразу, и busy_timeout работает. При обычном BEGIN (DEFERRED)
+  транзакция, которая сначала читает, а потом пишет, получает "database is locked" без ожидания.
+
+Пример:
+    DATABASES = {"default": {
+        "ENGINE": "taskmanager.sqlite_backend",
+        "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {"pragmas": {"busy_timeout": 10000}, "transaction_mode": "IMMEDIATE"},
+    }}
+Заданные pragmas дополняют DEFAULT_PRAGMAS; значение None отключает pragma по умолчанию.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,           # мс ожидания блокировки вместо немедленной ошибки
+    "mmap_size": 128 * 1024 * 1024,
+    "cache_size": -32000,           # отрицательное значение — в КиБ (~32 МБ на соединение)
+    "temp_store": "MEMORY",
+}
+TRANSACTION_MODES = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # свои ключи не передаём в sqlite3.connect()
+        self.pragmas = {**DEFAULT_PRAGMAS, **(params.pop("pragmas", None) or {})}
+        self.transaction_mode = (params.pop("transaction_mode", None) or "IMMEDIATE").upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"transaction_mode должен быть одним из {TRANSACTION_MODES}")
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            if value is not None:
+                conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f"BEGIN {self.transaction_mode}")
@@ -15,10 +15,10 @@ urlpatterns = [
     path('', include('tasks.urls')),
 ]
 
-# ✅ чтобы Django знал, где искать файлы медиа (если будут)
+# ✅ чтобы Django знал, где искать статику
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Медиа (планы, вложения) напрямую не раздаём даже при DEBUG: только через представления
+# tasks/views_files.py с проверкой прав
 
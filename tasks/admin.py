@@ -1,7 +1,8 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import (
     Employee, Department, Task, EventCard, 
-    TaskHistory, CardApproverOrder, Category, TaskAttachment
+    TaskHistory, CardApproverOrder, Category, TaskAttachment, Job, PeriodicTask
 )
 
 
@@ -41,6 +42,7 @@ class EventCardAdmin(admin.ModelAdmin):
     list_filter = ("plan_status", "visible", "start_date", "categories", "responsible_department",)
     search_fields = ("title", "description")
     filter_horizontal = ("categories", "shared_departments", "approvers")
+    list_select_related = ("created_by__user", "responsible_department", "counters")
 
 
 # 🔹 Inline для истории задач
@@ -70,3 +72,31 @@ class TaskAdmin(admin.ModelAdmin):
     filter_horizontal = ("cc", "recipients")
 
     inlines = [TaskAttachmentInline, TaskHistoryInline]
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "func", "status", "attempts", "max_attempts", "run_at", "finished_at")
+    list_filter = ("status", "func")
+    readonly_fields = ("created_at", "locked_by", "locked_at", "finished_at", "last_error")
+    actions = ("requeue",)
+
+    @admin.action(description="Повторить (вернуть в очередь)")
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status="running").update(
+            status="queued", attempts=0, run_at=timezone.now(), last_error="",
+        )
+        self.message_user(request, f"Возвращено в очередь: {count}")
+
+
+@admin.register(PeriodicTask)
+class PeriodicTaskAdmin(admin.ModelAdmin):
+    list_display = ("name", "enabled", "next_run_at", "last_run_at", "missed_runs", "total_runs")
+    list_editable = ("enabled",)
+    readonly_fields = ("last_run_at", "missed_runs", "total_runs")
+    actions = ("run_now",)
+
+    @admin.action(description="Запустить при следующей проверке планировщика")
+    def run_now(self, request, queryset):
+        count = queryset.update(next_run_at=timezone.now())
+        self.message_user(request, f"Будет запущено: {count}")
@@ -7,3 +7,8 @@ class TasksConfig(AppConfig):
 
     def ready(self):
         import tasks.signals
+        from tasks.middleware.profiling import install_template_timing
+        from tasks.utils.policy import compile_rules
+
+        compile_rules()
+        install_template_timing()
@@ -1,12 +1,18 @@
-from tasks.models import Notification
+from django.conf import settings
+
+from tasks.utils.notifications import UnreadNotifications
 
 def unread_notifications(request):
     if request.user.is_authenticated:
-        notifs = Notification.objects.filter(user=request.user).order_by("-created_at")
+        # методы, а не значения: шаблон вызовет их только если реально выводит навбар
+        notifs = UnreadNotifications(request.user.pk)
         return {
-            "unread_notifications": notifs.filter(is_read=False).count(),
-            "last_notifications": notifs.filter(is_read=False)[:3],
+            "unread_notifications": notifs.count,
+            "last_notifications": notifs.latest,
         }
     return {}
 
 
+def event_stream(request):
+    # поток событий (SSE) включают только под ASGI-сервером, иначе страницы обновляются опросом
+    return {"sse_enabled": getattr(settings, "SSE_ENABLED", False)}
@@ -3,6 +3,8 @@ from functools import wraps
 from django.contrib import messages
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
+from .utils.employee_context import get_employee_context
+from .utils.policy import get_policy
 
 def role_required(*roles):
     """
@@ -14,8 +16,28 @@ def role_required(*roles):
         @wraps(view_func)
         @login_required
         def _wrapped(request, *args, **kwargs):
-            emp = getattr(request.user, "employee", None)
-            if not emp or emp.role not in roles:
+            context = get_employee_context(request)
+            if not context or context.role not in roles:
+                messages.error(request, "Недостаточно прав для выполнения этого действия.")
+                return redirect("task_list")
+            return view_func(request, *args, **kwargs)
+        return _wrapped
+    return decorator
+
+
+def policy_required(action):
+    """
+    То же для правил из tasks.utils.policy (действие без объекта). Как и role_required,
+    проверяется сам сотрудник, а не тот, кого он замещает.
+    Пример:
+        @policy_required("card.create")
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        @login_required
+        def _wrapped(request, *args, **kwargs):
+            context = get_employee_context(request)
+            if not context or not get_policy(request, context.employee).can(action):
                 messages.error(request, "Недостаточно прав для выполнения этого действия.")
                 return redirect("task_list")
             return view_func(request, *args, **kwargs)
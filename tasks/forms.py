@@ -1,5 +1,5 @@
 from django import forms
-from django.db.models import Q
+from tasks.utils.policy import Policy
 from .models import Task, Employee,EventCard, Department, Category
 
 
@@ -34,20 +34,9 @@ class TaskForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields["status"].required = False
 
+        # кому можно назначать задачи — правило "employee.assign_task" (tasks.utils.policy)
         employee = getattr(user, "employee", None)
-        if employee:
-            if employee.role == "director":
-                self.fields["recipients"].queryset = Employee.objects.all()
-            elif employee.role == "deputy":
-                self.fields["recipients"].queryset = Employee.objects.exclude(role="director")
-            elif employee.role in ["head", "senior"]:
-                self.fields["recipients"].queryset = Employee.objects.filter(
-                    Q(department=employee.department) | Q(role__in=["head", "senior"])
-                ).exclude(id=employee.id)
-            else:
-                self.fields["recipients"].queryset = Employee.objects.none()
-        else:
-            self.fields["recipients"].queryset = Employee.objects.none()
+        self.fields["recipients"].queryset = Policy(employee).filter("employee.assign_task", Employee.objects.all())
 
         self.fields["assigned_employee"].queryset = Employee.objects.all()
         self.fields["cc"].queryset = Employee.objects.all()
@@ -0,0 +1,125 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from tasks.models import Notification, Task, TaskHistory
+
+
+# Индексы из миграции 0027, которые сравниваем "до/после"
+BENCHMARKED_MODELS = (Task, TaskHistory, Notification)
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает EXPLAIN и время горячих запросов доски и карточек. "
+        "С --compare дополнительно замеряет те же запросы без составных индексов "
+        "(индексы удаляются внутри транзакции, которая затем откатывается). "
+        "Запускать на заполненной базе (см. seed_load_data или копию рабочей)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="Сколько раз выполнять каждый запрос")
+        parser.add_argument("--compare", action="store_true", help="Сравнить с планами без индексов")
+
+    def handle(self, *args, **options):
+        if options["compare"] and connection.vendor not in ("sqlite", "postgresql"):
+            raise CommandError("--compare поддерживается только для SQLite и PostgreSQL (транзакционный DDL).")
+
+        queries = self.hot_queries()
+        if not queries:
+            raise CommandError("В базе нет задач — сначала заполните её данными.")
+
+        before = None
+        if options["compare"]:
+            # свежее соединение до и после: иначе SQLite покажет EXPLAIN из закешированного плана
+            connection.close()
+            with transaction.atomic():
+                self.drop_benchmarked_indexes()
+                before = self.measure(queries, options["repeat"])
+                transaction.set_rollback(True)
+            connection.close()
+        after = self.measure(queries, options["repeat"])
+
+        for name in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {name}"))
+            if before:
+                self.stdout.write(f"-- без индексов: {before[name]['median_ms']:.2f} ms (медиана)")
+                self.stdout.write(before[name]["plan"])
+            self.stdout.write(f"-- с индексами: {after[name]['median_ms']:.2f} ms (медиана)")
+            self.stdout.write(after[name]["plan"])
+
+    def hot_queries(self):
+        """Запросы в том виде, в каком их строят представления, с самыми "тяжёлыми" параметрами."""
+        busiest_employee = (
+            Task.objects.filter(assigned_employee__isnull=False).values("assigned_employee")
+            .annotate(n=Count("id")).order_by("-n").values_list("assigned_employee", flat=True).first()
+        )
+        busiest_department = (
+            Task.objects.filter(assigned_department__isnull=False).values("assigned_department")
+            .annotate(n=Count("id")).order_by("-n").values_list("assigned_department", flat=True).first()
+        )
+        busiest_card = (
+            Task.objects.filter(card__isnull=False).values("card")
+            .annotate(n=Count("id")).order_by("-n").values_list("card", flat=True).first()
+        )
+        busiest_user = (
+            Notification.objects.values("user").annotate(n=Count("id"))
+            .order_by("-n").values_list("user", flat=True).first()
+        )
+        busiest_task = (
+            TaskHistory.objects.values("task").annotate(n=Count("id"))
+            .order_by("-n").values_list("task", flat=True).first()
+        )
+        if busiest_employee is None and busiest_card is None:
+            return {}
+
+        urgent_deadline = timezone.now().date() + timedelta(days=3)
+        return {
+            "task_list: срочные задачи сотрудника": Task.objects.filter(
+                assigned_employee=busiest_employee,
+                due_date__isnull=False, due_date__lte=urgent_deadline,
+                status__in=["new", "in_progress"],
+            ).order_by("due_date"),
+            "task_list: срочные задачи отдела": Task.objects.filter(
+                assigned_department=busiest_department,
+                due_date__isnull=False, due_date__lte=urgent_deadline,
+                status__in=["new", "in_progress"],
+            ).order_by("due_date"),
+            "task_list: задачи на проверку": Task.objects.filter(
+                assigned_employee=busiest_employee, task_type__in=["approval", "review"],
+            ).exclude(status="done").order_by("-created_at"),
+            "card_detail: фильтр по типу и статусу": Task.objects.filter(
+                card=busiest_card, task_type="regular", status="new",
+            ),
+            "navbar: непрочитанные уведомления": Notification.objects.filter(
+                user=busiest_user, is_read=False,
+            ).order_by("-created_at")[:3],
+            "task_review: последняя отправка на проверку": TaskHistory.objects.filter(
+                task=busiest_task, action__in=["sent_for_review", "executed", "execution_updated"],
+            ).order_by("-timestamp")[:1],
+        }
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {
+                "plan": queryset.explain(),
+                "median_ms": statistics.median(timings),
+            }
+        return results
+
+    def drop_benchmarked_indexes(self):
+        with connection.cursor() as cursor:
+            for model in BENCHMARKED_MODELS:
+                for index in model._meta.indexes:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
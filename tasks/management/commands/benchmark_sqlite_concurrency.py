@@ -0,0 +1,143 @@
+import multiprocessing
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+from tasks.models import Employee, Notification, Task, TaskHistory
+
+# Настройки "как было": голый django.db.backends.sqlite3 (журнал DELETE, synchronous=FULL,
+# BEGIN DEFERRED, стандартный таймаут sqlite3.connect — 5 с)
+PLAIN_OPTIONS = {
+    "pragmas": {
+        "journal_mode": "DELETE", "synchronous": "FULL", "busy_timeout": None,
+        "mmap_size": None, "cache_size": None, "temp_store": None,
+    },
+    "transaction_mode": "DEFERRED",
+}
+
+
+def _percentile(values, percent):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def _worker(db_path, options, duration, write_ratio, seed, employee_ids, results):
+    """Процесс-воркер: как воркер gunicorn, по очереди читает списки задач и пишет историю/уведомления."""
+    connection.settings_dict["NAME"] = db_path
+    connection.settings_dict["OPTIONS"] = options
+    rng = random.Random(seed)
+    stats = {"read": [], "write": [], "locked": 0}
+
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        employee_id = rng.choice(employee_ids)
+        started = time.perf_counter()
+        try:
+            if rng.random() < write_ratio:
+                # как task_execute/notify: прочитать задачу и записать историю + уведомление
+                with transaction.atomic():
+                    task = Task.objects.filter(assigned_employee_id=employee_id).only("id").first()
+                    if task:
+                        TaskHistory.objects.create(task=task, employee_id=employee_id, action="taken")
+                    Notification.objects.create(
+                        user_id=Employee.objects.values_list("user_id", flat=True).get(pk=employee_id),
+                        message="Нагрузочный тест",
+                    )
+                kind = "write"
+            else:
+                # как task_list: счётчик и первая страница задач сотрудника
+                Task.objects.filter(assigned_employee_id=employee_id).exclude(status="done").count()
+                list(Task.objects.filter(assigned_employee_id=employee_id).order_by("-created_at")[:20])
+                kind = "read"
+        except OperationalError:
+            stats["locked"] += 1
+            continue
+        stats[kind].append((time.perf_counter() - started) * 1000)
+
+    connection.close()
+    results.put(stats)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает SQLite под смешанной нагрузкой чтение/запись из нескольких процессов: "
+        "стандартные настройки sqlite3 против настроек из DATABASES (WAL, busy_timeout, BEGIN IMMEDIATE). "
+        "Работает на временной копии текущей базы — рабочие данные не меняются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Число параллельных процессов")
+        parser.add_argument("--duration", type=float, default=10, help="Секунд на каждый режим")
+        parser.add_argument("--write-ratio", type=float, default=0.2, help="Доля операций записи")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Команда предназначена только для SQLite.")
+        employee_ids = list(Employee.objects.filter(tasks__isnull=False).distinct().values_list("id", flat=True))
+        if not employee_ids:
+            raise CommandError("В базе нет задач — сначала запустите seed_load_data.")
+
+        configured = dict(connection.settings_dict["OPTIONS"])
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = str(Path(tmp) / "bench.sqlite3")
+            # backup API даёт целостную копию даже при открытых соединениях
+            connection.ensure_connection()
+            target = sqlite3.connect(db_path)
+            connection.connection.backup(target)
+            target.close()
+            connection.close()
+
+            for label, mode_options in (("sqlite3 по умолчанию", PLAIN_OPTIONS), ("настройки DATABASES", configured)):
+                self.reset_journal_mode(db_path, mode_options)
+                report = self.run_mode(db_path, mode_options, employee_ids, options)
+                self.print_report(label, report, options["duration"])
+
+    def reset_journal_mode(self, db_path, mode_options):
+        # режим журнала хранится в файле базы — переключаем его до запуска воркеров
+        journal_mode = (mode_options.get("pragmas") or {}).get("journal_mode") or "WAL"
+        conn = sqlite3.connect(db_path)
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        conn.close()
+
+    def run_mode(self, db_path, mode_options, employee_ids, options):
+        # fork: дочерние процессы наследуют настроенный Django; соединение родителя закрыто заранее
+        ctx = multiprocessing.get_context("fork")
+        results = ctx.Queue()
+        processes = [
+            ctx.Process(target=_worker, args=(
+                db_path, mode_options, options["duration"], options["write_ratio"],
+                options["seed"] + i, employee_ids, results,
+            ))
+            for i in range(options["workers"])
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        merged = {"read": [], "write": [], "locked": 0}
+        for stats in collected:
+            merged["read"] += stats["read"]
+            merged["write"] += stats["write"]
+            merged["locked"] += stats["locked"]
+        return merged
+
+    def print_report(self, label, report, duration):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {label}"))
+        total = len(report["read"]) + len(report["write"])
+        self.stdout.write(f"операций/с: {total / duration:.0f}, ошибок 'database is locked': {report['locked']}")
+        for kind in ("read", "write"):
+            values = report[kind]
+            self.stdout.write(
+                f"  {kind}: {len(values)} шт., p50 {_percentile(values, 50):.2f} ms, "
+                f"p99 {_percentile(values, 99):.2f} ms, max {max(values, default=0):.2f} ms"
+            )
@@ -0,0 +1,61 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from tasks.models import EventCard, Task
+from tasks.utils.benchmark import build_scenarios, compare_results, run_scenario
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет основные страницы через тестовый клиент Django: перцентили задержки, "
+        "число SQL-запросов и суммарное время SQL. Результат пишется в JSON; "
+        "с --baseline печатается сравнение с прошлым прогоном. Запускать на данных seed_load_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="Замеров на каждую страницу")
+        parser.add_argument("--warmup", type=int, default=2, help="Прогревочных запросов (не учитываются)")
+        parser.add_argument("--only", nargs="*", help="Замерять только эти сценарии")
+        parser.add_argument("--output", help="Куда записать JSON (по умолчанию — в stdout)")
+        parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+
+    def handle(self, *args, **options):
+        scenarios = build_scenarios()
+        if not scenarios:
+            raise CommandError("Недостаточно данных — сначала запустите seed_load_data.")
+        if options["only"]:
+            scenarios = [s for s in scenarios if s.name in options["only"]]
+
+        results = {}
+        for scenario in scenarios:
+            results[scenario.name] = run_scenario(scenario, options["repeat"], options["warmup"])
+            self.stderr.write(
+                f"{scenario.name}: p50 {results[scenario.name]['p50_ms']} ms, "
+                f"{results[scenario.name]['queries']} запросов"
+            )
+
+        report = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "vendor": connection.vendor,
+                "repeat": options["repeat"],
+                "tasks": Task.objects.count(),
+                "cards": EventCard.objects.count(),
+            },
+            "results": results,
+        }
+        payload = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(payload, encoding="utf-8")
+        else:
+            self.stdout.write(payload)
+
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text(encoding="utf-8"))["results"]
+            for name, metrics in compare_results(baseline, results).items():
+                changes = ", ".join(f"{metric} {old} → {new}" for metric, (old, new) in metrics.items())
+                self.stderr.write(f"{name}: {changes}")
@@ -0,0 +1,36 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from tasks.utils.storage import FILE_FIELDS
+from tasks.utils.text_extraction import extract_file_text, is_supported
+
+
+class Command(BaseCommand):
+    help = (
+        "Извлекает текст из всех планов и вложений, загруженных раньше (docx, xlsx, pdf, txt, csv). "
+        "Уже обработанное содержимое пропускается."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Извлечь заново, даже если текст уже есть")
+
+    def handle(self, *args, **options):
+        names = set()
+        for model_label, field_name in FILE_FIELDS:
+            model = apps.get_model(model_label)
+            names.update(
+                model.objects.exclude(**{f"{field_name}__isnull": True}).exclude(**{field_name: ""})
+                .values_list(field_name, flat=True).order_by().distinct()
+            )
+
+        supported = sorted(name for name in names if is_supported(name))
+        done = failed = 0
+        for name in supported:
+            result = extract_file_text(name, force=options["force"])
+            if result is None or result.status != "ok":
+                failed += 1
+            else:
+                done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Файлов: {len(names)}, поддерживаемых: {len(supported)}, с текстом: {done}, ошибок: {failed}"
+        ))
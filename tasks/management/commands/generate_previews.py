@@ -0,0 +1,30 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from tasks.utils.previews import generate_preview, has_preview
+from tasks.utils.storage import FILE_FIELDS
+
+
+class Command(BaseCommand):
+    help = "Строит недостающие превью (PNG и HTML) для всех планов и вложений — для файлов, загруженных раньше."
+
+    def handle(self, *args, **options):
+        names = set()
+        for model_label, field_name in FILE_FIELDS:
+            model = apps.get_model(model_label)
+            names.update(
+                model.objects.exclude(**{f"{field_name}__isnull": True}).exclude(**{field_name: ""})
+                .values_list(field_name, flat=True).order_by().distinct()
+            )
+
+        built = skipped = 0
+        for name in sorted(names):
+            if has_preview(name):
+                continue
+            if generate_preview(name):
+                built += 1
+            else:
+                skipped += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Файлов: {len(names)}, построено превью: {built}, без превью (формат не поддерживается или ошибка): {skipped}"
+        ))
@@ -0,0 +1,76 @@
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tasks.utils.storage import CAS_PREFIX, FILE_FIELDS, content_digest, content_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит существующие планы и вложения в хранилище с дедупликацией по SHA-256 "
+        "(EventCard.plan_file, Task.attachment, TaskAttachment.file). Одинаковые файлы "
+        "(например, event_plans/contract_XXXX.docx) превращаются в один, ссылки в БД обновляются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source-root", default=str(settings.MEDIA_ROOT),
+            help="Каталог, относительно которого лежат старые файлы (по умолчанию MEDIA_ROOT)",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет сделано")
+        parser.add_argument("--keep-originals", action="store_true", help="Не удалять старые файлы после переноса")
+
+    def handle(self, *args, **options):
+        source_root = options["source_root"]
+        dry_run = options["dry_run"]
+
+        # старое имя -> новое (одно и то же имя может встречаться в нескольких полях и строках)
+        moved = {}
+        missing = set()
+        sizes = {}  # хеш содержимого -> размер (для отчёта об экономии места)
+        before_bytes = 0
+
+        with transaction.atomic():
+            for model_label, field_name in FILE_FIELDS:
+                model = apps.get_model(model_label)
+                names = list(
+                    model.objects.exclude(**{f"{field_name}__isnull": True})
+                    .exclude(**{field_name: ""})
+                    .exclude(**{f"{field_name}__startswith": f"{CAS_PREFIX}/"})
+                    .values_list(field_name, flat=True).order_by().distinct()
+                )
+                for old_name in names:
+                    if old_name not in moved and old_name not in missing:
+                        path = os.path.join(source_root, old_name)
+                        if not os.path.isfile(path):
+                            missing.add(old_name)
+                            self.stderr.write(f"Нет файла: {path}")
+                            continue
+                        size = os.path.getsize(path)
+                        before_bytes += size
+                        with open(path, "rb") as f:
+                            sizes[content_digest(File(f))] = size
+                            moved[old_name] = None if dry_run else content_storage.save(os.path.basename(old_name), File(f))
+
+                    if old_name in moved and not dry_run:
+                        model.objects.filter(**{field_name: old_name}).update(**{field_name: moved[old_name]})
+
+            if not dry_run and not options["keep_originals"]:
+                # старые файлы удаляем только после успешного коммита ссылок
+                transaction.on_commit(lambda: self.remove_originals(source_root, moved))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Файлов: {len(moved)}, уникальных после переноса: {len(sizes)}, "
+            f"объём: {before_bytes} → {sum(sizes.values())} байт, не найдено: {len(missing)}"
+            + (" (dry-run, ничего не изменено)" if dry_run else "")
+        ))
+
+    def remove_originals(self, source_root, moved):
+        for old_name, new_name in moved.items():
+            path = os.path.join(source_root, old_name)
+            if new_name and os.path.abspath(path) != os.path.abspath(content_storage.path(new_name)):
+                os.remove(path)
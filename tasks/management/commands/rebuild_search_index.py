@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tasks.models import SearchEntry
+from tasks.utils.search import create_search_index, drop_search_index, reindex_all
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересоздаёт полнотекстовый индекс (FTS5 / GIN) с текущими SEARCH_FTS5_TOKENIZE / SEARCH_CONFIG "
+        "и заново индексирует задачи, карточки и комментарии. Тексты планов извлекает run_worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--skip-plans", action="store_true", help="Не ставить в очередь индексацию планов")
+
+    def handle(self, *args, **options):
+        with connection.schema_editor() as editor:
+            drop_search_index(editor, SearchEntry)
+            create_search_index(editor, SearchEntry)
+        count = reindex_all(include_plans=not options["skip_plans"])
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано документов: {count}"))
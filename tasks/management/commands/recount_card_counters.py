@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from tasks.utils.counters import recount_card_counters
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает денормализованные счётчики задач карточек (исправляет расхождения)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("card_ids", nargs="*", type=int, help="ID карточек (по умолчанию — все)")
+
+    def handle(self, *args, **options):
+        card_ids = options["card_ids"] or None
+        count = recount_card_counters(card_ids)
+        self.stdout.write(self.style.SUCCESS(f"Пересчитаны счётчики {count} карточек."))
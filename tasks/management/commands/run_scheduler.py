@@ -0,0 +1,42 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tasks.utils.scheduler import default_owner, release_leadership, tick
+
+
+class Command(BaseCommand):
+    help = (
+        "Планировщик периодических задач вместо cron: ежемесячные карточки отделов, снятие истёкших замещений, "
+        "напоминания о сроках, пересчёт счётчиков. Задачи выполняет run_worker. "
+        "Можно запускать на нескольких серверах — задачи ставит только один (лидер)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=30.0, help="Период проверки расписания (с)")
+        parser.add_argument("--once", action="store_true", help="Один проход и выход")
+
+    def handle(self, *args, **options):
+        owner = default_owner()
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, lambda *_: stop.set())
+
+        leader = None
+        try:
+            while True:
+                close_old_connections()
+                started = tick(owner)
+                if (started is not None) != leader:
+                    leader = started is not None
+                    self.stdout.write(f"{owner}: {'лидер' if leader else 'ожидает, лидер — другой процесс'}")
+                for name in started or ():
+                    self.stdout.write(f"Поставлена в очередь: {name}")
+                if options["once"] or stop.wait(options["interval"]):
+                    break
+        finally:
+            # отдаём лидерство сразу, не дожидаясь истечения аренды
+            release_leadership(owner)
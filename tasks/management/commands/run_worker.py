@@ -0,0 +1,67 @@
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from tasks.utils.jobs import claim_job, purge_finished_jobs, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Воркер очереди фоновых задач (таблица tasks_job): превью, очистка файлов и т.п. "
+        "Несколько потоков (--concurrency), повторы с задержкой, отложенные задачи. "
+        "Останавливается по SIGTERM/SIGINT, дожидаясь текущих задач."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2, help="Число потоков-исполнителей")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Пауза (с), когда очередь пуста")
+        parser.add_argument("--burst", action="store_true", help="Выйти, когда в очереди не останется готовых задач")
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.poll_interval = options["poll_interval"]
+        self.burst = options["burst"]
+        self.processed = 0
+        self.lock = threading.Lock()
+        base_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, lambda *_: self.stop.set())
+
+        requeued = requeue_stale_jobs()
+        purged = purge_finished_jobs()
+        self.stdout.write(f"Воркер {base_id}: возвращено зависших задач {requeued}, удалено старых {purged}")
+
+        threads = [
+            threading.Thread(target=self.work, args=(f"{base_id}:{i}",), daemon=True)
+            for i in range(options["concurrency"])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stdout.write(self.style.SUCCESS(f"Воркер остановлен, выполнено задач: {self.processed}"))
+
+    def work(self, worker_id):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = claim_job(worker_id)
+                if job is None:
+                    if self.burst:
+                        break
+                    self.stop.wait(self.poll_interval)
+                    continue
+                ok = run_job(job)
+                with self.lock:
+                    self.processed += 1
+                if not ok:
+                    self.stderr.write(f"{job.func} #{job.pk}: ошибка, попытка {job.attempts}/{job.max_attempts}")
+        finally:
+            # у каждого потока своё соединение с БД
+            connection.close()
@@ -0,0 +1,319 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from tasks.models import (
+    CardApproverOrder, Category, Department, Employee, EventCard, Notification,
+    Task, TaskAttachment, TaskHistory,
+)
+from tasks.utils.counters import recount_card_counters
+from tasks.utils.visibility import refresh_card_visibility
+from tasks.utils.directory import invalidate_directory
+
+User = get_user_model()
+
+# все сгенерированные пользователи получают этот префикс логина
+USERNAME_PREFIX = "load_"
+PASSWORD = "load-test"
+
+CATEGORY_NAMES = ["Конференции", "Семинары", "Отчёты", "Закупки", "Внутренняя работа", "Выставки"]
+
+# (значение, вес) — примерное распределение на рабочей базе
+TASK_STATUS_WEIGHTS = [
+    ("done", 45), ("new", 20), ("in_progress", 20),
+    ("sent_for_review", 7), ("under_review", 5), ("rejected", 3),
+]
+TASK_TYPE_WEIGHTS = [("regular", 90), ("review", 7), ("approval", 3)]
+STAFF_ROLE_WEIGHTS = [("staff", 80), ("senior", 20)]
+
+# какие записи истории оставляет задача, дошедшая до статуса
+HISTORY_BY_STATUS = {
+    "new": ["created"],
+    "in_progress": ["created", "taken"],
+    "sent_for_review": ["created", "taken", "executed", "sent_for_review"],
+    "under_review": ["created", "taken", "executed", "sent_for_review", "under_review"],
+    "rejected": ["created", "taken", "executed", "rejected"],
+    "done": ["created", "taken", "executed", "done"],
+}
+
+
+def weighted(rng, weights):
+    values, w = zip(*weights)
+    return rng.choices(values, weights=w)[0]
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Временно отключает auto_now_add, чтобы bulk_create записал "исторические" даты."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу синтетическими данными для нагрузочного тестирования: отделы, сотрудники, "
+        "замещения, карточки с цепочками согласования, задачи, история, вложения и уведомления. "
+        "Всё создаётся bulk-вставками; при одинаковом --seed получается одинаковый набор данных."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--departments", type=int, default=10)
+        parser.add_argument("--employees", type=int, default=20, help="Сотрудников в каждом отделе")
+        parser.add_argument("--cards", type=int, default=500)
+        parser.add_argument("--tasks", type=int, default=200_000)
+        parser.add_argument("--notifications", type=int, default=50, help="Уведомлений на пользователя (в среднем)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError(
+                f"В базе уже есть пользователи {USERNAME_PREFIX}*: запускайте на чистой базе."
+            )
+        if options["departments"] < 1 or options["employees"] < 2:
+            raise CommandError("Нужен хотя бы один отдел и два сотрудника в отделе.")
+
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+        self.today = timezone.localdate()
+
+        with transaction.atomic():
+            departments = self.create_departments(options["departments"])
+            employees = self.create_employees(departments, options["employees"])
+            cards = self.create_cards(departments, employees, options["cards"])
+            tasks_count = self.create_tasks(cards, employees, options["tasks"])
+            notifications_count = self.create_notifications(employees, options["notifications"])
+            recount_card_counters([card.id for card in cards])
+        # сотрудники и отделы созданы bulk-вставками без сигналов — справочник для форм собираем заново
+        invalidate_directory()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: отделов {len(departments)}, сотрудников {len(employees)}, карточек {len(cards)}, "
+            f"задач {tasks_count}, уведомлений {notifications_count}. Пароль пользователей: {PASSWORD}"
+        ))
+
+    # --- Оргструктура ---
+
+    def create_departments(self, count):
+        departments = Department.objects.bulk_create([
+            Department(name=f"Нагрузочный отдел {i:03d}", shortname=f"НО-{i:03d}")
+            for i in range(1, count + 1)
+        ])
+        self.stdout.write(f"Отделы: {len(departments)}")
+        return departments
+
+    def create_employees(self, departments, per_department):
+        password = make_password(PASSWORD)  # хешируем один раз — это самая медленная часть
+        users, roles = [], []
+        for dept_index, dept in enumerate(departments):
+            for i in range(per_department):
+                users.append(User(
+                    username=f"{USERNAME_PREFIX}{dept_index:03d}_{i:03d}",
+                    first_name=f"Имя{i:03d}",
+                    last_name=f"Фамилия{dept_index:03d}",
+                    password=password,
+                ))
+                if dept_index == 0 and i == 0:
+                    role = "director"
+                elif dept_index == 0 and i in (1, 2):
+                    role = "deputy"
+                elif i == 0:
+                    role = "head"
+                else:
+                    role = weighted(self.rng, STAFF_ROLE_WEIGHTS)
+                roles.append((dept, role))
+
+        # bulk_create не шлёт post_save, поэтому Employee создаём сами
+        users = User.objects.bulk_create(users, batch_size=self.batch_size)
+        employees = Employee.objects.bulk_create([
+            Employee(user=user, department=dept, role=role, position=dict(Employee.ROLE_CHOICES)[role])
+            for user, (dept, role) in zip(users, roles)
+        ], batch_size=self.batch_size)
+
+        # ~5% сотрудников в активном замещении коллегой из своего отдела
+        by_department = {}
+        for emp in employees:
+            by_department.setdefault(emp.department_id, []).append(emp)
+        delegated = []
+        for emp in employees:
+            if self.rng.random() < 0.05:
+                colleagues = [e for e in by_department[emp.department_id] if e.pk != emp.pk]
+                emp.delegate_to = self.rng.choice(colleagues)
+                emp.delegate_until = self.today + timedelta(days=self.rng.randint(1, 30))
+                delegated.append(emp)
+        Employee.objects.bulk_update(delegated, ["delegate_to", "delegate_until"], batch_size=self.batch_size)
+
+        self.stdout.write(f"Сотрудники: {len(employees)}, из них в замещении: {len(delegated)}")
+        return employees
+
+    # --- Карточки ---
+
+    def create_cards(self, departments, employees, count):
+        categories = [
+            Category.objects.get_or_create(name=name, defaults={"slug": f"load-{i}"})[0]
+            for i, name in enumerate(CATEGORY_NAMES)
+        ]
+        managers = [e for e in employees if e.role in ("director", "deputy", "head", "senior")]
+        final_approvers = [e for e in employees if e.role in ("director", "deputy")]
+
+        cards = []
+        for i in range(count):
+            start = self.today + timedelta(days=self.rng.randint(-365, 60))
+            has_plan = self.rng.random() < 0.3
+            cards.append(EventCard(
+                title=f"Мероприятие {i:05d}",
+                description="Сгенерировано seed_load_data",
+                created_by=self.rng.choice(managers),
+                start_date=start,
+                end_date=start + timedelta(days=self.rng.randint(1, 30)),
+                responsible_department=self.rng.choice(departments),
+                visible=not has_plan or self.rng.random() < 0.7,
+                has_plan=has_plan,
+                plan_status=self.rng.choice(["pending", "approved"]) if has_plan else "draft",
+                final_approver=self.rng.choice(final_approvers) if has_plan else None,
+            ))
+        cards = EventCard.objects.bulk_create(cards, batch_size=self.batch_size)
+
+        category_links, shared_links, approver_orders = [], [], []
+        for card in cards:
+            for category in self.rng.sample(categories, self.rng.randint(1, 2)):
+                category_links.append(EventCard.categories.through(eventcard_id=card.id, category_id=category.id))
+            for dept in self.rng.sample(departments, min(len(departments), self.rng.randint(0, 2))):
+                if dept.id != card.responsible_department_id:
+                    shared_links.append(EventCard.shared_departments.through(eventcard_id=card.id, department_id=dept.id))
+            if card.has_plan:
+                for order, approver in enumerate(self.rng.sample(managers, min(len(managers), self.rng.randint(1, 3)))):
+                    approver_orders.append(CardApproverOrder(card=card, employee=approver, order=order))
+        EventCard.categories.through.objects.bulk_create(category_links, batch_size=self.batch_size)
+        EventCard.shared_departments.through.objects.bulk_create(shared_links, batch_size=self.batch_size)
+        CardApproverOrder.objects.bulk_create(approver_orders, batch_size=self.batch_size)
+        # bulk_create обходит сигналы — строки доступа строим здесь
+        refresh_card_visibility([card.id for card in cards])
+
+        self.stdout.write(f"Карточки: {len(cards)}, согласующих: {len(approver_orders)}")
+        return cards
+
+    # --- Задачи и всё, что к ним привязано ---
+
+    def create_tasks(self, cards, employees, count):
+        by_department = {}
+        for emp in employees:
+            by_department.setdefault(emp.department_id, []).append(emp)
+        regular_by_card = {}  # card_id -> id обычных задач (для задач-проверок)
+        created = 0
+
+        with explicit_timestamps(
+            Task._meta.get_field("created_at"),
+            TaskHistory._meta.get_field("timestamp"),
+            TaskAttachment._meta.get_field("uploaded_at"),
+        ):
+            while created < count:
+                size = min(self.batch_size, count - created)
+                batch = [self.build_task(cards, by_department, regular_by_card) for _ in range(size)]
+                batch = Task.objects.bulk_create(batch)
+                for task in batch:
+                    if task.task_type == "regular":
+                        regular_by_card.setdefault(task.card_id, []).append(task.id)
+                self.create_task_extras(batch, employees)
+                created += size
+                self.stdout.write(f"Задачи: {created}/{count}", ending="\r")
+        self.stdout.write("")
+        return created
+
+    def build_task(self, cards, by_department, regular_by_card):
+        rng = self.rng
+        card = rng.choice(cards)
+        colleagues = by_department[card.responsible_department_id]
+        status = weighted(rng, TASK_STATUS_WEIGHTS)
+        task_type = weighted(rng, TASK_TYPE_WEIGHTS)
+        reviews_task_id = None
+        if task_type == "review":
+            candidates = regular_by_card.get(card.id)
+            if candidates:
+                reviews_task_id = rng.choice(candidates)
+            else:
+                task_type = "regular"
+
+        created_at = self.now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86400))
+        due_date = self.today + timedelta(days=rng.randint(-60, 30)) if rng.random() < 0.8 else None
+        assigned_to_department = rng.random() < 0.15
+        return Task(
+            title=f"Задача по «{card.title}»",
+            description="Сгенерировано seed_load_data",
+            card=card,
+            task_type=task_type,
+            priority="urgent" if rng.random() < 0.15 else "normal",
+            status=status,
+            created_by=rng.choice(colleagues),
+            created_at=created_at,
+            completed_at=created_at + timedelta(days=rng.randint(0, 20)) if status == "done" else None,
+            assigned_department_id=card.responsible_department_id if assigned_to_department else None,
+            assigned_employee=None if assigned_to_department else rng.choice(colleagues),
+            due_date=due_date,
+            deadline=due_date,
+            reviews_task_id=reviews_task_id,
+        )
+
+    def create_task_extras(self, tasks, employees):
+        rng = self.rng
+        history, attachments, recipients, cc = [], [], [], []
+        for task in tasks:
+            actor = task.assigned_employee_id or task.created_by_id
+            moment = task.created_at
+            for action in HISTORY_BY_STATUS[task.status]:
+                history.append(TaskHistory(
+                    task_id=task.id,
+                    employee_id=task.created_by_id if action == "created" else actor,
+                    action=action,
+                    timestamp=moment,
+                ))
+                moment += timedelta(hours=rng.randint(1, 72))
+
+            # метаданные вложений: файлы на диск не пишем, только имя
+            if task.status in ("sent_for_review", "under_review", "done") and rng.random() < 0.3:
+                attachments.append(TaskAttachment(
+                    task_id=task.id,
+                    file=f"tasks/execution_files/load_{task.id}.pdf",
+                    uploaded_by_id=actor,
+                    uploaded_at=moment,
+                ))
+
+            if rng.random() < 0.1:
+                for emp in rng.sample(employees, 2):
+                    recipients.append(Task.recipients.through(task_id=task.id, employee_id=emp.id))
+            if rng.random() < 0.05:
+                cc.append(Task.cc.through(task_id=task.id, employee_id=rng.choice(employees).id))
+
+        TaskHistory.objects.bulk_create(history, batch_size=self.batch_size)
+        TaskAttachment.objects.bulk_create(attachments, batch_size=self.batch_size)
+        Task.recipients.through.objects.bulk_create(recipients, batch_size=self.batch_size, ignore_conflicts=True)
+        Task.cc.through.objects.bulk_create(cc, batch_size=self.batch_size)
+
+    def create_notifications(self, employees, per_user):
+        rng = self.rng
+        notifications = []
+        with explicit_timestamps(Notification._meta.get_field("created_at")):
+            for emp in employees:
+                for _ in range(rng.randint(0, per_user * 2)):
+                    notifications.append(Notification(
+                        user_id=emp.user_id,
+                        message="Вам назначена новая задача",
+                        url="/tasks/",
+                        created_at=self.now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+                        is_read=rng.random() < 0.8,
+                    ))
+            Notification.objects.bulk_create(notifications, batch_size=self.batch_size)
+        self.stdout.write(f"Уведомления: {len(notifications)}")
+        return len(notifications)
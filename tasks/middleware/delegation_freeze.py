@@ -1,8 +1,9 @@
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.urls import reverse
-from django.utils import timezone
-from ..models import Employee  # путь остаётся тем же
+from django.conf import settings
+from ..models import Employee
+from ..utils.employee_context import get_employee_context, invalidate_employee_context
 
 class DelegationFreezeMiddleware:
     """
@@ -14,32 +15,32 @@ class DelegationFreezeMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
+        # Статику и медиа пропускаем без обращения к сессии и сотруднику
+        if request.path.startswith((settings.STATIC_URL, settings.MEDIA_URL)):
+            return self.get_response(request)
+
         # Пропускаем неавторизованных пользователей
         if not request.user.is_authenticated:
             return self.get_response(request)
 
-        try:
-            employee = Employee.objects.get(user=request.user)
-        except Employee.DoesNotExist:
+        # Сотрудник, отдел и замещение — один раз на запрос (из кеша), общий для представлений
+        context = get_employee_context(request)
+        if context is None:
             return self.get_response(request)
+        employee = context.employee
 
         # Обработка кнопки "Отменить замещение" на странице my_delegation или frozen_notice
         if request.method == "POST" and "cancel_delegation" in request.POST:
-            employee.delegate_to = None
-            employee.delegate_until = None
-            employee.save()
+            # сотрудник из кеша контекста может быть устаревшим — меняем только поля замещения,
+            # не перезаписывая роль, отдел и должность, которые могли измениться с тех пор
+            Employee.objects.filter(pk=employee.pk).update(delegate_to=None, delegate_until=None)
+            invalidate_employee_context(employee.user_id)
             messages.success(request, "✅ Замещение отменено. Ваш аккаунт снова активен.")
             return redirect("my_delegation")
 
-        # Проверяем, активен ли режим замещения
-        if employee.is_frozen:
-            # Проверяем, не истекло ли замещение (чтобы автоматически "разморозить")
-            if employee.delegate_until and employee.delegate_until < timezone.now().date():
-                employee.delegate_to = None
-                employee.save()
-                messages.info(request, "⏳ Срок замещения истёк. Ваш аккаунт снова активен.")
-                return self.get_response(request)
-
+        # Проверяем, активен ли режим замещения (is_frozen учитывает дату окончания;
+        # истёкшие замещения снимает планировщик — expire_delegations)
+        if context.is_frozen:
             # Пути, которые доступны во время заморозки
             allowed_paths = [
                 reverse('logout'),
@@ -0,0 +1,144 @@
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
+
+logger = logging.getLogger("tasks.profiling")
+
+# ?_profile=1 включает профилирование для одного запроса (только для staff)
+PROFILE_PARAM = "_profile"
+# сколько повторяющихся запросов выводить в лог
+TOP_DUPLICATES = 3
+
+_current_profile = ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    """Замеры одного запроса: SQL-запросы (с сигнатурами), время SQL и рендеринга шаблонов."""
+
+    def __init__(self):
+        self.queries = Counter()
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            # параметры передаются отдельно, поэтому sql — это уже сигнатура запроса
+            self.queries[sql] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicates(self):
+        """Сигнатуры, выполненные больше одного раза (типичный признак N+1)."""
+        return [(sql, count) for sql, count in self.queries.most_common() if count > 1]
+
+    def server_timing(self):
+        duplicated = sum(count for _, count in self.duplicates)
+        return ", ".join([
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.query_count} queries"',
+            f'dup;desc="{duplicated} duplicated queries"',
+            f"tpl;dur={self.template_time * 1000:.1f}",
+            f"total;dur={self.total_time * 1000:.1f}",
+        ])
+
+    def summary(self, request, response):
+        line = (
+            f"{request.method} {request.get_full_path()} {response.status_code} "
+            f"total={self.total_time * 1000:.1f}ms sql={self.sql_time * 1000:.1f}ms "
+            f"queries={self.query_count} tpl={self.template_time * 1000:.1f}ms"
+        )
+        for sql, count in self.duplicates[:TOP_DUPLICATES]:
+            line += f"\n    x{count}: {sql[:300]}"
+        return line
+
+
+MIDDLEWARE_PATH = "tasks.middleware.profiling.RequestProfilingMiddleware"
+
+_original_template_render = DjangoTemplate.render
+
+
+def install_template_timing():
+    """
+    Замер рендера шаблонов: обёртка над бэкендом Django ставится один раз при старте (TasksConfig.ready),
+    если middleware включён в MIDDLEWARE. Без активного профиля обёртка сразу вызывает исходный render.
+    Считается render/render_to_string; вложенные {% include %} идут мимо бэкенда и не считаются дважды.
+    """
+    if MIDDLEWARE_PATH in settings.MIDDLEWARE:
+        DjangoTemplate.render = _profiled_template_render
+
+
+def _profiled_template_render(self, context=None, request=None):
+    profile = _current_profile.get()
+    if profile is None:
+        return _original_template_render(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _original_template_render(self, context, request)
+    finally:
+        profile.template_time += time.perf_counter() - started
+
+
+class RequestProfilingMiddleware:
+    """
+    Профилирование запросов без debug toolbar: число SQL-запросов, их время, повторяющиеся запросы,
+    время рендеринга шаблонов и всего запроса. Результат — заголовок Server-Timing и строка
+    в логе "tasks.profiling" (в settings — ротируемый файл).
+
+    Включается настройкой REQUEST_PROFILING для всех запросов либо параметром ?_profile=1
+    для сотрудников со статусом staff. Ставить в начало MIDDLEWARE, чтобы учитывались запросы
+    сессии и аутентификации. По параметру профилирование включается в process_view, когда пользователь
+    уже известен: для остальных запросов (и для не-staff с ?_profile) замеров нет вовсе, зато
+    запросы сессии и аутентификации в таком профиле не видны. Время шаблонов — см. install_template_timing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        request._request_profile = None
+        with ExitStack() as stack:
+            request._profile_stack = stack
+            if getattr(settings, "REQUEST_PROFILING", False):
+                self.start_profile(request)
+            response = self.get_response(request)
+
+        profile = request._request_profile
+        if profile is None:
+            return response
+        profile.total_time = time.perf_counter() - started
+        response["Server-Timing"] = profile.server_timing()
+        logger.info(profile.summary(request, response))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # параметр работает только для staff (пользователь известен после AuthenticationMiddleware)
+        if (
+            request._request_profile is None
+            and request.GET.get(PROFILE_PARAM) == "1"
+            and request.user.is_staff
+        ):
+            self.start_profile(request)
+        return None
+
+    def start_profile(self, request):
+        """Включает замеры до конца запроса (обёртки снимает ExitStack из __call__)."""
+        profile = RequestProfile()
+        stack = request._profile_stack
+        stack.callback(_current_profile.reset, _current_profile.set(profile))
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile.record_query))
+        request._request_profile = profile
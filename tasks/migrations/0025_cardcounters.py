@@ -0,0 +1,70 @@
+# Generated by Django 4.2.25 on 2026-10-18 19:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Замороженная копия COUNTER_FILTERS (tasks/utils/counters.py) на момент миграции:
+# миграция не должна зависеть от того, как код счётчиков изменится потом.
+IN_PROGRESS_STATUSES = ("in_progress", "sent_for_review", "under_review")
+REVIEW_TASK_TYPES = ("approval", "review")
+COUNTER_FILTERS = {
+    "total": None,
+    "regular_total": models.Q(task_type="regular"),
+    "new": models.Q(task_type="regular", status="new"),
+    "in_progress": models.Q(task_type="regular", status__in=IN_PROGRESS_STATUSES),
+    "done": models.Q(task_type="regular", status="done"),
+    "urgent": models.Q(task_type="regular", priority="urgent") & ~models.Q(status="done"),
+    "review": models.Q(task_type__in=REVIEW_TASK_TYPES),
+    "review_new": models.Q(task_type__in=REVIEW_TASK_TYPES, status="new"),
+    "open": ~models.Q(status="done"),
+    "closed": models.Q(status="done"),
+}
+
+
+def fill_card_counters(apps, schema_editor):
+    EventCard = apps.get_model("tasks", "EventCard")
+    Task = apps.get_model("tasks", "Task")
+    CardCounters = apps.get_model("tasks", "CardCounters")
+
+    rows = Task.objects.filter(card__isnull=False).values("card_id").annotate(**{
+        name: models.Count("id", filter=condition) if condition else models.Count("id")
+        for name, condition in COUNTER_FILTERS.items()
+    }).order_by()
+    totals = {row.pop("card_id"): row for row in rows}
+    empty = dict.fromkeys(COUNTER_FILTERS, 0)
+    CardCounters.objects.bulk_create([
+        CardCounters(card_id=card_id, **totals.get(card_id, empty))
+        for card_id in EventCard.objects.values_list("id", flat=True)
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0024_alter_eventcard_plan_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardCounters',
+            fields=[
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to='tasks.eventcard')),
+                ('total', models.IntegerField(default=0, verbose_name='Всего задач')),
+                ('regular_total', models.IntegerField(default=0, verbose_name='Обычных задач')),
+                ('new', models.IntegerField(default=0, verbose_name='Новые')),
+                ('in_progress', models.IntegerField(default=0, verbose_name='В работе')),
+                ('done', models.IntegerField(default=0, verbose_name='Выполненные')),
+                ('urgent', models.IntegerField(default=0, verbose_name='Срочные')),
+                ('review', models.IntegerField(default=0, verbose_name='Согласования')),
+                ('review_new', models.IntegerField(default=0, verbose_name='Новые согласования')),
+                ('open', models.IntegerField(default=0, verbose_name='Незавершённые')),
+                ('closed', models.IntegerField(default=0, verbose_name='Завершённые')),
+            ],
+            options={
+                'verbose_name': 'Счётчики карточки',
+                'verbose_name_plural': 'Счётчики карточек',
+            },
+        ),
+        migrations.RunPython(fill_card_counters, migrations.RunPython.noop),
+    ]
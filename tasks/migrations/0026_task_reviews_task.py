@@ -0,0 +1,53 @@
+# Generated by Django 4.2.25 on 2026-10-18 19:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+ORIG_TASK_MARKER = re.compile(r"\[orig_task_id\s*:\s*(\d+)\]")
+REVIEW_TITLE_PREFIX = "Проверить выполнение задачи"
+
+
+def link_review_tasks(apps, schema_editor):
+    """Переносит связь review -> исходная задача из маркера [orig_task_id:N] (или по названию) в FK."""
+    Task = apps.get_model("tasks", "Task")
+    existing_ids = set(Task.objects.values_list("id", flat=True))
+
+    to_update = []
+    reviews = Task.objects.filter(task_type="review", reviews_task__isnull=True)
+    for review in reviews.only("id", "title", "description", "card_id").iterator():
+        base_id = None
+        match = ORIG_TASK_MARKER.search(review.description or "")
+        if match and int(match.group(1)) in existing_ids:
+            base_id = int(match.group(1))
+        else:
+            trimmed = review.title.replace(REVIEW_TITLE_PREFIX, "").strip(" «»\"'")
+            if trimmed:
+                base_id = (
+                    Task.objects.filter(card_id=review.card_id, title__icontains=trimmed)
+                    .exclude(task_type="review")
+                    .order_by("-created_at")
+                    .values_list("id", flat=True)
+                    .first()
+                )
+        if base_id:
+            review.reviews_task_id = base_id
+            to_update.append(review)
+
+    Task.objects.bulk_update(to_update, ["reviews_task"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0025_cardcounters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='reviews_task',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='review_tasks', to='tasks.task', verbose_name='Проверяемая задача'),
+        ),
+        migrations.RunPython(link_review_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.25 on 2026-10-18 19:14
+
+from django.db import migrations, models
+import tasks.utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0027_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='eventcard',
+            name='plan_file',
+            field=models.FileField(blank=True, null=True, storage=tasks.utils.storage.ContentAddressedStorage(), upload_to='event_plans/', verbose_name='План мероприятия'),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=tasks.utils.storage.ContentAddressedStorage(), upload_to='tasks/files/', verbose_name='Вложение'),
+        ),
+        migrations.AlterField(
+            model_name='taskattachment',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=tasks.utils.storage.ContentAddressedStorage(), upload_to='tasks/execution_files/'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.25 on 2026-10-18 19:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0029_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodicTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Задача')),
+                ('enabled', models.BooleanField(default=True, verbose_name='Включена')),
+                ('next_run_at', models.DateTimeField(verbose_name='Следующий запуск')),
+                ('last_run_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний запуск')),
+                ('missed_runs', models.PositiveIntegerField(default=0, verbose_name='Пропущено запусков (последний догон)')),
+                ('total_runs', models.PositiveIntegerField(default=0, verbose_name='Всего запусков')),
+            ],
+            options={
+                'verbose_name': 'Периодическая задача',
+                'verbose_name_plural': 'Периодические задачи',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SchedulerLock',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('owner', models.CharField(max_length=100, verbose_name='Владелец')),
+                ('expires_at', models.DateTimeField(verbose_name='Истекает')),
+            ],
+            options={
+                'verbose_name': 'Блокировка планировщика',
+                'verbose_name_plural': 'Блокировки планировщика',
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.25 on 2026-10-18 19:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from tasks.utils.search import create_search_index, drop_search_index
+
+
+def create_index(apps, schema_editor):
+    create_search_index(schema_editor, apps.get_model("tasks", "SearchEntry"))
+
+
+def drop_index(apps, schema_editor):
+    drop_search_index(schema_editor, apps.get_model("tasks", "SearchEntry"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0030_periodic_tasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('task', 'Задача'), ('card', 'Карточка'), ('history', 'Комментарий'), ('plan', 'План мероприятия')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('source', models.CharField(blank=True, max_length=255)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('card', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tasks.eventcard')),
+                ('task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tasks.task')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ',
+                'verbose_name_plural': 'Поисковые документы',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='searchentry_kind_object_uniq'),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.25 on 2026-10-18 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0031_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedText',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='SHA-256 содержимого')),
+                ('source_name', models.CharField(max_length=255, verbose_name='Файл')),
+                ('text', models.TextField(blank=True)),
+                ('truncated', models.BooleanField(default=False, verbose_name='Обрезан по лимиту')),
+                ('status', models.CharField(choices=[('ok', 'Извлечён'), ('error', 'Ошибка')], default='ok', max_length=10)),
+                ('error', models.CharField(blank=True, max_length=500)),
+                ('extracted_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Извлечённый текст',
+                'verbose_name_plural': 'Извлечённые тексты',
+                'indexes': [models.Index(fields=['source_name'], name='extractedtext_source_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.25 on 2026-10-18 19:31
+
+from django.db import migrations, models
+from django.db.models import Case, IntegerField, Value, When
+import tasks.models
+
+
+def fill_list_rank(apps, schema_editor):
+    """Один UPDATE вместо пересохранения задач: то же правило, что tasks.models.task_list_rank."""
+    Task = apps.get_model("tasks", "Task")
+    Task.objects.update(list_rank=Case(
+        When(task_type="review", then=Value(1)),
+        When(priority="urgent", then=Value(2)),
+        When(status="new", then=Value(3)),
+        When(status="in_progress", then=Value(4)),
+        When(status="done", then=Value(5)),
+        default=Value(6),
+        output_field=IntegerField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0032_extracted_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='list_rank',
+            field=tasks.models.TaskListRankField(default=6, editable=False),
+        ),
+        migrations.RunPython(fill_list_rank, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['card', 'list_rank', 'id'], name='task_card_rank_idx'),
+        ),
+    ]
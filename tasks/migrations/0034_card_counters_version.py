@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0033_task_list_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cardcounters',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.25 on 2026-10-18 19:39
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0034_card_counters_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StreamEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=50, verbose_name='Канал')),
+                ('kind', models.CharField(max_length=30, verbose_name='Тип')),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Событие потока',
+                'verbose_name_plural': 'События потока',
+                'indexes': [models.Index(fields=['channel', 'id'], name='streamevent_channel_id_idx'), models.Index(fields=['created_at'], name='streamevent_created_idx')],
+            },
+        ),
+    ]
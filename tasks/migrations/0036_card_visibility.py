@@ -0,0 +1,61 @@
+# Generated by Django 4.2.25 on 2026-10-18 19:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_card_visibility(apps, schema_editor):
+    # замороженная копия правила card_visibility_rows (tasks/utils/visibility.py) на момент миграции:
+    # отдел-ответственный, расшаренные отделы и NULL — для опубликованных карточек
+    EventCard = apps.get_model("tasks", "EventCard")
+    CardVisibility = apps.get_model("tasks", "CardVisibility")
+
+    departments = {}
+    for card_id, department_id in EventCard.shared_departments.through.objects.values_list(
+        "eventcard_id", "department_id",
+    ):
+        departments.setdefault(card_id, set()).add(department_id)
+    for card_id, department_id, visible in EventCard.objects.values_list("id", "responsible_department_id", "visible"):
+        access = departments.setdefault(card_id, set())
+        if department_id:
+            access.add(department_id)
+        if visible:
+            access.add(None)
+
+    CardVisibility.objects.bulk_create([
+        CardVisibility(card_id=card_id, department_id=department_id)
+        for card_id, access in departments.items()
+        for department_id in access
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0035_stream_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardVisibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibility', to='tasks.eventcard')),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tasks.department')),
+            ],
+            options={
+                'verbose_name': 'Доступ к карточке',
+                'verbose_name_plural': 'Доступ к карточкам',
+                'indexes': [models.Index(fields=['department', 'card'], name='cardvisibility_dept_card_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cardvisibility',
+            constraint=models.UniqueConstraint(fields=('card', 'department'), name='cardvisibility_card_dept_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='cardvisibility',
+            constraint=models.UniqueConstraint(condition=models.Q(('department__isnull', True)), fields=('card',), name='cardvisibility_card_public_uniq'),
+        ),
+        migrations.RunPython(fill_card_visibility, migrations.RunPython.noop),
+    ]
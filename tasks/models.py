@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from tasks.utils.storage import content_storage
 
 
 
@@ -111,7 +112,7 @@ class EventCard(models.Model):
     categories = models.ManyToManyField("Category", related_name="cards", blank=True, verbose_name="Категории")
     title = models.CharField(max_length=255, verbose_name="Название мероприятия")
     description = models.TextField(blank=True, verbose_name="Описание")
-    plan_file = models.FileField(upload_to="event_plans/", null=True, blank=True, verbose_name="План мероприятия")
+    plan_file = models.FileField(upload_to="event_plans/", storage=content_storage, null=True, blank=True, verbose_name="План мероприятия")
     plan_status = models.CharField(max_length=20, choices=PLAN_STATUS_CHOICES, default="draft")
     plan_submitted_at = models.DateTimeField(null=True, blank=True)
     plan_rejected_reason = models.TextField(null=True, blank=True)
@@ -155,9 +156,10 @@ class EventCard(models.Model):
 
     @property
     def progress(self):
-        # учитываем только обычные задачи
-        regular_tasks = self.tasks.filter(task_type="regular")
-        total = regular_tasks.count()
+        # учитываем только обычные задачи; числа берём из денормализованных счётчиков
+        counters = self.get_counters()
+        total = counters.regular_total
+        done = counters.done
 
         if total == 0:
             return {
@@ -166,7 +168,6 @@ class EventCard(models.Model):
                 "percent": 0
             }
 
-        done = regular_tasks.filter(status="done").count()
         percent = round((done / total) * 100, 1)
 
         return {
@@ -175,6 +176,15 @@ class EventCard(models.Model):
             "percent": percent
         }
 
+    def get_counters(self):
+        """Счётчики задач карточки (создаются пересчётом, если строки ещё нет)."""
+        try:
+            return self.counters
+        except CardCounters.DoesNotExist:
+            from tasks.utils.counters import recount_card_counters
+            recount_card_counters([self.pk])
+            return CardCounters.objects.get(card=self)
+
     # helper: кто является "ответственным" по карточке - отдел и инициатор
     def is_user_responsible(self, user):
         """Проверить, принадлежит ли user к responsible_department"""
@@ -186,22 +196,70 @@ class EventCard(models.Model):
     
      # helper: проверка может ли пользователь создавать задачи в этой карточке
     def can_user_create_task(self, user):
-        # директор или заместитель всегда могут
+        # правила — в tasks.utils.policy ("card.create_task"): руководство всегда, head/senior —
+        # ответственный или расшаренный отдел, обычный сотрудник — только ответственный отдел
+        from tasks.utils.policy import Policy
+
         try:
             emp = user.employee
         except Employee.DoesNotExist:
             return False
-        if emp.role in ("director", "deputy"):
-            return True
-        # руководитель отдела или senior сотрудник из ответственного отдела или shared departments
-        if emp.role in ("head", "senior"):
-            if emp.department == self.responsible_department or emp.department in self.shared_departments.all():
-                return True
-        # обычный сотрудник: только если в их отделе (и после утверждения) — но обычный сотрудник при создании требует утверждения
-        if emp.role == "staff" and emp.department == self.responsible_department:
-            # they can create but tasks will be created with status 'new' and require approval by head
-            return True
-        return False
+        return Policy(emp).can("card.create_task", self)
+
+class CardCounters(models.Model):
+    """
+    Денормализованные счётчики задач карточки.
+    Обновляются сигналами при сохранении/удалении задач (см. tasks.utils.counters),
+    расхождения исправляет команда recount_card_counters.
+    """
+    card = models.OneToOneField(EventCard, on_delete=models.CASCADE, primary_key=True, related_name="counters")
+    total = models.IntegerField(default=0, verbose_name="Всего задач")
+    regular_total = models.IntegerField(default=0, verbose_name="Обычных задач")
+    new = models.IntegerField(default=0, verbose_name="Новые")
+    in_progress = models.IntegerField(default=0, verbose_name="В работе")
+    done = models.IntegerField(default=0, verbose_name="Выполненные")
+    urgent = models.IntegerField(default=0, verbose_name="Срочные")
+    review = models.IntegerField(default=0, verbose_name="Согласования")
+    review_new = models.IntegerField(default=0, verbose_name="Новые согласования")
+    open = models.IntegerField(default=0, verbose_name="Незавершённые")
+    closed = models.IntegerField(default=0, verbose_name="Завершённые")
+    # растёт при любом изменении задач карточки — по нему ETag статистики (card_stats) и 304
+    version = models.PositiveIntegerField(default=0, verbose_name="Версия")
+
+    class Meta:
+        verbose_name = "Счётчики карточки"
+        verbose_name_plural = "Счётчики карточек"
+
+    def __str__(self):
+        return f"{self.card_id}: {self.done}/{self.regular_total}"
+
+
+class CardVisibility(models.Model):
+    """
+    Материализованный доступ к карточке (см. tasks.utils.visibility): строка на ответственный отдел
+    и на каждый отдел, с которым карточка расшарена, и строка без отдела — карточка видна всем (visible).
+    Пересобирается сигналами при сохранении карточки и изменении shared_departments.
+    """
+    card = models.ForeignKey(EventCard, on_delete=models.CASCADE, related_name="visibility")
+    department = models.ForeignKey("Department", on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+
+    class Meta:
+        verbose_name = "Доступ к карточке"
+        verbose_name_plural = "Доступ к карточкам"
+        constraints = [
+            models.UniqueConstraint(fields=["card", "department"], name="cardvisibility_card_dept_uniq"),
+            models.UniqueConstraint(
+                fields=["card"], condition=models.Q(department__isnull=True), name="cardvisibility_card_public_uniq",
+            ),
+        ]
+        indexes = [
+            # card_access (правило "card.view"): department_id IS NULL OR department_id = ? — обе ветки по индексу
+            models.Index(fields=["department", "card"], name="cardvisibility_dept_card_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.card_id}: {self.department_id or 'все'}"
+
 
 class CardApproverOrder(models.Model):
     card = models.ForeignKey("EventCard", on_delete=models.CASCADE)
@@ -212,6 +270,27 @@ class CardApproverOrder(models.Model):
         ordering = ["order"]
 
 
+def task_list_rank(task):
+    """Место задачи в списке карточки: согласования, срочные, новые, в работе, выполненные, остальные."""
+    if task.task_type == "review":
+        return 1
+    if task.priority == "urgent":
+        return 2
+    return {"new": 3, "in_progress": 4, "done": 5}.get(task.status, 6)
+
+
+class TaskListRankField(models.PositiveSmallIntegerField):
+    """
+    Ключ сортировки списка задач карточки, вычисляется из типа, срочности и статуса при каждом сохранении
+    (в том числе в bulk_create). Хранится, чтобы листать список по индексу (card, list_rank, id).
+    """
+
+    def pre_save(self, model_instance, add):
+        value = task_list_rank(model_instance)
+        setattr(model_instance, self.attname, value)
+        return value
+
+
 class Task(models.Model):
     STATUS_CHOICES = [
         ('new', 'Новая'),
@@ -252,12 +331,54 @@ class Task(models.Model):
     recipients = models.ManyToManyField('Employee', blank=True, related_name="received_tasks", verbose_name="Адресаты")
     due_date = models.DateField(null=True, blank=True)
     google_drive_link = models.URLField(blank=True, null=True, verbose_name="Ссылка на Google Диск")
-    attachment = models.FileField(upload_to="tasks/files/", blank=True, null=True, verbose_name="Вложение")
+    attachment = models.FileField(upload_to="tasks/files/", storage=content_storage, blank=True, null=True, verbose_name="Вложение")
     review_comment = models.TextField(blank=True, null=True, verbose_name="Комментарий проверяющего")
+    # для задач типа "review": какую задачу проверяем
+    reviews_task = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="review_tasks",
+        verbose_name="Проверяемая задача",
+    )
+
+    list_rank = TaskListRankField(default=6, editable=False)
+
+    class Meta:
+        # составные индексы под фильтры доски, карточки и списков задач
+        indexes = [
+            # постраничный список задач карточки: ORDER BY list_rank, id от курсора
+            models.Index(fields=["card", "list_rank", "id"], name="task_card_rank_idx"),
+            models.Index(fields=["assigned_employee", "status", "due_date"], name="task_emp_status_due_idx"),
+            models.Index(fields=["assigned_department", "status", "due_date"], name="task_dept_status_due_idx"),
+            models.Index(fields=["card", "task_type", "status"], name="task_card_type_status_idx"),
+            models.Index(fields=["assigned_employee", "task_type", "status"], name="task_emp_type_status_idx"),
+            # частичные: только незавершённые задачи (на бэкендах без поддержки не создаются)
+            models.Index(
+                fields=["assigned_employee", "task_type"], condition=~models.Q(status="done"),
+                name="task_emp_type_open_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
 
+    def save(self, *args, **kwargs):
+        # list_rank зависит от этих полей — при частичном сохранении обновляем и его
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"task_type", "priority", "status"} & set(update_fields):
+            kwargs["update_fields"] = [*update_fields, "list_rank"]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # запоминаем состояние из БД, чтобы сигналы могли посчитать разницу для счётчиков карточки
+        from tasks.utils.counters import counter_state
+        instance._counter_state = counter_state(instance)
+        return instance
+
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse("task_detail", args=[self.id])
@@ -284,6 +405,9 @@ class TaskHistory(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["task", "action", "-timestamp"], name="history_task_action_ts_idx"),
+        ]
 
     def __str__(self):
         return f"{self.get_action_display()} — {self.task.title} ({self.timestamp:%d.%m.%Y %H:%M})"
@@ -291,7 +415,7 @@ class TaskHistory(models.Model):
 # models.py
 class TaskAttachment(models.Model):
     task = models.ForeignKey("Task", on_delete=models.CASCADE, related_name="attachments")
-    file = models.FileField(upload_to="tasks/execution_files/", blank=True, null=True)
+    file = models.FileField(upload_to="tasks/execution_files/", storage=content_storage, blank=True, null=True)
     link = models.URLField(blank=True, null=True)
     uploaded_by = models.ForeignKey("Employee", on_delete=models.SET_NULL, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
@@ -313,6 +437,156 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["user", "is_read", "-created_at"], name="notif_user_read_created_idx"),
+            # SQLite не умеет искать по индексу условие "NOT is_read", частичный индекс он использует
+            models.Index(fields=["user", "-created_at"], condition=models.Q(is_read=False), name="notif_user_unread_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user}: {self.message[:40]}"
+
+
+class Job(models.Model):
+    """Фоновая задача очереди (см. tasks/utils/jobs.py и команду run_worker)."""
+    STATUS_CHOICES = [
+        ("queued", "В очереди"),
+        ("running", "Выполняется"),
+        ("done", "Выполнена"),
+        ("dead", "Ошибка (попытки исчерпаны)"),
+    ]
+
+    func = models.CharField(max_length=255, verbose_name="Функция")
+    kwargs = models.JSONField(default=dict, blank=True, verbose_name="Аргументы")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued", verbose_name="Статус")
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Запустить не раньше")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="Максимум попыток")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    locked_by = models.CharField(max_length=64, blank=True, verbose_name="Воркер")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [
+            # выборка следующей задачи: status='queued' AND run_at <= now ORDER BY run_at
+            models.Index(fields=["status", "run_at"], name="job_status_run_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.func} ({self.get_status_display()})"
+
+
+class PeriodicTask(models.Model):
+    """Состояние периодической задачи планировщика (расписание — в tasks/utils/scheduler.py)."""
+    name = models.CharField(max_length=100, unique=True, verbose_name="Задача")
+    enabled = models.BooleanField(default=True, verbose_name="Включена")
+    next_run_at = models.DateTimeField(verbose_name="Следующий запуск")
+    last_run_at = models.DateTimeField(null=True, blank=True, verbose_name="Последний запуск")
+    missed_runs = models.PositiveIntegerField(default=0, verbose_name="Пропущено запусков (последний догон)")
+    total_runs = models.PositiveIntegerField(default=0, verbose_name="Всего запусков")
+
+    class Meta:
+        verbose_name = "Периодическая задача"
+        verbose_name_plural = "Периодические задачи"
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class SchedulerLock(models.Model):
+    """Аренда лидерства: задачи ставит только тот run_scheduler, у которого аренда не истекла."""
+    name = models.CharField(max_length=50, primary_key=True)
+    owner = models.CharField(max_length=100, verbose_name="Владелец")
+    expires_at = models.DateTimeField(verbose_name="Истекает")
+
+    class Meta:
+        verbose_name = "Блокировка планировщика"
+        verbose_name_plural = "Блокировки планировщика"
+
+    def __str__(self):
+        return f"{self.name}: {self.owner}"
+
+
+class SearchEntry(models.Model):
+    """
+    Документ полнотекстового поиска (см. tasks/utils/search.py).
+    На SQLite по этой таблице построен FTS5-индекс tasks_searchentry_fts (обновляется триггерами),
+    на PostgreSQL — GIN-индекс по tsvector. task/card нужны для проверки прав и каскадного удаления.
+    """
+    KIND_CHOICES = [
+        ("task", "Задача"),
+        ("card", "Карточка"),
+        ("history", "Комментарий"),
+        ("plan", "План мероприятия"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    card = models.ForeignKey(EventCard, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    source = models.CharField(max_length=255, blank=True)  # для плана — имя проиндексированного файла
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Поисковый документ"
+        verbose_name_plural = "Поисковые документы"
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="searchentry_kind_object_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id} {self.title}"
+
+
+class ExtractedText(models.Model):
+    """Текст, извлечённый из файла плана/вложения (см. tasks/utils/text_extraction.py), по хешу содержимого."""
+    STATUS_CHOICES = [
+        ("ok", "Извлечён"),
+        ("error", "Ошибка"),
+    ]
+
+    digest = models.CharField(max_length=64, primary_key=True, verbose_name="SHA-256 содержимого")
+    source_name = models.CharField(max_length=255, verbose_name="Файл")
+    text = models.TextField(blank=True)
+    truncated = models.BooleanField(default=False, verbose_name="Обрезан по лимиту")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="ok")
+    error = models.CharField(max_length=500, blank=True)
+    extracted_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Извлечённый текст"
+        verbose_name_plural = "Извлечённые тексты"
+        indexes = [
+            # get_text() для старых файлов вне хранилища по хешу ищет по имени
+            models.Index(fields=["source_name"], name="extractedtext_source_idx"),
+        ]
+
+    def __str__(self):
+        return self.source_name
+
+
+class StreamEvent(models.Model):
+    """Событие для SSE-потока (см. tasks/utils/events.py): канал user:<id> или card:<id>."""
+    channel = models.CharField(max_length=50, verbose_name="Канал")
+    kind = models.CharField(max_length=30, verbose_name="Тип")
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Событие потока"
+        verbose_name_plural = "События потока"
+        indexes = [
+            # досылка пропущенного после переподключения: channel IN (...) AND id > Last-Event-ID
+            models.Index(fields=["channel", "id"], name="streamevent_channel_id_idx"),
+            models.Index(fields=["created_at"], name="streamevent_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.channel}: {self.kind}"
@@ -1,24 +1,210 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Employee, Task, TaskHistory
+from django.db.models import Q
+from .models import Employee, Department, Task, TaskHistory, TaskAttachment, EventCard, CardCounters
+from .utils.counters import counter_state, track_task_change, recount_card_counters, touch_cards
+from .utils.employee_context import invalidate_employee_context
+from .utils.directory import invalidate_directory
+from .utils.storage import release_file
+from .utils.previews import schedule_preview
+from .utils.text_extraction import schedule_text_extraction
+from .utils.events import card_channel, publish, publish_task_change
+from .utils.visibility import refresh_card_visibility
+from .utils import search
 
 @receiver(post_save, sender=User)
 def create_employee_profile(sender, instance, created, **kwargs):
     if created:
         Employee.objects.create(user=instance)
 
+# поля, от которых зависят кешированный контекст сотрудника и справочник сотрудников для форм;
+# частичные сохранения других полей (last_login при каждом входе) кеши не сбрасывают
+USER_NAME_FIELDS = {"username", "first_name", "last_name"}
+EMPLOYEE_DIRECTORY_FIELDS = {"user", "position", "department", "role"}
+DEPARTMENT_DIRECTORY_FIELDS = {"name", "shortname"}
+
+def touches(update_fields, fields):
+    """Затрагивает ли сохранение поля fields (update_fields=None — сохранены все поля)."""
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
 @receiver(post_save, sender=User)
-def save_employee_profile(sender, instance, **kwargs):
-    instance.employee.save()
+def save_employee_profile(sender, instance, update_fields=None, **kwargs):
+    # частичное сохранение пользователя (например, last_login при входе) профиль не меняет
+    if update_fields is None:
+        instance.employee.save()
+
+@receiver([post_save, pre_delete], sender=Employee)
+def drop_employee_context(sender, instance, **kwargs):
+    """Сбрасываем кешированный контекст сотрудника и тех, кого он замещает."""
+    delegators = Employee.objects.filter(delegate_to=instance).values_list("user_id", flat=True)
+    invalidate_employee_context(instance.user_id, *delegators)
+
+@receiver(post_save, sender=User)
+def drop_user_employee_context(sender, instance, update_fields=None, **kwargs):
+    if touches(update_fields, USER_NAME_FIELDS):
+        invalidate_employee_context(instance.pk)
+
+@receiver(post_save, sender=Department)
+def drop_department_employee_context(sender, instance, **kwargs):
+    user_ids = Employee.objects.filter(
+        Q(department=instance) | Q(delegate_to__department=instance)
+    ).values_list("user_id", flat=True)
+    invalidate_employee_context(*user_ids)
+
+DIRECTORY_FIELDS = {
+    User: USER_NAME_FIELDS,
+    Employee: EMPLOYEE_DIRECTORY_FIELDS,
+    Department: DEPARTMENT_DIRECTORY_FIELDS,
+}
 
-@receiver([post_save, post_delete], sender=Task)
-def update_card_progress(sender, instance, **kwargs):
-    """После сохранения или удаления задачи пересчитываем прогресс карточки"""
-    if instance.card:
-        instance.card.progress
+@receiver([post_save, post_delete], sender=Employee)
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Department)
+def drop_employee_directory(sender, raw=False, update_fields=None, **kwargs):
+    """Имя, должность, отдел или состав сотрудников изменились — справочник для форм устарел."""
+    if not raw and touches(update_fields, DIRECTORY_FIELDS[sender]):
+        invalidate_directory()
+
+@receiver(post_save, sender=EventCard)
+def create_card_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CardCounters.objects.create(card=instance)
+
+@receiver(post_save, sender=EventCard)
+def update_card_visibility(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Строки доступа зависят от visible и ответственного отдела (shared_departments — см. ниже)."""
+    if raw:
+        return
+    if created or update_fields is None or {"visible", "responsible_department"} & set(update_fields):
+        refresh_card_visibility([instance.pk])
+
+@receiver(m2m_changed, sender=EventCard.shared_departments.through)
+def update_shared_card_visibility(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            refresh_card_visibility([instance.pk])
+    elif action == "pre_clear":
+        # department.shared_cards.clear(): после очистки уже не узнать, какие карточки были расшарены
+        instance._shared_card_ids = list(instance.shared_cards.values_list("id", flat=True))
+    elif action == "post_clear":
+        refresh_card_visibility(instance.__dict__.pop("_shared_card_ids", []))
+    elif action in ("post_add", "post_remove"):
+        refresh_card_visibility(pk_set)
+
+@receiver(post_save, sender=Task)
+def update_card_counters(sender, instance, created, raw=False, **kwargs):
+    """После сохранения задачи переносим её вклад в счётчики карточки (старое состояние -> новое)"""
+    if raw:
+        return
+    new_state = counter_state(instance)
+    old_state = getattr(instance, "_counter_state", None)
+    if created:
+        track_task_change(None, new_state)
+    elif old_state is None:
+        # состояние до изменения неизвестно (объект собран вручную) — надёжнее пересчитать
+        if instance.card_id:
+            recount_card_counters([instance.card_id])
+            touch_cards([instance.card_id])
+    else:
+        # и при неизменных счётчиках: поднимется версия карточки (ETag статистики)
+        track_task_change(old_state, new_state)
+    instance._counter_state = new_state
+    # в поток событий карточки — только изменения статуса, приоритета, типа и карточки
+    if old_state != new_state:
+        publish_task_change(instance, old_state[0] if old_state else None)
+
+@receiver(m2m_changed, sender=Task.recipients.through)
+def touch_recipient_cards(sender, instance, action, reverse, pk_set, **kwargs):
+    """Адресаты влияют на статистику "мои задачи" — поднимаем версию карточек затронутых задач."""
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            touch_cards([instance.card_id])
+    elif action == "pre_clear":
+        # после clear() уже не узнать, у каких задач сотрудник был адресатом
+        instance._recipient_cards = set(instance.received_tasks.values_list("card_id", flat=True))
+    elif action == "post_clear":
+        touch_cards(instance.__dict__.pop("_recipient_cards", ()))
+    elif action in ("post_add", "post_remove"):
+        touch_cards(set(Task.objects.filter(pk__in=pk_set).values_list("card_id", flat=True)))
+
+@receiver(post_delete, sender=Task)
+def release_card_counters(sender, instance, **kwargs):
+    track_task_change(getattr(instance, "_counter_state", None) or counter_state(instance), None)
+    publish_task_change(instance, deleted=True)
+
+@receiver(post_save, sender=EventCard)
+def publish_approval_progress(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Ход согласования плана — в поток событий карточки."""
+    if created or raw:
+        return
+    if update_fields is not None and not {"plan_status", "current_approver_index"} & set(update_fields):
+        return
+    publish(card_channel(instance.pk), "approval", {
+        "plan_status": instance.plan_status,
+        "current_approver_index": instance.current_approver_index,
+        "is_fully_approved": instance.is_fully_approved,
+    })
+
+@receiver(post_delete, sender=EventCard)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=TaskAttachment)
+def release_stored_files(sender, instance, **kwargs):
+    """Файлы общие (хранятся по хешу) — удаляем только когда на них не осталось ссылок."""
+    for field in ("plan_file", "attachment", "file"):
+        if hasattr(instance, field):
+            release_file(getattr(instance, field).name)
+
+@receiver(post_save, sender=EventCard)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=TaskAttachment)
+def build_file_previews(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Превью новых планов и вложений строятся в фоне после коммита."""
+    if raw:
+        return
+    for field in ("plan_file", "attachment", "file"):
+        # сохранение других полей (например, update_fields=["status"]) файл не меняет
+        if hasattr(instance, field) and touches(update_fields, {field}):
+            schedule_preview(getattr(instance, field).name)
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=TaskAttachment)
+def extract_file_texts(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Текст вложений извлекается в фоне (планы карточек — вместе с поисковым индексом, см. ниже)."""
+    if raw:
+        return
+    for field in ("attachment", "file"):
+        if hasattr(instance, field) and touches(update_fields, {field}):
+            schedule_text_extraction(getattr(instance, field).name)
 
 @receiver(post_save, sender=Task)
 def create_task_history(sender, instance, created, **kwargs):
     if created:
-        TaskHistory.objects.create(task=instance, employee=instance.created_by, action="created")
\ No newline at end of file
+        TaskHistory.objects.create(task=instance, employee=instance.created_by, action="created")
+
+
+# Поисковый индекс: обновляем документ, только если менялись индексируемые поля
+SEARCH_FIELDS = {
+    Task: {"title", "description", "review_comment", "card"},
+    EventCard: {"title", "description", "plan_file"},
+}
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=EventCard)
+def update_search_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and not SEARCH_FIELDS[sender] & set(update_fields)):
+        return
+    if sender is Task:
+        search.index_task(instance)
+    else:
+        search.index_card(instance)
+        search.schedule_plan_indexing(instance)
+
+@receiver(post_save, sender=TaskHistory)
+def update_history_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_history(instance)
+
+@receiver(post_delete, sender=TaskHistory)
+def drop_history_search_index(sender, instance, **kwargs):
+    search.remove_entry("history", instance.pk)
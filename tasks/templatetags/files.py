@@ -0,0 +1,19 @@
+import os
+
+from django import template
+
+from tasks.utils import previews
+
+register = template.Library()
+
+
+@register.filter
+def basename(name):
+    """Имя файла без каталогов: "cas/ab/<хеш>/plan.docx" -> "plan.docx"."""
+    return os.path.basename(str(name or ""))
+
+
+@register.filter
+def has_preview(field_file, kind="png"):
+    """Построено ли превью файла (см. tasks/utils/previews.py)."""
+    return previews.has_preview(getattr(field_file, "name", None), kind)
@@ -1,3 +1,1705 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import re
+import tempfile
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import mock
+from urllib.parse import unquote
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .forms import TaskForm
+from .models import (
+    CardApproverOrder, CardCounters, CardVisibility, Category, Department, Employee, EventCard, ExtractedText, Job, Notification,
+    PeriodicTask, StreamEvent, Task, TaskAttachment, TaskHistory,
+)
+from .utils.notifications import get_unread_summary, notify
+from .utils.counters import COUNTER_FILTERS, recount_card_counters
+from .middleware import profiling
+from .middleware.profiling import RequestProfile, RequestProfilingMiddleware
+from . import views_directory
+from .utils import (
+    directory, events, jobs, periodic, policy, previews, scheduler, search, storage, text_extraction, typeahead,
+    visibility,
+)
+
+
+def make_employee(username, role="staff", department=None, position=""):
+    """Создаёт пользователя; Employee создаётся сигналом, дополняем его роль и отдел."""
+    user = User.objects.create_user(username=username, password="pass", first_name=username.title())
+    employee = user.employee
+    employee.role = role
+    employee.department = department
+    employee.position = position
+    employee.save()
+    return employee
+
+
+class CacheResetTestCase(TestCase):
+    """Файловый кеш переживает прогоны тестов, а id в тестовой БД повторяются — чистим его."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+
+class TaskListBoardQueriesTests(CacheResetTestCase):
+    """Доска мероприятий не должна делать запросы на каждую карточку."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.other_department = Department.objects.create(name="Другой", shortname="ДР")
+        cls.employee = make_employee("head", role="head", department=cls.department)
+        cls.category = Category.objects.create(name="Внутренняя работа", slug="vnutrennyaya-rabota")
+
+    def add_cards(self, count):
+        today = timezone.now().date()
+        for i in range(count):
+            card = EventCard.objects.create(
+                title=f"Карточка {i}",
+                created_by=self.employee,
+                responsible_department=self.other_department,
+                visible=(i % 3 != 0),
+            )
+            card.categories.add(self.category)
+            if i % 3 == 0:
+                card.shared_departments.add(self.department)
+            Task.objects.create(card=card, title="Обычная", created_by=self.employee, status="done")
+            Task.objects.create(
+                card=card, title="Срочная", created_by=self.employee,
+                status="new", due_date=today + timedelta(days=1),
+            )
+            Task.objects.create(
+                card=card, title="Согласование", created_by=self.employee,
+                task_type="approval", status="new",
+            )
+
+    def board_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("task_list"))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_cards(self):
+        self.client.force_login(self.employee.user)
+
+        self.add_cards(3)
+        self.board_queries()  # прогрев кеша сотрудника
+        _, small = self.board_queries()
+
+        self.add_cards(30)
+        response, large = self.board_queries()
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.context["cards"]), 33)
+
+    def test_fixed_query_count(self):
+        self.client.force_login(self.employee.user)
+        self.add_cards(10)
+        self.client.get(reverse("task_list"))  # прогрев кеша сотрудника
+        # сессия, пользователь, число карточек, 4 списка задач,
+        # категории с числом карточек, карточки с агрегатами, категории карточек (prefetch)
+        with self.assertNumQueries(10):
+            self.client.get(reverse("task_list"))
+
+    def test_badges_and_progress(self):
+        self.client.force_login(self.employee.user)
+        self.add_cards(1)
+        card = self.client.get(reverse("task_list")).context["cards"][0]
+
+        self.assertEqual(card.counters.review_new, 1)
+        self.assertEqual(card.urgent_count, 1)
+        self.assertEqual(card.counters.open, 2)
+        self.assertEqual(card.counters.closed, 1)
+        self.assertEqual(card.progress, {"total": 2, "done": 1, "percent": 50.0})
+
+
+class CardCountersTests(CacheResetTestCase):
+    """Счётчики карточки обновляются инкрементально и совпадают с полным пересчётом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.employee = make_employee("head", role="head", department=cls.department)
+
+    def setUp(self):
+        super().setUp()
+        self.card = EventCard.objects.create(title="Карточка", created_by=self.employee)
+        self.other_card = EventCard.objects.create(title="Другая", created_by=self.employee)
+
+    def counters(self, card):
+        return CardCounters.objects.filter(card=card).values(*COUNTER_FILTERS).get()
+
+    def assertCountersConsistent(self):
+        incremental = {card.pk: self.counters(card) for card in (self.card, self.other_card)}
+        recount_card_counters()
+        for card in (self.card, self.other_card):
+            self.assertEqual(incremental[card.pk], self.counters(card))
+
+    def test_create_transition_move_and_delete(self):
+        task = Task.objects.create(card=self.card, title="A", created_by=self.employee)
+        urgent = Task.objects.create(card=self.card, title="B", created_by=self.employee, priority="urgent")
+        Task.objects.create(card=self.card, title="C", created_by=self.employee, task_type="review")
+        self.assertEqual(self.counters(self.card)["new"], 2)
+        self.assertEqual(self.counters(self.card)["urgent"], 1)
+        self.assertEqual(self.counters(self.card)["review_new"], 1)
+
+        task.status = "in_progress"
+        task.save(update_fields=["status"])
+        self.assertEqual(self.counters(self.card)["in_progress"], 1)
+
+        reloaded = Task.objects.get(pk=urgent.pk)
+        reloaded.status = "done"
+        reloaded.save()
+        self.assertEqual(self.counters(self.card)["urgent"], 0)
+        self.assertEqual(EventCard.objects.get(pk=self.card.pk).progress, {"total": 2, "done": 1, "percent": 50.0})
+
+        task.card = self.other_card
+        task.save()
+        self.assertEqual(self.counters(self.other_card)["total"], 1)
+        self.assertEqual(self.counters(self.card)["total"], 2)
+        self.assertCountersConsistent()
+
+        Task.objects.get(pk=task.pk).delete()
+        self.assertEqual(self.counters(self.other_card)["total"], 0)
+        self.assertCountersConsistent()
+
+    def test_recount_command_repairs_drift(self):
+        Task.objects.create(card=self.card, title="A", created_by=self.employee, status="done")
+        CardCounters.objects.filter(card=self.card).update(total=42, done=0)
+        CardCounters.objects.filter(card=self.other_card).delete()
+
+        call_command("recount_card_counters", stdout=StringIO())
+
+        self.assertEqual(self.counters(self.card)["total"], 1)
+        self.assertEqual(self.counters(self.card)["done"], 1)
+        self.assertEqual(self.counters(self.other_card)["total"], 0)
+
+
+class EmployeeContextTests(CacheResetTestCase):
+    """Сотрудник запроса загружается одним запросом и кешируется между запросами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.employee = make_employee("staff", department=cls.department)
+        cls.colleague = make_employee("colleague", department=cls.department)
+
+    def employee_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q["sql"] for q in ctx.captured_queries if '"tasks_employee"' in q["sql"]]
+
+    def test_employee_loaded_once_and_cached(self):
+        self.client.force_login(self.employee.user)
+
+        _, first = self.employee_queries(reverse("employee_list"))
+        self.assertEqual(len([sql for sql in first if "WHERE \"tasks_employee\".\"user_id\"" in sql]), 1)
+
+        _, second = self.employee_queries(reverse("task_list"))
+        self.assertFalse([sql for sql in second if "WHERE \"tasks_employee\".\"user_id\"" in sql])
+
+    def test_delegation_change_invalidates_cache(self):
+        self.client.force_login(self.employee.user)
+        self.assertEqual(self.client.get(reverse("task_list")).status_code, 200)
+
+        self.employee.delegate_to = self.colleague
+        self.employee.delegate_until = timezone.now().date() + timedelta(days=5)
+        self.employee.save()
+
+        response = self.client.get(reverse("task_list"))
+        self.assertRedirects(response, reverse("frozen_notice"), fetch_redirect_response=False)
+
+    def test_cancel_delegation_keeps_fresh_fields(self):
+        self.employee.delegate_to = self.colleague
+        self.employee.delegate_until = timezone.now().date() + timedelta(days=5)
+        self.employee.save()
+        self.client.force_login(self.employee.user)
+        self.client.get(reverse("frozen_notice"))  # сотрудник попал в кеш контекста
+
+        # администратор тем временем повысил сотрудника (без сигналов — кеш остался старым)
+        Employee.objects.filter(pk=self.employee.pk).update(role="head", position="Руководитель")
+        response = self.client.post(reverse("my_delegation"), {"cancel_delegation": "1"})
+        self.assertRedirects(response, reverse("my_delegation"), fetch_redirect_response=False)
+
+        self.employee.refresh_from_db()
+        self.assertEqual((self.employee.role, self.employee.position), ("head", "Руководитель"))
+        self.assertIsNone(self.employee.delegate_to)
+        self.assertEqual(self.client.get(reverse("task_list")).status_code, 200)
+
+
+class UnreadNotificationsCacheTests(CacheResetTestCase):
+    """Сводка непрочитанных для навбара живёт в кеше и обновляется при записи."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_employee("staff")
+        cls.user = cls.employee.user
+
+    def test_notify_and_read_write_through(self):
+        for i in range(4):
+            with self.captureOnCommitCallbacks(execute=True):
+                notify(self.user, f"Сообщение {i}", "/")
+        self.assertEqual(get_unread_summary(self.user.pk)["unread"], 4)
+
+        # только INSERT уведомления (поток событий выключен); сводка в кеше сбрасывается после коммита
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            notify(self.user, "Новое", "/")
+        summary = get_unread_summary(self.user.pk)
+        self.assertEqual(summary["unread"], 5)
+        self.assertEqual([item["message"] for item in summary["latest"]], ["Новое", "Сообщение 3", "Сообщение 2"])
+
+        self.client.force_login(self.user)
+        newest = Notification.objects.get(message="Новое")
+        self.client.get(reverse("notification_read", args=[newest.id]))
+        summary = get_unread_summary(self.user.pk)
+        self.assertEqual(summary["unread"], 4)
+        self.assertEqual(summary["latest"][0]["message"], "Сообщение 3")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("notifications_read_all"))
+        self.assertEqual(get_unread_summary(self.user.pk), {"unread": 0, "latest": []})
+
+    def test_rolled_back_notify_keeps_cached_summary(self):
+        self.assertEqual(get_unread_summary(self.user.pk)["unread"], 0)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    notify(self.user, "Откатится", "/")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(cache.get(f"unread_notifications:{self.user.pk}"), {"unread": 0, "latest": []})
+
+    def test_navbar_is_lazy(self):
+        self.client.force_login(self.user)
+        department = Department.objects.create(name="Отдел")
+        self.employee.department = department
+        self.employee.save()
+        card = EventCard.objects.create(title="Карточка", created_by=self.employee, visible=True)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("card_detail", args=[card.id]), {"ajax": "1"})
+        self.assertFalse([q for q in ctx.captured_queries if "tasks_notification" in q["sql"]])
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("task_list"))
+        self.assertContains(response, "Нет новых уведомлений")
+        self.assertTrue([q for q in ctx.captured_queries if "tasks_notification" in q["sql"]])
+
+
+class ReviewLinkTests(CacheResetTestCase):
+    """Задача на проверку связана с исходной задачей через Task.reviews_task."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.author = make_employee("author", role="head", department=cls.department)
+        cls.executor = make_employee("executor", department=cls.department)
+        cls.card = EventCard.objects.create(title="Карточка", created_by=cls.author, visible=True)
+
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(
+            card=self.card, title="Подготовить отчёт", created_by=self.author, assigned_employee=self.executor,
+        )
+
+    def execute(self, comment):
+        self.client.force_login(self.executor.user)
+        self.client.post(reverse("task_execute", args=[self.task.id]), {"execution_comment": comment})
+
+    def test_execute_links_and_reuses_open_review(self):
+        self.execute("Готово")
+        review = self.task.review_tasks.get()
+        self.assertEqual(review.task_type, "review")
+        self.assertEqual(review.assigned_employee, self.author)
+        self.assertNotIn("orig_task_id", review.description)
+
+        self.execute("Исправил")
+        self.assertEqual(self.task.review_tasks.count(), 1)
+
+    def test_review_approve_uses_link(self):
+        self.execute("Готово")
+        review = self.task.review_tasks.get()
+
+        self.client.force_login(self.author.user)
+        response = self.client.get(reverse("task_review", args=[review.id]))
+        self.assertEqual(response.context["base_task"], self.task)
+
+        self.client.post(reverse("task_review_approve", args=[review.id]), {"comment": "Принято"})
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, "done")
+        self.assertEqual(self.task.review_comment, "Принято")
+
+    def test_only_reviewer_decides(self):
+        self.execute("Готово")
+        review = self.task.review_tasks.get()
+        outsider = make_employee("outsider", role="head", department=self.department)
+
+        for user in (self.executor.user, outsider.user):
+            self.client.force_login(user)
+            for name in ("task_review_approve", "task_review_reject"):
+                response = self.client.post(reverse(name, args=[review.id]), {"comment": "Сам себе"})
+                self.assertRedirects(response, reverse("task_list"), fetch_redirect_response=False)
+        self.client.post(reverse("task_review_approve", args=[self.task.id]))  # не задача на проверку
+
+        self.task.refresh_from_db()
+        review.refresh_from_db()
+        self.assertEqual((self.task.status, review.status), ("sent_for_review", "new"))
+
+
+class SeedLoadDataTests(CacheResetTestCase):
+    def seed(self):
+        call_command(
+            "seed_load_data", departments=2, employees=5, cards=4, tasks=300,
+            notifications=2, batch_size=100, stdout=StringIO(),
+        )
+
+    def test_seed_creates_consistent_dataset(self):
+        self.seed()
+        self.assertEqual(Task.objects.count(), 300)
+        self.assertEqual(Employee.objects.filter(role="director").count(), 1)
+        self.assertTrue(TaskHistory.objects.exists())
+        # bulk_create минует сигналы — счётчики должны быть пересчитаны командой
+        for counters in CardCounters.objects.all():
+            self.assertEqual(counters.total, Task.objects.filter(card_id=counters.card_id).count())
+        # задачи-проверки ссылаются на обычные задачи той же карточки
+        for review in Task.objects.filter(task_type="review").select_related("reviews_task"):
+            self.assertEqual(review.reviews_task.card_id, review.card_id)
+
+    def test_refuses_to_seed_twice(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+
+class BenchmarkViewsTests(CacheResetTestCase):
+    def test_writes_json_report_for_all_pages(self):
+        call_command(
+            "seed_load_data", departments=2, employees=5, cards=3, tasks=200,
+            notifications=2, stdout=StringIO(),
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "bench.json")
+            call_command("benchmark_views", repeat=2, warmup=0, output=output, stderr=StringIO())
+            with open(output, encoding="utf-8") as f:
+                report = json.load(f)
+
+        results = report["results"]
+        self.assertTrue({"task_list", "card_detail", "card_detail_ajax", "card_detail_count",
+                         "notifications_list", "card_create", "task_detail"} <= set(results))
+        for name, result in results.items():
+            self.assertEqual(result["status"], 200, name)
+            self.assertGreater(result["queries"], 0, name)
+
+
+class RequestProfilingMiddlewareTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.employee = make_employee("worker", role="head", department=cls.department)
+        for i in range(3):
+            EventCard.objects.create(title=f"Карточка {i}", created_by=cls.employee, visible=True)
+
+    def test_staff_can_profile_single_request(self):
+        User.objects.filter(pk=self.employee.user_id).update(is_staff=True)
+        self.client.force_login(self.employee.user)
+        with self.assertLogs("tasks.profiling", level="INFO") as logs:
+            response = self.client.get(reverse("task_list"), {"_profile": "1"})
+
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'sql;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn("tpl;dur=", timing)
+        self.assertIn("total;dur=", timing)
+        self.assertIn("GET /?_profile=1 200", logs.output[0])
+
+    def test_template_hook_installed_once_at_startup(self):
+        from django.template.backends.django import Template as DjangoTemplate
+
+        self.assertIs(DjangoTemplate.render, profiling._profiled_template_render)
+        with mock.patch.object(DjangoTemplate, "render", profiling._original_template_render):
+            RequestProfilingMiddleware(lambda request: None)  # создание middleware шаблоны не трогает
+            self.assertIs(DjangoTemplate.render, profiling._original_template_render)
+            with override_settings(MIDDLEWARE=[]):
+                profiling.install_template_timing()
+            self.assertIs(DjangoTemplate.render, profiling._original_template_render)
+
+    def test_param_ignored_for_regular_users(self):
+        self.client.force_login(self.employee.user)
+        with mock.patch.object(RequestProfilingMiddleware, "start_profile") as start_profile:
+            response = self.client.get(reverse("task_list"), {"_profile": "1"})
+            self.client.logout()
+            self.client.get(reverse("task_list"), {"_profile": "1"})
+        self.assertNotIn("Server-Timing", response)
+        start_profile.assert_not_called()  # замеры даже не включались
+
+    def test_param_must_be_one(self):
+        User.objects.filter(pk=self.employee.user_id).update(is_staff=True)
+        self.client.force_login(self.employee.user)
+        self.assertNotIn("Server-Timing", self.client.get(reverse("task_list"), {"_profile": "0"}))
+
+    @override_settings(REQUEST_PROFILING=True)
+    def test_setting_profiles_every_request_and_reports_duplicates(self):
+        self.client.force_login(self.employee.user)
+        with self.assertLogs("tasks.profiling", level="INFO"):
+            # без ?_profile, но с настройкой
+            response = self.client.get(reverse("task_list"))
+        self.assertIn("Server-Timing", response)
+
+        # N+1 в представлении попадает в список повторяющихся запросов
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile.record_query):
+            for card in EventCard.objects.all():
+                Task.objects.filter(card=card).count()
+        self.assertEqual(profile.duplicates[0][1], 3)
+
+
+class SqliteBackendTests(TransactionTestCase):
+    def test_pragmas_and_immediate_transactions(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], connection.pragmas["busy_timeout"])
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+        with CaptureQueriesContext(connection) as ctx:
+            with transaction.atomic():
+                Department.objects.create(name="Отдел")
+        self.assertEqual(ctx.captured_queries[0]["sql"], "BEGIN IMMEDIATE")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TaskFanOutTests(CacheResetTestCase):
+    """Задача многим адресатам создаётся пачкой: число запросов не зависит от числа адресатов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.director = make_employee("director", role="director", department=cls.department)
+        cls.card = EventCard.objects.create(title="Карточка", created_by=cls.director, visible=True)
+        cls.staff = [make_employee(f"staff{i}", department=cls.department) for i in range(12)]
+
+    def create(self, recipients, upload=None):
+        data = {
+            "title": "Подготовить отчёт", "description": "", "status": "new",
+            "recipients": [e.id for e in recipients],
+        }
+        if upload:
+            data["attachment"] = upload
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse("task_create_for_card", args=[self.card.id]), data)
+        self.assertRedirects(response, reverse("card_detail", args=[self.card.id]), fetch_redirect_response=False)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_recipients(self):
+        self.client.force_login(self.director.user)
+        self.create(self.staff[:1])  # прогрев кеша сотрудника
+        few = self.create(self.staff[:3])
+        many = self.create(self.staff)
+        self.assertEqual(few, many)
+
+        tasks = Task.objects.filter(card=self.card)
+        self.assertEqual(tasks.count(), 16)
+        self.assertEqual(TaskHistory.objects.filter(task__card=self.card, action="created").count(), 16)
+        self.assertEqual(Task.recipients.through.objects.filter(task__card=self.card).count(), 16)
+        self.assertEqual(Notification.objects.filter(user=self.staff[0].user).count(), 3)
+        counters = CardCounters.objects.get(card=self.card)
+        self.assertEqual((counters.total, counters.new), (16, 16))
+
+    def test_upload_is_stored_once(self):
+        self.client.force_login(self.director.user)
+        self.create(self.staff[:5], SimpleUploadedFile("plan.txt", b"content"))
+        names = set(Task.objects.filter(card=self.card).values_list("attachment", flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertTrue(os.path.isfile(os.path.join(settings.MEDIA_ROOT, names.pop())))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), JOBS_RUN_INLINE=True)
+class ContentAddressedStorageTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_employee("author", role="head")
+        cls.card = EventCard.objects.create(title="Карточка", created_by=cls.author)
+
+    def make_task(self, upload):
+        return Task.objects.create(card=self.card, title="Задача", created_by=self.author, attachment=upload)
+
+    def test_same_content_is_stored_once(self):
+        first = self.make_task(SimpleUploadedFile("contract.docx", b"same"))
+        second = self.make_task(SimpleUploadedFile("contract_copy.docx", b"same"))
+        other = self.make_task(SimpleUploadedFile("contract.docx", b"other"))
+        self.assertEqual(first.attachment.name, second.attachment.name)
+        self.assertTrue(first.attachment.name.endswith("/contract.docx"))
+        self.assertNotEqual(first.attachment.name, other.attachment.name)
+
+    @override_settings(CONTENT_STORAGE_GRACE_SECONDS=0)
+    def test_file_removed_with_last_reference(self):
+        first = self.make_task(SimpleUploadedFile("plan.docx", b"plan"))
+        second = self.make_task(SimpleUploadedFile("plan.docx", b"plan"))
+        path = first.attachment.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_recent_file_is_kept_until_sweep(self):
+        task = self.make_task(SimpleUploadedFile("plan.docx", b"recent"))
+        path = task.attachment.path
+        with self.captureOnCommitCallbacks(execute=True):
+            task.delete()
+        self.assertTrue(os.path.exists(path))  # мог быть только что отдан повторной загрузке
+
+        self.assertEqual(storage.sweep_unreferenced(), 0)
+        old = timezone.now().timestamp() - settings.CONTENT_STORAGE_GRACE_SECONDS - 60
+        os.utime(path, (old, old))
+        self.assertEqual(storage.sweep_unreferenced(), 1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_dedupe_hit_refreshes_grace_period(self):
+        first = self.make_task(SimpleUploadedFile("plan.docx", b"reused"))
+        old = timezone.now().timestamp() - settings.CONTENT_STORAGE_GRACE_SECONDS - 60
+        os.utime(first.attachment.path, (old, old))
+        second = self.make_task(SimpleUploadedFile("plan.docx", b"reused"))
+        self.assertEqual(first.attachment.name, second.attachment.name)
+        self.assertTrue(storage.content_storage.is_recent(second.attachment.name))
+
+    def test_migrate_existing_files(self):
+        source = tempfile.mkdtemp()
+        os.makedirs(os.path.join(source, "event_plans"))
+        for name in ("contract.docx", "contract_FxThD6w.docx"):
+            with open(os.path.join(source, "event_plans", name), "wb") as f:
+                f.write(b"contract")
+        EventCard.objects.filter(pk=self.card.pk).update(plan_file="event_plans/contract.docx")
+        task = self.make_task(None)
+        Task.objects.filter(pk=task.pk).update(attachment="event_plans/contract_FxThD6w.docx")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("migrate_files_to_content_storage", source_root=source, stdout=StringIO())
+
+        self.card.refresh_from_db()
+        task.refresh_from_db()
+        self.assertTrue(self.card.plan_file.name.startswith("cas/"))
+        self.assertEqual(self.card.plan_file.name, task.attachment.name)
+        self.assertEqual(os.listdir(os.path.join(source, "event_plans")), [])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class FileDownloadTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.author = make_employee("author", role="head", department=cls.department)
+        cls.executor = make_employee("executor", department=cls.department)
+        cls.outsider = make_employee("outsider")
+
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(
+            title="Отчёт", created_by=self.author, assigned_employee=self.executor,
+            attachment=SimpleUploadedFile("report.xlsx", b"0123456789"),
+        )
+        self.url = reverse("task_attachment_download", args=[self.task.id])
+
+    def test_full_and_conditional_download(self):
+        self.client.force_login(self.executor.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertIn('filename="report.xlsx"', response["Content-Disposition"])
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        self.client.force_login(self.executor.user)
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=20-")
+        self.assertEqual(response.status_code, 416)
+
+        # файл изменился (другой ETag) — If-Range отменяет диапазон
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_outsider_is_forbidden(self):
+        self.client.force_login(self.outsider.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @override_settings(FILE_DOWNLOAD_OFFLOAD="x-accel-redirect")
+    def test_offload_to_proxy(self):
+        self.client.force_login(self.author.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + self.task.attachment.name)
+        self.assertEqual(response.content, b"")
+
+    def test_offload_headers_with_cyrillic_name(self):
+        task = Task.objects.create(
+            title="Письмо", created_by=self.author, assigned_employee=self.executor,
+            attachment=SimpleUploadedFile("АЛҒЫС_ХАТ__ФОРУМ.docx", b"docx"),
+        )
+        url = reverse("task_attachment_download", args=[task.id])
+        self.client.force_login(self.author.user)
+
+        with self.settings(FILE_DOWNLOAD_OFFLOAD="x-accel-redirect"):
+            header = self.client.get(url)["X-Accel-Redirect"]
+        self.assertTrue(header.isascii())
+        self.assertNotIn("=?utf-8?", header)
+        self.assertEqual(unquote(header), "/protected-media/" + task.attachment.name)
+
+        with self.settings(FILE_DOWNLOAD_OFFLOAD="x-sendfile"):
+            header = self.client.get(url)["X-Sendfile"]
+        self.assertTrue(header.isascii())
+        self.assertEqual(unquote(header), task.attachment.path)
+
+    def test_media_is_not_served_directly(self):
+        # маршруты собираются при импорте, а тесты идут с DEBUG=False — смотрим urlpatterns при DEBUG=True
+        import taskmanager.urls
+
+        with self.settings(DEBUG=True):
+            patterns = [str(pattern.pattern) for pattern in importlib.reload(taskmanager.urls).urlpatterns]
+        importlib.reload(taskmanager.urls)
+        self.assertFalse([pattern for pattern in patterns if settings.MEDIA_URL.strip("/") in pattern])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), JOBS_RUN_INLINE=True)
+class FilePreviewTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.director = make_employee("director", role="director")
+
+    def docx_upload(self, text):
+        import docx
+
+        document = docx.Document()
+        document.add_paragraph(text)
+        buffer = io.BytesIO()
+        document.save(buffer)
+        return SimpleUploadedFile("plan.docx", buffer.getvalue())
+
+    def xlsx_upload(self):
+        import openpyxl
+
+        workbook = openpyxl.Workbook()
+        workbook.active.append(["Смета", 1500])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return SimpleUploadedFile("budget.xlsx", buffer.getvalue())
+
+    def test_preview_is_queued_once(self):
+        def preview_jobs():
+            return Job.objects.filter(func="tasks.utils.previews.generate_preview").count()
+
+        with self.settings(JOBS_RUN_INLINE=False):
+            old = Task.objects.create(
+                title="Старый формат", created_by=self.director, attachment=SimpleUploadedFile("plan.doc", b"doc"),
+            )
+            self.assertEqual(preview_jobs(), 0)  # у .doc превью не бывает
+
+            task = Task.objects.create(title="План", created_by=self.director, attachment=self.docx_upload("План"))
+            self.assertEqual(preview_jobs(), 1)
+            for status in ("in_progress", "sent_for_review", "done"):
+                task.status = status
+                task.save(update_fields=["status"])
+            task.title = "План (правка)"
+            task.save()  # файл тот же, превью уже в очереди
+            old.save()
+            self.assertEqual(preview_jobs(), 1)
+
+    def test_plan_preview_built_after_commit_and_shown(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            card = EventCard.objects.create(
+                title="Карточка", created_by=self.director, plan_file=self.docx_upload("План конференции"),
+            )
+        self.assertTrue(previews.has_preview(card.plan_file.name, "png"))
+
+        self.client.force_login(self.director.user)
+        url = reverse("card_plan_download", args=[card.id])
+        self.assertContains(self.client.get(reverse("card_detail", args=[card.id])), f"{url}?preview=png")
+
+        response = self.client.get(url, {"preview": "html"})
+        self.assertEqual(response["Content-Type"], "text/html; charset=utf-8")
+        self.assertIn("План конференции", b"".join(response.streaming_content).decode())
+        response = self.client.get(url, {"preview": "png"})
+        self.assertEqual(b"".join(response.streaming_content)[:8], b"\x89PNG\r\n\x1a\n")
+
+    def test_preview_cached_by_content(self):
+        content = self.xlsx_upload().read()
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(
+                title="Смета", created_by=self.director, attachment=SimpleUploadedFile("budget.xlsx", content),
+            )
+        self.assertTrue(previews.has_preview(task.attachment.name, "html"))
+        with open(previews.preview_path(task.attachment.name, "html"), encoding="utf-8") as f:
+            self.assertIn("Смета", f.read())
+
+        # тот же файл ещё раз — новое превью не строится
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Task.objects.create(
+                title="Копия", created_by=self.director, attachment=SimpleUploadedFile("copy.xlsx", content),
+            )
+        self.assertEqual(callbacks, [])
+
+    def test_unsupported_format_has_no_preview(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(
+                title="Старый план", created_by=self.director,
+                attachment=SimpleUploadedFile("plan.doc", b"\xd0\xcf\x11\xe0"),
+            )
+        self.assertFalse(previews.has_preview(task.attachment.name))
+
+
+# вызывается воркером по пути "tasks.tests.flaky_job"
+FLAKY_CALLS = []
+
+
+def flaky_job(fail_times=0, value=None):
+    FLAKY_CALLS.append(value)
+    if len(FLAKY_CALLS) <= fail_times:
+        raise RuntimeError("временная ошибка")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        FLAKY_CALLS.clear()
+
+    def test_enqueue_claim_and_run(self):
+        job = jobs.enqueue(flaky_job, value=1)
+        self.assertEqual((job.func, job.kwargs, job.status), ("tasks.tests.flaky_job", {"value": 1}, "queued"))
+
+        claimed = jobs.claim_job("w1")
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, "running")
+        self.assertIsNone(jobs.claim_job("w2"))  # уже захвачена
+
+        self.assertTrue(jobs.run_job(claimed))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("done", 1))
+        self.assertEqual(FLAKY_CALLS, [1])
+
+    def test_delayed_job_is_not_claimed_early(self):
+        jobs.enqueue(flaky_job, delay=60)
+        self.assertIsNone(jobs.claim_job("w1"))
+
+    def test_retry_with_backoff_then_dead(self):
+        job = jobs.enqueue(flaky_job, fail_times=10, max_attempts=2)
+        self.assertFalse(jobs.run_job(jobs.claim_job("w1")))
+        job.refresh_from_db()
+        self.assertEqual(job.status, "queued")
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn("временная ошибка", job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertFalse(jobs.run_job(jobs.claim_job("w1")))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("dead", 2))
+
+    def test_stale_running_job_is_requeued(self):
+        job = jobs.enqueue(flaky_job)
+        jobs.claim_job("w1")
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        self.assertEqual(jobs.claim_job("w2").pk, job.pk)
+
+    def test_job_crashing_the_worker_goes_dead(self):
+        job = jobs.enqueue(flaky_job, max_attempts=2)
+        for worker_id in ("w1", "w2"):
+            # воркер захватил задачу и упал, не дойдя до run_job
+            self.assertEqual(jobs.claim_job(worker_id).pk, job.pk)
+            Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+            jobs.requeue_stale_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("dead", 2))
+        self.assertIsNone(jobs.claim_job("w3"))
+
+
+class RunWorkerTests(TransactionTestCase):
+    def setUp(self):
+        FLAKY_CALLS.clear()
+
+    def test_burst_worker_processes_queue(self):
+        for i in range(5):
+            jobs.enqueue(flaky_job, value=i)
+        call_command("run_worker", concurrency=2, burst=True, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(sorted(FLAKY_CALLS), [0, 1, 2, 3, 4])
+        self.assertEqual(Job.objects.filter(status="done").count(), 5)
+
+
+class SchedulerTests(CacheResetTestCase):
+    def test_next_after_daily_and_monthly(self):
+        tz = timezone.get_current_timezone()
+        moment = timezone.make_aware(timezone.datetime(2025, 1, 31, 12, 0), tz)
+        daily = scheduler.Schedule("d", "x", at=time(9, 0))
+        monthly = scheduler.Schedule("m", "x", day=1, at=time(0, 5))
+        self.assertEqual(daily.next_after(moment), timezone.make_aware(timezone.datetime(2025, 2, 1, 9, 0), tz))
+        self.assertEqual(monthly.next_after(moment), timezone.make_aware(timezone.datetime(2025, 2, 1, 0, 5), tz))
+        december = timezone.make_aware(timezone.datetime(2025, 12, 2), tz)
+        self.assertEqual(monthly.next_after(december).date(), date(2026, 1, 1))
+
+    def test_single_leader_and_takeover(self):
+        now = timezone.now()
+        started = scheduler.tick("a", now)
+        self.assertEqual(sorted(started), sorted(scheduler.get_schedule()))
+        self.assertEqual(Job.objects.count(), len(scheduler.SCHEDULE))
+
+        # второй процесс не лидер, пока аренда "a" действует; сам "a" повторно ничего не ставит
+        self.assertIsNone(scheduler.tick("b", now + timedelta(seconds=10)))
+        self.assertEqual(scheduler.tick("a", now + timedelta(seconds=20)), [])
+
+        # "a" пропал — после истечения аренды лидером становится "b" и ставит то, чей срок подошёл
+        self.assertEqual(scheduler.tick("b", now + timedelta(minutes=10)), ["requeue_stale_jobs"])
+        self.assertIsNone(scheduler.tick("a", now + timedelta(minutes=11)))
+
+    def test_missed_runs_are_caught_up_once(self):
+        tz = timezone.get_current_timezone()
+        now = timezone.make_aware(timezone.datetime(2025, 3, 10, 12, 0), tz)
+        scheduler.sync_schedule(now)
+        PeriodicTask.objects.exclude(name="expire_delegations").update(next_run_at=now + timedelta(days=1))
+        # планировщик стоял с 7 марта: пропущены запуски 7, 8 и 9 числа, выполняем один раз (за 10-е)
+        PeriodicTask.objects.filter(name="expire_delegations").update(
+            next_run_at=timezone.make_aware(timezone.datetime(2025, 3, 7, 0, 10), tz),
+        )
+
+        self.assertEqual(scheduler.tick("a", now), ["expire_delegations"])
+        periodic = PeriodicTask.objects.get(name="expire_delegations")
+        self.assertEqual(periodic.missed_runs, 3)
+        self.assertGreater(periodic.next_run_at, now)
+        self.assertEqual(Job.objects.get().func, "tasks.utils.periodic.expire_delegations")
+
+    def test_disabled_task_is_skipped(self):
+        now = timezone.now()
+        scheduler.sync_schedule(now)
+        PeriodicTask.objects.exclude(name="deadline_reminders").update(enabled=False)
+        self.assertEqual(scheduler.tick("a", now), ["deadline_reminders"])
+
+
+class PeriodicJobsTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.author = make_employee("author", role="head", department=cls.department)
+        cls.worker = make_employee("worker", department=cls.department)
+        cls.colleague = make_employee("colleague", department=cls.department)
+
+    def test_expire_delegations(self):
+        today = timezone.localdate()
+        Employee.objects.filter(pk=self.worker.pk).update(
+            delegate_to=self.colleague, delegate_until=today - timedelta(days=1),
+        )
+        Employee.objects.filter(pk=self.author.pk).update(delegate_to=self.colleague, delegate_until=today)
+
+        self.assertEqual(periodic.expire_delegations(today), 1)
+        self.worker.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertIsNone(self.worker.delegate_to)
+        self.assertEqual(self.author.delegate_to, self.colleague)  # последний день ещё действует
+        self.assertTrue(Notification.objects.filter(user=self.worker.user, message__contains="истёк").exists())
+
+    def test_deadline_reminders_once_per_day(self):
+        today = timezone.localdate()
+        due = Task.objects.create(
+            title="Отчёт", created_by=self.author, assigned_employee=self.worker, due_date=today + timedelta(days=1),
+        )
+        Task.objects.create(
+            title="Позже", created_by=self.author, assigned_employee=self.worker, due_date=today + timedelta(days=5),
+        )
+        Task.objects.create(
+            title="Готово", created_by=self.author, assigned_employee=self.worker, status="done", due_date=today,
+        )
+        # исполнитель в замещении — напоминание получает замещающий
+        Employee.objects.filter(pk=self.worker.pk).update(delegate_to=self.colleague, delegate_until=today)
+
+        self.assertEqual(periodic.send_deadline_reminders(today, days=1), 1)
+        self.assertEqual(periodic.send_deadline_reminders(today, days=1), 0)
+        note = Notification.objects.get(message__startswith="⏰")
+        self.assertEqual((note.user, note.url), (self.colleague.user, due.get_absolute_url()))
+
+    def test_monthly_department_cards_are_idempotent(self):
+        make_employee("admin")
+        today = date(2025, 3, 15)
+        self.assertEqual(periodic.create_monthly_department_cards(today), 1)
+        self.assertEqual(periodic.create_monthly_department_cards(today), 0)
+        card = EventCard.objects.get(responsible_department=self.department)
+        self.assertEqual((card.title, card.start_date, card.end_date), ("ОТД Март", date(2025, 3, 1), date(2025, 3, 31)))
+        self.assertFalse(card.visible)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), JOBS_RUN_INLINE=True)
+class SearchTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.other_department = Department.objects.create(name="Другой", shortname="ДР")
+        cls.author = make_employee("author", role="head", department=cls.department)
+        cls.worker = make_employee("worker", department=cls.department)
+        cls.outsider = make_employee("outsider", department=cls.other_department)
+        cls.director = make_employee("director", role="director")
+        cls.card = EventCard.objects.create(
+            title="Фестиваль молодёжи", description="Қазақстан жастарының фестивалі",
+            created_by=cls.author, responsible_department=cls.department, visible=False,
+        )
+        cls.task = Task.objects.create(
+            card=cls.card, title="Подготовить отчёт", description="Сводный отчёт по мероприятиям",
+            created_by=cls.author, assigned_employee=cls.worker,
+        )
+
+    def titles(self, employee, query, **kwargs):
+        return [(hit.entry.kind, hit.entry.title) for hit in search.search(employee, query, **kwargs)]
+
+    def test_stemming_and_prefix_match(self):
+        self.assertEqual(search.stem("отчётами".replace("ё", "е")), "отчет")
+        self.assertEqual(search.stem("жастарының"), "жастары")
+        self.assertIn(("task", "Подготовить отчет"), self.titles(self.worker, "отчётами"))
+        self.assertIn(("card", "Фестиваль молодежи"), self.titles(self.worker, "фестивале"))
+        self.assertIn(("card", "Фестиваль молодежи"), self.titles(self.worker, "Қазақстан"))
+
+    def test_results_respect_permissions(self):
+        self.assertEqual(self.titles(self.outsider, "отчет"), [])
+        self.assertEqual(self.titles(self.outsider, "фестиваль"), [])
+        self.assertEqual(len(self.titles(self.director, "отчет")), 1)
+        self.card.visible = True
+        self.card.save(update_fields=["visible"])
+        self.assertEqual(self.titles(self.outsider, "фестиваль"), [("card", "Фестиваль молодежи")])
+
+    def test_results_follow_policy_of_linked_page(self):
+        reviewer = make_employee("reviewer", department=self.other_department)
+        Task.objects.create(
+            card=self.card, title="Проверка", created_by=self.author, assigned_employee=reviewer,
+            task_type="review", reviews_task=self.task,
+        )
+        # результат ведёт на task_detail, а его правило ("task.view") проверяющему задачу не открывает
+        self.assertNotIn(("task", "Подготовить отчет"), self.titles(reviewer, "отчет"))
+        self.assertFalse(policy.Policy(reviewer).can("task.view", self.task))
+
+    def test_index_follows_changes(self):
+        self.task.title = "Согласовать бюджет"
+        self.task.review_comment = "Нужны сметы"
+        self.task.save()
+        self.assertEqual(self.titles(self.worker, "отчет", kinds=["task"]), [("task", "Согласовать бюджет")])
+        self.assertEqual(len(self.titles(self.worker, "сметы")), 1)
+
+        history = TaskHistory.objects.create(task=self.task, employee=self.worker, action="rejected",
+                                             comment="Переделать таблицу расходов")
+        self.assertEqual(self.titles(self.author, "расходов"), [("history", "Согласовать бюджет")])
+        history.delete()
+        self.assertEqual(self.titles(self.author, "расходов"), [])
+
+        self.task.delete()
+        self.assertEqual(self.titles(self.director, "бюджет"), [])
+
+    def test_search_view_ranks_and_highlights(self):
+        Task.objects.create(card=self.card, title="Разное", description="упомянут отчет",
+                            created_by=self.author, assigned_employee=self.worker)
+        self.client.force_login(self.worker.user)
+        response = self.client.get(reverse("search"), {"q": "отчет"})
+        self.assertEqual(response.status_code, 200)
+        hits = response.context["hits"]
+        self.assertEqual(hits[0].entry.title, "Подготовить отчет")  # совпадение в заголовке весомее
+        self.assertIn("<mark>отчет</mark>", hits[0].snippet)
+        self.assertContains(response, reverse("task_detail", args=[self.task.pk]))
+
+    def test_fan_out_tasks_are_indexed(self):
+        from .utils.task_fanout import create_tasks_for_recipients
+
+        create_tasks_for_recipients(self.card, self.author, [self.worker, self.author], title="Инвентаризация")
+        self.assertEqual(len(self.titles(self.director, "инвентаризация")), 2)
+
+    def test_plan_text_is_indexed_in_background(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.card.plan_file = SimpleUploadedFile("plan.txt", "Концерт на площади\n".encode())
+            self.card.save()
+        self.assertEqual(self.titles(self.author, "концерт"), [("plan", "Фестиваль молодежи")])
+        hit = search.search(self.author, "концерт")[0]
+        self.assertEqual(hit.url, reverse("card_plan_download", args=[self.card.id]))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), JOBS_RUN_INLINE=True)
+class TextExtractionTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.director = make_employee("director", role="director")
+
+    def docx_bytes(self):
+        import docx
+
+        document = docx.Document()
+        document.add_paragraph("План  конференции")
+        table = document.add_table(rows=1, cols=2)
+        table.cell(0, 0).text, table.cell(0, 1).text = "Зал", "Актовый"
+        document.add_paragraph("Итоги")
+        buffer = io.BytesIO()
+        document.save(buffer)
+        return buffer.getvalue()
+
+    def xlsx_bytes(self, rows):
+        import openpyxl
+
+        workbook = openpyxl.Workbook()
+        for i in range(rows):
+            workbook.active.append([f"Статья {i}", i * 100, None])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+
+    def test_docx_text_in_document_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(
+                title="План", created_by=self.director,
+                attachment=SimpleUploadedFile("plan.docx", self.docx_bytes()),
+            )
+        self.assertEqual(text_extraction.get_text(task.attachment.name), "План конференции\nЗал\tАктовый\nИтоги")
+
+    def test_same_content_extracted_once(self):
+        content = self.xlsx_bytes(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Task.objects.create(
+                title="Смета", created_by=self.director, attachment=SimpleUploadedFile("a.xlsx", content),
+            )
+        self.assertIn("Статья 2\t200", text_extraction.get_text(first.attachment.name))
+
+        # то же содержимое в другом месте — задача в очередь не ставится, файл не открывается
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            attachment = TaskAttachment.objects.create(task=first, file=SimpleUploadedFile("b.xlsx", content))
+        self.assertEqual(callbacks, [])
+        with mock.patch.dict(text_extraction.EXTRACTORS, {".xlsx": mock.Mock(side_effect=AssertionError)}):
+            self.assertEqual(text_extraction.extract_file_text(attachment.file.name).status, "ok")
+        self.assertEqual(ExtractedText.objects.count(), 1)
+
+    def test_legacy_file_is_queued_once(self):
+        name = "task_attachments/old.txt"  # загружен до хранилища по хешу: хеша в имени нет
+
+        def jobs_for_name():
+            return Job.objects.filter(func="tasks.utils.text_extraction.extract_file_text", kwargs={"name": name})
+
+        with self.settings(JOBS_RUN_INLINE=False):
+            text_extraction.schedule_text_extraction(name)
+            text_extraction.schedule_text_extraction(name)  # уже в очереди
+            self.assertEqual(jobs_for_name().count(), 1)
+
+            jobs_for_name().update(status="done")
+            ExtractedText.objects.create(digest="0" * 64, source_name=name, text="Старый файл")
+            text_extraction.schedule_text_extraction(name)  # уже извлечён
+            self.assertEqual(jobs_for_name().count(), 1)
+
+    @override_settings(TEXT_EXTRACTION_MAX_CHARS=200)
+    def test_large_spreadsheet_is_capped(self):
+        name = text_extraction.content_storage.save("big.xlsx", SimpleUploadedFile("big.xlsx", self.xlsx_bytes(2000)))
+        result = text_extraction.extract_file_text(name)
+        self.assertTrue(result.truncated)
+        self.assertLessEqual(len(result.text), 200)
+        self.assertTrue(result.text.startswith("Sheet\nСтатья 0\t0"))
+
+    def test_broken_file_is_remembered_as_error(self):
+        name = text_extraction.content_storage.save("bad.pdf", SimpleUploadedFile("bad.pdf", b"not a pdf"))
+        self.assertEqual(text_extraction.extract_file_text(name).status, "error")
+        self.assertIsNone(text_extraction.get_text(name))
+        self.assertEqual(ExtractedText.objects.count(), 1)
+
+    @override_settings(CONTENT_STORAGE_GRACE_SECONDS=0)
+    def test_text_removed_with_last_reference(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(
+                title="План", created_by=self.director,
+                attachment=SimpleUploadedFile("plan.txt", "Текст плана".encode()),
+            )
+        self.assertEqual(ExtractedText.objects.count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            task.delete()
+        self.assertEqual(ExtractedText.objects.count(), 0)
+
+    def test_backfill_command(self):
+        name = text_extraction.content_storage.save("old.txt", SimpleUploadedFile("old.txt", "Старый план".encode()))
+        Task.objects.filter(pk=Task.objects.create(title="Старая", created_by=self.director).pk).update(attachment=name)
+        out = StringIO()
+        call_command("extract_file_texts", stdout=out)
+        self.assertIn("с текстом: 1", out.getvalue())
+        self.assertEqual(text_extraction.get_text(name), "Старый план")
+
+
+class CardTaskPaginationTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.director = make_employee("director", role="director", department=cls.department)
+        cls.worker = make_employee("worker", department=cls.department)
+        cls.card = EventCard.objects.create(
+            title="ОТД Март", created_by=cls.director, responsible_department=cls.department,
+        )
+        statuses = ["new", "in_progress", "done", "rejected"]
+        Task.objects.bulk_create([
+            Task(
+                card=cls.card, title=f"Задача {i}", created_by=cls.director, assigned_employee=cls.worker,
+                status=statuses[i % 4], priority="urgent" if i % 10 == 0 else "normal",
+            )
+            for i in range(120)
+        ])
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.director.user)
+        self.url = reverse("card_detail", args=[self.card.id])
+
+    def test_list_rank_follows_status(self):
+        task = Task.objects.filter(card=self.card, status="new", priority="normal").first()
+        self.assertEqual(task.list_rank, 3)
+        task.status = "done"
+        task.save(update_fields=["status"])
+        task.refresh_from_db()
+        self.assertEqual(task.list_rank, 5)
+
+    def test_pages_cover_list_in_order_without_gaps(self):
+        response = self.client.get(self.url, {"owner": "all"})
+        first = list(response.context["tasks"])
+        self.assertEqual(len(first), 50)
+        cursor = response.context["next_cursor"]
+
+        seen = [task.id for task in first]
+        pages = 1
+        while cursor:
+            data = self.client.get(self.url, {"owner": "all", "ajax": "1", "cursor": cursor}).json()
+            seen += [int(pk) for pk in re.findall(r'href="/task/(\d+)/"', data["html"])]
+            cursor = data["next_cursor"]
+            pages += 1
+        self.assertEqual(pages, 3)
+
+        expected = list(Task.objects.filter(card=self.card).order_by("list_rank", "id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(Task.objects.get(pk=seen[0]).priority, "urgent")
+
+    def test_page_cost_does_not_grow_with_depth(self):
+        def page_queries(cursor):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(self.url, {"owner": "all", "filter": "all", "ajax": "1", "cursor": cursor})
+            return len(ctx.captured_queries)
+
+        ordered = Task.objects.filter(card=self.card).order_by("list_rank", "id")
+        shallow, deep = ordered[49], ordered[99]
+        page_queries("")  # прогрев кеша сессии и контекста сотрудника
+        self.assertEqual(page_queries(f"{shallow.list_rank}.{shallow.id}"), page_queries(f"{deep.list_rank}.{deep.id}"))
+
+        # глубокая страница — без OFFSET, по индексу карточки
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url, {"owner": "all", "ajax": "1", "cursor": f"{deep.list_rank}.{deep.id}"})
+        page_sql = next(q["sql"] for q in ctx.captured_queries if "LIMIT 51" in q["sql"])
+        self.assertNotIn("OFFSET", page_sql)
+        plan = " ".join(str(row) for row in connection.cursor().execute(f"EXPLAIN QUERY PLAN {page_sql}").fetchall())
+        self.assertIn("task_card_rank_idx", plan)
+
+    def test_mine_filter_has_no_duplicates_for_recipients(self):
+        task = Task.objects.filter(card=self.card).first()
+        task.recipients.add(self.worker, self.director)
+        self.client.force_login(self.worker.user)
+        response = self.client.get(self.url, {"owner": "mine", "filter": "all", "ajax": "1"})
+        ids = [t.id for t in response.context["tasks"]]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_broken_cursor_starts_from_first_page(self):
+        response = self.client.get(self.url, {"owner": "all", "ajax": "1", "cursor": "oops"})
+        self.assertEqual(len(response.json()["html"].split("<li")) - 1, 50)
+
+
+class CardStatsTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.director = make_employee("director", role="director", department=cls.department)
+        cls.worker = make_employee("worker", department=cls.department)
+        cls.card = EventCard.objects.create(
+            title="ОТД Март", created_by=cls.director, responsible_department=cls.department,
+        )
+        statuses = ["new", "in_progress", "done", "rejected"]
+        for i in range(12):
+            Task.objects.create(
+                card=cls.card, title=f"Задача {i}", created_by=cls.director,
+                assigned_employee=cls.worker if i % 2 else cls.director,
+                status=statuses[i % 4], priority="urgent" if i % 3 == 0 else "normal",
+                task_type="review" if i == 11 else "regular",
+            )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.worker.user)
+        self.url = reverse("card_stats", args=[self.card.id])
+
+    def test_owner_stats_in_one_query(self):
+        self.client.get(self.url, {"owner": "mine"})  # прогрев кеша сессии и контекста сотрудника
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(self.url, {"owner": "mine"}).json()
+        task_queries = [q["sql"] for q in ctx.captured_queries if 'FROM "tasks_task"' in q["sql"]]
+        self.assertEqual(len(task_queries), 1)
+
+        mine = Task.objects.filter(card=self.card, assigned_employee=self.worker)
+        for name in ("total", "new", "in_progress", "done", "urgent", "review"):
+            self.assertEqual(data[name], mine.filter(COUNTER_FILTERS[name]).count(), name)
+        self.assertEqual(data["progress"], EventCard.objects.get(pk=self.card.pk).progress)
+
+    def test_not_modified_until_card_changes(self):
+        response = self.client.get(self.url, {"owner": "mine"})
+        etag = response["ETag"]
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {"owner": "mine"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('FROM "tasks_task"' in q["sql"] for q in ctx.captured_queries))
+
+        task = Task.objects.filter(card=self.card, status="new").first()
+        task.status = "in_progress"
+        task.save()
+        response = self.client.get(self.url, {"owner": "mine"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_recipient_change_bumps_version(self):
+        etag = self.client.get(self.url, {"owner": "mine"})["ETag"]
+        task = Task.objects.filter(card=self.card, assigned_employee=self.director).first()
+        task.recipients.add(self.worker)
+        response = self.client.get(self.url, {"owner": "mine"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total"], 7)
+
+        etag = response["ETag"]
+        self.worker.received_tasks.clear()
+        self.assertEqual(self.client.get(self.url, {"owner": "mine"}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_viewer_for_owner_filters(self):
+        worker_etag = self.client.get(self.url, {"owner": "mine"})["ETag"]
+        worker_all = self.client.get(self.url, {"owner": "all"})["ETag"]
+        self.client.force_login(self.director.user)
+        self.assertNotEqual(self.client.get(self.url, {"owner": "mine"})["ETag"], worker_etag)
+        self.assertEqual(self.client.get(self.url, {"owner": "all"})["ETag"], worker_all)
+
+    def test_legacy_count_poll_uses_stats_endpoint(self):
+        response = self.client.get(reverse("card_detail", args=[self.card.id]), {"owner": "all", "count": "1"})
+        self.assertEqual(response.json()["total"], 12)
+        self.assertIn("ETag", response)
+
+
+@override_settings(SSE_ENABLED=True, SSE_MAX_STREAM_SECONDS=0.3, SSE_KEEPALIVE_SECONDS=0.1, SSE_POLL_INTERVAL=0.05)
+class StreamEventsTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.other_department = Department.objects.create(name="Другой", shortname="ДР")
+        cls.director = make_employee("director", role="director", department=cls.department)
+        cls.worker = make_employee("worker", department=cls.department)
+        cls.outsider = make_employee("outsider", department=cls.other_department)
+        cls.card = EventCard.objects.create(
+            title="ОТД Март", created_by=cls.director, responsible_department=cls.department,
+        )
+
+    def card_events(self, kind):
+        return StreamEvent.objects.filter(channel=events.card_channel(self.card.id), kind=kind)
+
+    async def read_stream(self, user, last_event_id):
+        await sync_to_async(self.async_client.force_login)(user)
+        response = await self.async_client.get(
+            reverse("event_stream"), {"card": self.card.id}, headers={"Last-Event-ID": last_event_id},
+        )
+        if response.status_code != 200:
+            return response, ""
+        return response, b"".join([chunk async for chunk in response.streaming_content]).decode()
+
+    def test_changes_are_published(self):
+        notify(self.worker.user, "Новое", "/")
+        self.assertTrue(StreamEvent.objects.filter(channel=f"user:{self.worker.user.pk}", kind="notification").exists())
+
+        task = Task.objects.create(card=self.card, title="Задача", created_by=self.director, assigned_employee=self.worker)
+        task.title = "Переименована"
+        task.save()
+        self.assertEqual(self.card_events("task").count(), 1)  # смена названия не публикуется
+        task.status = "done"
+        task.save()
+        self.assertEqual(self.card_events("task").last().payload, {"id": task.id, "status": "done", "deleted": False})
+
+        self.card.plan_status = "approved"
+        self.card.save(update_fields=["plan_status"])
+        self.assertEqual(self.card_events("approval").get().payload["plan_status"], "approved")
+
+    async def test_stream_replays_after_last_event_id(self):
+        first = await sync_to_async(events.publish)(events.user_channel(self.worker.user.pk), "unread", {"unread": 1})
+        await sync_to_async(events.publish)(events.card_channel(self.card.id), "task", {"id": 1})
+        await sync_to_async(events.publish)(events.user_channel(self.outsider.user.pk), "unread", {"unread": 7})
+
+        response, body = await self.read_stream(self.worker.user, str(first.id - 1))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertIn('event: unread\ndata: {"unread": 1}', body)
+        self.assertIn('event: task\ndata: {"id": 1}', body)
+        self.assertNotIn('"unread": 7', body)
+        self.assertIn(": ping", body)
+
+    async def test_hidden_card_events_are_not_streamed(self):
+        self.card.visible = False
+        await sync_to_async(self.card.save)(update_fields=["visible"])
+        await sync_to_async(events.publish)(events.card_channel(self.card.id), "task", {"id": 1})
+        await sync_to_async(events.publish)(events.user_channel(self.outsider.user.pk), "unread", {"unread": 2})
+        _, body = await self.read_stream(self.outsider.user, "0")
+        self.assertNotIn("event: task", body)
+        self.assertIn("event: unread", body)
+
+    async def test_anonymous_gets_no_content(self):
+        response = await self.async_client.get(reverse("event_stream"))
+        self.assertEqual(response.status_code, 204)
+
+    def test_pages_connect_to_stream_only_when_enabled(self):
+        self.client.force_login(self.director.user)
+        page = self.client.get(reverse("card_detail", args=[self.card.id]))
+        self.assertContains(page, "new EventSource")
+        self.assertNotContains(page, "setInterval")
+
+        with self.settings(SSE_ENABLED=False):
+            page = self.client.get(reverse("card_detail", args=[self.card.id]))
+            self.assertNotContains(page, "new EventSource")
+            self.assertContains(page, "setInterval")  # счётчики обновляются опросом
+            self.assertEqual(self.client.get(reverse("event_stream")).status_code, 204)
+
+    async def test_broker_fans_out_new_events(self):
+        broker = events.EventBroker()
+        worker_queue = await broker.subscribe([events.user_channel(self.worker.user.pk)])
+        card_queue = await broker.subscribe([events.card_channel(self.card.id)])
+        await sync_to_async(events.publish)(events.card_channel(self.card.id), "tasks", {"created": 3})
+        await broker.poll()
+
+        self.assertTrue(worker_queue.empty())
+        self.assertEqual((await card_queue.get()).payload, {"created": 3})
+        broker.unsubscribe([events.card_channel(self.card.id)], card_queue)
+        broker.unsubscribe([events.user_channel(self.worker.user.pk)], worker_queue)
+        self.assertEqual(broker.subscribers, {})
+        await broker.task
+
+    async def test_broker_delivers_late_committed_events(self):
+        broker = events.EventBroker()
+        queue = await broker.subscribe([events.card_channel(self.card.id)])
+        early = await sync_to_async(events.publish)(events.card_channel(self.card.id), "task", {"id": 1})
+        late = await sync_to_async(events.publish)(events.card_channel(self.card.id), "task", {"id": 2})
+        # событие с большим id уже разослано, меньший id "закоммитился" позже
+        broker.last_id, broker.seen = late.id, {late.id: late.created_at}
+        await broker.poll()
+        await broker.poll()
+        self.assertEqual((await queue.get()).id, early.id)
+        self.assertTrue(queue.empty())
+        broker.unsubscribe([events.card_channel(self.card.id)], queue)
+        await broker.task
+
+    def test_nothing_is_written_while_disabled(self):
+        with self.settings(SSE_ENABLED=False):
+            self.assertIsNone(events.publish("user:1", "unread", {"unread": 0}))
+            notify(self.worker.user, "Новое", "/")
+            Task.objects.create(card=self.card, title="Задача", created_by=self.director)
+        self.assertFalse(StreamEvent.objects.exists())
+
+    def test_prune_removes_old_events(self):
+        old = events.publish("user:1", "unread", {"unread": 0})
+        StreamEvent.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=2))
+        events.publish("user:1", "unread", {"unread": 1})
+        self.assertEqual(events.prune_stream_events(), 1)
+        self.assertEqual(StreamEvent.objects.count(), 1)
+
+
+class CardVisibilityTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.shared = Department.objects.create(name="Соседи", shortname="СОС")
+        cls.other = Department.objects.create(name="Другой", shortname="ДР")
+        cls.director = make_employee("director", role="director", department=cls.department)
+        cls.head = make_employee("head", role="head", department=cls.shared)
+        cls.outsider = make_employee("outsider", department=cls.other)
+
+    def make_card(self, **fields):
+        return EventCard.objects.create(
+            title="Карточка", created_by=self.director, responsible_department=self.department, **fields,
+        )
+
+    def rows(self, card):
+        return set(CardVisibility.objects.filter(card=card).values_list("department_id", flat=True))
+
+    def test_rows_follow_card_and_shared_departments(self):
+        card = self.make_card()
+        self.assertEqual(self.rows(card), {self.department.id})
+
+        card.shared_departments.add(self.shared)
+        self.assertEqual(self.rows(card), {self.department.id, self.shared.id})
+        card.visible = True
+        card.save(update_fields=["visible"])
+        self.assertEqual(self.rows(card), {self.department.id, self.shared.id, None})
+
+        self.shared.shared_cards.clear()
+        card.responsible_department = self.other
+        card.save()
+        self.assertEqual(self.rows(card), {self.other.id, None})
+
+    def test_card_view_rule(self):
+        hidden = self.make_card()
+        shared = self.make_card()
+        shared.shared_departments.add(self.shared)
+        public = self.make_card(visible=True)
+
+        def ids(employee):
+            cards = policy.Policy(employee).filter("card.view", EventCard.objects.all())
+            return set(cards.values_list("id", flat=True))
+
+        self.assertEqual(ids(self.director), {hidden.id, shared.id, public.id})
+        self.assertEqual(ids(self.head), {shared.id, public.id})
+        self.assertEqual(ids(self.outsider), {public.id})
+        self.assertFalse(policy.Policy(self.outsider).can("card.view", hidden))
+        self.assertTrue(shared.can_user_create_task(self.head.user))
+        self.assertFalse(hidden.can_user_create_task(self.head.user))
+
+        sql = str(policy.Policy(self.head).filter("card.view", EventCard.objects.all()).query)
+        self.assertNotIn("DISTINCT", sql)
+        self.assertNotIn("shared_departments", sql)
+
+    def test_views_use_visibility(self):
+        hidden = self.make_card()
+        self.client.force_login(self.outsider.user)
+        self.assertRedirects(self.client.get(reverse("card_detail", args=[hidden.id])), reverse("task_list"))
+        self.assertEqual(list(self.client.get(reverse("task_list")).context["cards"]), [])
+
+        hidden.shared_departments.add(self.other)
+        self.assertEqual(self.client.get(reverse("card_detail", args=[hidden.id])).status_code, 200)
+        self.assertEqual([card.id for card in self.client.get(reverse("task_list")).context["cards"]], [hidden.id])
+
+    def test_refresh_after_bulk_create(self):
+        card = EventCard.objects.bulk_create([
+            EventCard(title="Пачка", created_by=self.director, responsible_department=self.department, visible=True),
+        ])[0]
+        self.assertEqual(self.rows(card), set())
+        self.assertEqual(visibility.refresh_card_visibility([card.id]), 1)
+        self.assertEqual(self.rows(card), {self.department.id, None})
+
+
+class PolicyTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.other = Department.objects.create(name="Другой", shortname="ДР")
+        cls.director = make_employee("director", role="director", department=cls.department)
+        cls.deputy = make_employee("deputy", role="deputy")
+        cls.head = make_employee("head", role="head", department=cls.department)
+        cls.senior = make_employee("senior", role="senior", department=cls.other)
+        cls.staff = make_employee("staff", department=cls.department)
+        cls.outsider = make_employee("outsider", department=cls.other)
+        cls.employees = [cls.director, cls.deputy, cls.head, cls.senior, cls.staff, cls.outsider]
+
+        cls.hidden = EventCard.objects.create(
+            title="Скрытая", created_by=cls.outsider, responsible_department=cls.department, visible=False,
+        )
+        cls.public = EventCard.objects.create(
+            title="Открытая", created_by=cls.head, responsible_department=cls.other, visible=True,
+        )
+        CardApproverOrder.objects.create(card=cls.hidden, employee=cls.senior, order=0)
+
+        cls.mine = Task.objects.create(card=cls.public, title="Своя", created_by=cls.head, assigned_employee=cls.staff)
+        cls.free = Task.objects.create(card=cls.public, title="Ничья", created_by=cls.head)
+        cls.review = Task.objects.create(
+            card=cls.public, title="Проверка", created_by=cls.head, assigned_employee=cls.senior,
+            task_type="review", reviews_task=cls.mine,
+        )
+
+    def test_check_matches_filter(self):
+        """Проверка одного объекта и Q-фильтр для queryset дают одно и то же для всех правил."""
+        for action, rule in policy.RULES.items():
+            if rule.model is None:
+                continue
+            objects = list(rule.model.objects.all())
+            for employee in self.employees:
+                allowed = set(policy.Policy(employee).filter(action, rule.model.objects.all()).values_list("pk", flat=True))
+                for obj in objects:
+                    with self.subTest(action=action, employee=employee.user.username, obj=obj.pk):
+                        self.assertEqual(policy.Policy(employee).can(action, obj), obj.pk in allowed)
+
+    def test_rules(self):
+        staff = policy.Policy(self.staff)
+        self.assertTrue(staff.can("card.view", self.hidden))  # свой отдел
+        self.assertTrue(staff.can("card.create_task", self.hidden))
+        self.assertFalse(staff.can("card.create"))
+        self.assertTrue(staff.can("task.execute", self.mine))
+        self.assertTrue(staff.can("task.take", self.free))
+
+        senior = policy.Policy(self.senior)
+        self.assertFalse(senior.can("card.view", self.hidden))
+        self.assertTrue(senior.can("card.view_plan", self.hidden))  # участник согласования
+        self.assertTrue(senior.can("task.view_files", self.mine))  # проверяющий
+        self.assertFalse(senior.can("task.view", self.mine))
+        self.assertFalse(policy.Policy(None).can("card.view", self.public))
+
+    def test_results_are_memoized(self):
+        rules = policy.Policy(self.outsider)
+        with self.assertNumQueries(1):
+            self.assertFalse(rules.can("card.view", self.hidden))
+        with self.assertNumQueries(0):
+            self.assertFalse(rules.can("card.view", self.hidden))
+            self.assertFalse(rules.can("task.view", self.mine))
+            self.assertFalse(rules.can("card.create"))
+
+    def test_allowed_checks_many_objects_in_one_query(self):
+        rules = policy.Policy(self.outsider)
+        with self.assertNumQueries(1):
+            self.assertEqual(rules.allowed("card.view", [self.hidden, self.public]), {self.public.pk})
+        with self.assertNumQueries(0):
+            self.assertTrue(rules.can("card.view", self.public))
+            self.assertEqual(rules.allowed("card.view", [self.hidden, self.public]), {self.public.pk})
+
+    def test_get_policy_is_per_request(self):
+        self.client.force_login(self.staff.user)
+        request = self.client.get(reverse("task_list")).wsgi_request
+        self.assertIs(policy.get_policy(request), policy.get_policy(request, self.staff))
+        self.assertIsNot(policy.get_policy(request), policy.get_policy(request, self.head))
+
+    def test_task_form_recipients(self):
+        def recipients(employee):
+            return set(TaskForm(user=employee.user).fields["recipients"].queryset)
+
+        self.assertEqual(recipients(self.director), set(self.employees))
+        self.assertEqual(recipients(self.deputy), set(self.employees) - {self.director})
+        self.assertEqual(recipients(self.head), {self.director, self.senior, self.staff})
+        self.assertEqual(recipients(self.staff), set())
+
+
+class EmployeeDirectoryTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел", shortname="ОТД")
+        cls.head = make_employee("head", role="head", department=cls.department, position="Начальник")
+        cls.card = EventCard.objects.create(title="Карточка", created_by=cls.head, responsible_department=cls.department)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.head.user)
+
+    def test_snapshot_is_built_once_per_version(self):
+        version, body = directory.directory_snapshot()
+        data = json.loads(body)
+        self.assertEqual(data["departments"], [{"id": self.department.id, "name": "Отдел", "shortname": "ОТД"}])
+        self.assertEqual(data["employees"][0]["position"], "Начальник")
+        with self.assertNumQueries(0):
+            self.assertEqual(directory.directory_snapshot(), (version, body))
+
+    def test_changes_invalidate_directory(self):
+        version = directory.directory_version()
+        self.head.position = "Руководитель"
+        self.head.save()
+        self.assertNotEqual(directory.directory_version(), version)
+        self.assertIn("Руководитель", directory.directory_snapshot()[1].decode())
+
+        version = directory.directory_version()
+        Department.objects.create(name="Новый", shortname="НВ")
+        self.assertNotEqual(directory.directory_version(), version)
+
+    def test_login_keeps_directory_version(self):
+        version = directory.directory_version()
+        self.client.logout()
+        self.assertTrue(self.client.login(username="head", password="pass"))  # пишет last_login
+        self.assertEqual(directory.directory_version(), version)
+
+        self.head.user.first_name = "Глава"
+        self.head.user.save(update_fields=["first_name"])
+        self.assertNotEqual(directory.directory_version(), version)
+
+    def test_versioned_url_is_cached_by_browser(self):
+        url = views_directory.directory_url()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("max-age", response["Cache-Control"])
+        self.assertEqual(response.json()["employees"][0]["id"], self.head.id)
+
+        response = self.client.get(reverse("employee_directory"), headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_pages_link_directory_instead_of_inlining_it(self):
+        response = self.client.get(reverse("card_create"))
+        self.assertContains(response, directory.directory_version())
+        self.assertNotIn("employees_json", response.context)
+        # адресатов задачи страница ищет на сервере
+        self.assertContains(self.client.get(reverse("task_create_for_card", args=[self.card.id])), reverse("employee_search"))
+
+
+class EmployeeSearchTests(CacheResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Отдел закупок", shortname="ОЗ")
+        cls.other = Department.objects.create(name="Бухгалтерия", shortname="БУХ")
+        cls.director = make_employee("director", role="director", department=cls.department, position="Директор")
+        cls.head = make_employee("head", role="head", department=cls.department, position="Начальник отдела")
+        cls.staff = make_employee("staff", department=cls.department, position="Закупщик")
+        cls.accountant = make_employee("accountant", department=cls.other, position="Бухгалтер")
+        cls.senior = make_employee("senior", role="senior", department=cls.other, position="Главный бухгалтер")
+        for employee, last_name in (
+            (cls.director, "Ёлкин"), (cls.head, "Петров"), (cls.staff, "Петренко"),
+            (cls.accountant, "Сидорова"), (cls.senior, "Пескова"),
+        ):
+            employee.user.last_name = last_name
+            employee.user.save()
+
+    def ids(self, results):
+        return [item["id"] for item in results]
+
+    def test_prefix_search(self):
+        index = typeahead.build_index()
+        self.assertEqual(self.ids(index.search("пе")), [self.senior.id, self.staff.id, self.head.id])
+        self.assertEqual(self.ids(index.search("петр")), [self.staff.id, self.head.id])
+        self.assertEqual(self.ids(index.search("елк")), [self.director.id])
+        self.assertEqual(self.ids(index.search("бух глав")), [self.senior.id])  # должность и отдел
+        self.assertEqual(self.ids(index.search("закуп Петров")), [self.head.id])
+        self.assertEqual(index.search("нет такого"), [])
+        self.assertEqual(len(index.search("", limit=2)), 2)
+
+    def test_index_follows_changes_without_queries(self):
+        typeahead.get_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ids(typeahead.get_index().search("сид")), [self.accountant.id])
+
+        self.accountant.user.last_name = "Смирнова"
+        self.accountant.user.save()
+        self.assertEqual(typeahead.get_index().search("сид"), [])
+        self.assertEqual(self.ids(typeahead.get_index().search("смир")), [self.accountant.id])
+
+    def test_results_follow_task_form_rules(self):
+        def found(employee):
+            rules = policy.Policy(employee)
+            with self.assertNumQueries(0):
+                return set(self.ids(typeahead.search_recipients(rules, "", limit=50)))
+
+        typeahead.get_index()
+        for employee in (self.director, self.head, self.staff, self.senior):
+            with self.subTest(employee=employee.user.username):
+                form_ids = set(TaskForm(user=employee.user).fields["recipients"].queryset.values_list("id", flat=True))
+                self.assertEqual(found(employee), form_ids)
+
+    def test_endpoint(self):
+        self.client.force_login(self.head.user)
+        response = self.client.get(reverse("employee_search"), {"q": "бух"})
+        self.assertEqual(self.ids(response.json()["results"]), [self.senior.id])  # бухгалтер не из отдела — нет
+        self.assertEqual(response.json()["results"][0]["department"], "Бухгалтерия")
+
+        self.client.force_login(self.staff.user)
+        self.assertEqual(self.client.get(reverse("employee_search"), {"q": "пе"}).json(), {"results": []})
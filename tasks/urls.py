@@ -3,11 +3,17 @@ from . import views
 from . import views_cards
 from . import views_tasks
 from . import views_delegation
+from . import views_files
+from . import views_search
+from . import views_events
+from . import views_directory
 
 urlpatterns = [
     path('', views_tasks.task_list, name='task_list'),
     path('employees/', views_delegation.employee_list, name='employee_list'),
     path('employees/<int:employee_id>/', views_delegation.employee_detail, name='employee_detail'),
+    path('employees/directory.json', views_directory.employee_directory, name='employee_directory'),
+    path('employees/search/', views_directory.employee_search, name='employee_search'),
 
     # --- Задачи ---
     path("task/<int:task_id>/", views_tasks.task_detail, name="task_detail"),
@@ -19,6 +25,7 @@ urlpatterns = [
 
     # --- Карточки ---
     path("card/<int:card_id>/", views_cards.card_detail, name="card_detail"),
+    path("card/<int:card_id>/stats/", views_cards.card_stats, name="card_stats"),
     path("card/<int:card_id>/plan/review/", views_cards.plan_review, name="plan_review"),
     path("cards/create/", views_cards.card_create, name="card_create"),
     path('card/<int:card_id>/task/create/', views_tasks.task_create_for_card, name='task_create_for_card'),
@@ -38,6 +45,15 @@ urlpatterns = [
     path("tasks/<int:task_id>/review/approve/", views_tasks.task_review_approve, name="task_review_approve"),
     path("tasks/<int:task_id>/review/reject/", views_tasks.task_review_reject, name="task_review_reject"),
 
+    # --- Файлы (с проверкой прав) ---
+    path("files/card/<int:card_id>/plan/", views_files.card_plan_download, name="card_plan_download"),
+    path("files/task/<int:task_id>/attachment/", views_files.task_attachment_download, name="task_attachment_download"),
+    path("files/execution/<int:attachment_id>/", views_files.execution_file_download, name="execution_file_download"),
+
+    # --- Поиск ---
+    path("search/", views_search.search_view, name="search"),
+    path("events/", views_events.event_stream, name="event_stream"),
+
     path("notifications/", views_tasks.notifications_list, name="notifications"),
     path("notifications/read/<int:note_id>/", views_tasks.notification_read, name="notification_read"),
     path("notifications/read_all/", views_tasks.notifications_read_all, name="notifications_read_all"),
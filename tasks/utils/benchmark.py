@@ -0,0 +1,119 @@
+import statistics
+import time
+
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Employee, Task
+
+# хост из ALLOWED_HOSTS, иначе тестовый клиент получит 400
+BENCHMARK_HOST = "localhost"
+
+
+class Scenario:
+    """Один замеряемый запрос: имя в отчёте, URL и пользователь, от имени которого он выполняется."""
+
+    def __init__(self, name, url, user):
+        self.name = name
+        self.url = url
+        self.user = user
+
+
+def _busiest(queryset, field):
+    return (
+        queryset.values(field).annotate(n=Count("id")).order_by("-n", field)
+        .values_list(field, flat=True).first()
+    )
+
+
+def build_scenarios():
+    """
+    Сценарии для основных страниц на текущих данных (рассчитано на seed_load_data).
+    Берём самые "тяжёлые" объекты: сотрудника с наибольшим числом задач, самую большую карточку и т.д.
+    """
+    active = Employee.objects.filter(delegate_to__isnull=True).select_related("user")
+    director = active.filter(role="director").first()
+    busiest_id = _busiest(
+        Task.objects.filter(assigned_employee__isnull=False, assigned_employee__delegate_to__isnull=True),
+        "assigned_employee",
+    )
+    if director is None or busiest_id is None:
+        return []
+    busiest = active.get(pk=busiest_id)
+
+    card_id = _busiest(Task.objects.filter(card__isnull=False), "card")
+    task = Task.objects.filter(assigned_employee=busiest, task_type="regular").order_by("id").first()
+    review = (
+        Task.objects.filter(task_type="review", reviews_task__isnull=False, assigned_employee__delegate_to__isnull=True)
+        .select_related("assigned_employee__user").order_by("id").first()
+    )
+
+    scenarios = [
+        Scenario("task_list", reverse("task_list"), busiest.user),
+        Scenario("card_detail", reverse("card_detail", args=[card_id]), director.user),
+        Scenario("card_detail_ajax", reverse("card_detail", args=[card_id]) + "?ajax=1", director.user),
+        Scenario("card_detail_count", reverse("card_stats", args=[card_id]), director.user),
+        Scenario("notifications_list", reverse("notifications"), busiest.user),
+        Scenario("card_create", reverse("card_create"), director.user),
+        Scenario("employee_search", reverse("employee_search") + "?q=ф", busiest.user),
+    ]
+    if task:
+        scenarios.append(Scenario("task_detail", reverse("task_detail", args=[task.id]), busiest.user))
+    if review:
+        scenarios.append(Scenario("task_review", reverse("task_review", args=[review.id]), review.assigned_employee.user))
+    return scenarios
+
+
+def _percentile(values, percent):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def run_scenario(scenario, repeat=20, warmup=2):
+    """Выполняет сценарий repeat раз и возвращает перцентили задержки, число запросов и время SQL."""
+    client = Client(HTTP_HOST=BENCHMARK_HOST)
+    client.force_login(scenario.user)
+
+    for _ in range(warmup):
+        client.get(scenario.url)
+
+    latencies, query_counts, sql_times = [], [], []
+    status_code = None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = client.get(scenario.url)
+            latencies.append((time.perf_counter() - started) * 1000)
+        status_code = response.status_code
+        query_counts.append(len(ctx.captured_queries))
+        sql_times.append(sum(float(q["time"]) for q in ctx.captured_queries) * 1000)
+
+    return {
+        "url": scenario.url,
+        "status": status_code,
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p90_ms": round(_percentile(latencies, 90), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+        "queries": int(statistics.median(query_counts)),
+        "sql_ms": round(statistics.median(sql_times), 2),
+    }
+
+
+def compare_results(baseline, current):
+    """Разница с предыдущим прогоном: {сценарий: {метрика: (было, стало)}} для общих сценариев."""
+    diff = {}
+    for name, result in current.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        diff[name] = {
+            metric: (old[metric], result[metric])
+            for metric in ("p50_ms", "p90_ms", "queries", "sql_ms")
+            if metric in old
+        }
+    return diff
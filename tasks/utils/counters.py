@@ -0,0 +1,153 @@
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+IN_PROGRESS_STATUSES = ("in_progress", "sent_for_review", "under_review")
+REVIEW_TASK_TYPES = ("approval", "review")
+
+# Определения счётчиков карточки: имя поля CardCounters -> условие на задачу.
+# Используются при полном пересчёте (одним агрегирующим запросом).
+COUNTER_FILTERS = {
+    "total": Q(),
+    "regular_total": Q(task_type="regular"),
+    "new": Q(task_type="regular", status="new"),
+    "in_progress": Q(task_type="regular", status__in=IN_PROGRESS_STATUSES),
+    "done": Q(task_type="regular", status="done"),
+    "urgent": Q(task_type="regular", priority="urgent") & ~Q(status="done"),
+    "review": Q(task_type__in=REVIEW_TASK_TYPES),
+    "review_new": Q(task_type__in=REVIEW_TASK_TYPES, status="new"),
+    "open": ~Q(status="done"),
+    "closed": Q(status="done"),
+}
+
+
+# счётчики, которые показывает card_detail (кнопки фильтров)
+CARD_STATS = ("total", "new", "in_progress", "done", "urgent", "review")
+
+
+def counter_state(task):
+    """Снимок полей задачи, от которых зависят счётчики карточки."""
+    values = task.__dict__
+    return (values.get("card_id"), values.get("task_type"), values.get("status"), values.get("priority"))
+
+
+def counter_flags(state):
+    """Вклад одной задачи в счётчики (то же, что COUNTER_FILTERS, но в Python)."""
+    _, task_type, status, priority = state
+    regular = task_type == "regular"
+    review = task_type in REVIEW_TASK_TYPES
+    return {
+        "total": 1,
+        "regular_total": int(regular),
+        "new": int(regular and status == "new"),
+        "in_progress": int(regular and status in IN_PROGRESS_STATUSES),
+        "done": int(regular and status == "done"),
+        "urgent": int(regular and priority == "urgent" and status != "done"),
+        "review": int(review),
+        "review_new": int(review and status == "new"),
+        "open": int(status != "done"),
+        "closed": int(status == "done"),
+    }
+
+
+def apply_counter_delta(card_id, delta):
+    """
+    Атомарно прибавляет delta к счётчикам карточки (UPDATE ... SET x = x + n) и поднимает её версию.
+    Версия растёт и при нулевой delta: изменилась задача — могла измениться статистика с фильтром по владельцу.
+    """
+    from tasks.models import CardCounters
+
+    if not card_id:
+        return
+    updates = {name: F(name) + value for name, value in delta.items() if value}
+    # если строки ещё нет, UPDATE ничего не затронет — её создаст EventCard.get_counters() пересчётом
+    CardCounters.objects.filter(card_id=card_id).update(version=F("version") + 1, **updates)
+
+
+def touch_cards(card_ids):
+    """Поднимает версию карточек без изменения счётчиков (например, сменились адресаты задачи)."""
+    from tasks.models import CardCounters
+
+    card_ids = [card_id for card_id in card_ids if card_id]
+    if card_ids:
+        CardCounters.objects.filter(card_id__in=card_ids).update(version=F("version") + 1)
+
+
+def aggregate_stats(queryset, names=CARD_STATS):
+    """Счётчики по произвольной выборке задач одним запросом: COUNT(...) FILTER (WHERE ...) на каждый."""
+    return queryset.aggregate(**{
+        name: Count("id", filter=COUNTER_FILTERS[name]) if COUNTER_FILTERS[name] else Count("id")
+        for name in names
+    })
+
+
+def track_task_change(old_state, new_state):
+    """Переносит вклад задачи из старого состояния в новое (одинаковые состояния — только версия карточки)."""
+    deltas = {}
+    if old_state is not None and old_state[0]:
+        bucket = deltas.setdefault(old_state[0], {})
+        for name, value in counter_flags(old_state).items():
+            bucket[name] = bucket.get(name, 0) - value
+    if new_state is not None and new_state[0]:
+        bucket = deltas.setdefault(new_state[0], {})
+        for name, value in counter_flags(new_state).items():
+            bucket[name] = bucket.get(name, 0) + value
+
+    with transaction.atomic():
+        for card_id, delta in deltas.items():
+            apply_counter_delta(card_id, delta)
+
+
+def track_tasks_created(tasks):
+    """Вклад пачки новых задач (bulk_create сигналы не шлёт) — один UPDATE на карточку."""
+    deltas = {}
+    for task in tasks:
+        state = counter_state(task)
+        task._counter_state = state
+        if not state[0]:
+            continue
+        bucket = deltas.setdefault(state[0], {})
+        for name, value in counter_flags(state).items():
+            bucket[name] = bucket.get(name, 0) + value
+
+    with transaction.atomic():
+        for card_id, delta in deltas.items():
+            apply_counter_delta(card_id, delta)
+
+
+def recount_card_counters(card_ids=None, task_model=None, counters_model=None):
+    """
+    Полный пересчёт счётчиков одним GROUP BY-запросом по задачам.
+    Если card_ids не передан — пересчитываются все карточки.
+    Модели можно передать явно (для data-миграций). Возвращает число карточек.
+    """
+    if task_model is None or counters_model is None:
+        from tasks.models import Task, CardCounters
+        task_model, counters_model = task_model or Task, counters_model or CardCounters
+
+    card_model = counters_model._meta.get_field("card").related_model
+    if card_ids is None:
+        card_ids = list(card_model.objects.values_list("id", flat=True))
+        tasks = task_model.objects.filter(card__isnull=False)
+        counters = counters_model.objects.all()
+    else:
+        card_ids = list(card_model.objects.filter(id__in=card_ids).values_list("id", flat=True))
+        tasks = task_model.objects.filter(card_id__in=card_ids)
+        counters = counters_model.objects.filter(card_id__in=card_ids)
+
+    with transaction.atomic():
+        rows = tasks.values("card_id").annotate(**{
+            name: Count("id", filter=condition) if condition else Count("id")
+            for name, condition in COUNTER_FILTERS.items()
+        }).order_by()
+        totals = {row.pop("card_id"): row for row in rows}
+        existing = set(counters.values_list("card_id", flat=True))
+
+        empty = dict.fromkeys(COUNTER_FILTERS, 0)
+        to_update, to_create = [], []
+        for card_id in card_ids:
+            obj = counters_model(card_id=card_id, **totals.get(card_id, empty))
+            (to_update if card_id in existing else to_create).append(obj)
+        counters_model.objects.bulk_create(to_create, batch_size=500)
+        counters_model.objects.bulk_update(to_update, list(COUNTER_FILTERS), batch_size=500)
+
+    return len(card_ids)
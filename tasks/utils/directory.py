@@ -0,0 +1,76 @@
+"""
+Справочник сотрудников и отделов для форм выбора (card_create, task_create_for_card).
+
+Справочник одинаков для всех пользователей, поэтому собирается один раз на версию и хранится в кеше
+готовым JSON. Версия — случайная метка в кеше, её меняет invalidate_directory() (сигналы Employee, User,
+Department). Страницы ссылаются на справочник по адресу с ?v=<версия>: такой ответ браузер кеширует
+надолго и загружает один раз, а после изменений справочника адрес на страницах сам становится новым.
+bulk_create / QuerySet.update сигналы обходят — после них нужно вызвать invalidate_directory().
+"""
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = "employee_directory:version"
+SNAPSHOT_KEY = "employee_directory:{version}"
+
+
+def _cache_timeout():
+    return getattr(settings, "EMPLOYEE_DIRECTORY_CACHE_TIMEOUT", 24 * 60 * 60)
+
+
+def invalidate_directory():
+    """Новая версия справочника: следующий запрос соберёт его заново."""
+    version = uuid.uuid4().hex[:12]
+    cache.set(VERSION_KEY, version, None)
+    return version
+
+
+def directory_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # add, а не set: параллельный процесс мог уже завести версию
+        cache.add(VERSION_KEY, uuid.uuid4().hex[:12], None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def build_directory():
+    """Сотрудники (имя, должность, отдел, роль) и отделы — двумя запросами."""
+    from ..models import Department, Employee
+
+    employees = (
+        Employee.objects.select_related("user")
+        .order_by("user__last_name", "user__first_name", "id")
+    )
+    return {
+        "employees": [
+            {
+                "id": employee.id,
+                "name": f"{employee.user.first_name} {employee.user.last_name}".strip() or employee.user.username,
+                "last_name": employee.user.last_name,
+                "first_name": employee.user.first_name,
+                "position": employee.position,
+                "department_id": employee.department_id,
+                "role": employee.role,
+            }
+            for employee in employees
+        ],
+        "departments": [
+            {"id": department.id, "name": department.name, "shortname": department.shortname}
+            for department in Department.objects.order_by("name", "id")
+        ],
+    }
+
+
+def directory_snapshot():
+    """(версия, JSON в байтах) — из кеша или собирается один раз на версию."""
+    version = directory_version()
+    key = SNAPSHOT_KEY.format(version=version)
+    body = cache.get(key)
+    if body is None:
+        body = json.dumps(build_directory(), ensure_ascii=False, separators=(",", ":")).encode()
+        cache.set(key, body, _cache_timeout())
+    return version, body
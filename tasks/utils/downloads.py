@@ -0,0 +1,119 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+from .storage import CAS_PREFIX
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(name, stat):
+    """Для файлов из хранилища по хешу ETag — это хеш содержимого, иначе mtime+размер."""
+    parts = name.split("/")
+    if len(parts) >= 3 and parts[0] == CAS_PREFIX:
+        return quote_etag(parts[2])
+    return quote_etag(f"{int(stat.st_mtime):x}-{stat.st_size:x}")
+
+
+def parse_range(header, size):
+    """(start, end) включительно для заголовка Range с одним диапазоном; None — отдать весь файл; False — 416."""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None  # несколько диапазонов и прочее не поддерживаем — отдаём файл целиком
+    start, end = match.groups()
+    if start == "" and end == "":
+        return None
+    if start == "":
+        # "bytes=-500" — последние 500 байт
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _iter_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, field_file, as_attachment=True):
+    """
+    Отдаёт файл из FileField после проверки прав (её делает представление).
+    - ETag/Last-Modified и 304 на условные запросы;
+    - при FILE_DOWNLOAD_OFFLOAD = "x-accel-redirect"/"x-sendfile" саму передачу (и Range) делает nginx/apache,
+      воркер gunicorn только отвечает заголовками;
+    - иначе — потоковая отдача, Range с одним диапазоном (206/416).
+    """
+    return serve_path(request, field_file.name, field_file.path, as_attachment=as_attachment)
+
+
+def serve_path(request, name, path, as_attachment=True, content_type=None):
+    """То же для файла по имени в MEDIA_ROOT (например, сгенерированного превью)."""
+    if not os.path.isfile(path):
+        return HttpResponse(status=404)
+
+    stat = os.stat(path)
+    etag = file_etag(name, stat)
+    last_modified = int(stat.st_mtime)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    filename = os.path.basename(name)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    offload = getattr(settings, "FILE_DOWNLOAD_OFFLOAD", None)
+
+    if offload == "x-accel-redirect":
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, "FILE_DOWNLOAD_ACCEL_PREFIX", "/protected-media/")
+        # имена файлов кириллические: без percent-encoding Django закодировал бы заголовок как =?utf-8?b?…?=,
+        # и nginx не нашёл бы файл
+        response["X-Accel-Redirect"] = quote(prefix.rstrip("/") + "/" + name)
+    elif offload == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = quote(path)
+    else:
+        byte_range = None
+        range_header = request.META.get("HTTP_RANGE")
+        # If-Range: диапазон отдаём, только если у клиента та же версия файла
+        if range_header and request.META.get("HTTP_IF_RANGE", etag) in (etag, http_date(last_modified)):
+            byte_range = parse_range(range_header, stat.st_size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _iter_range(path, start, end - start + 1), status=206, content_type=content_type,
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = str(end - start + 1)
+        else:
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+
+    response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import Employee
+
+CACHE_KEY = "employee_context:{user_id}"
+# маркер "у пользователя нет Employee", чтобы не ходить в БД за отсутствующей записью
+NO_EMPLOYEE = "no-employee"
+
+
+class EmployeeContext:
+    """
+    Сотрудник текущего запроса: отдел, роль, заморозка и фактический исполнитель (замещающий).
+    Всё загружено одним запросом, поэтому свойства не ходят в БД.
+    """
+
+    def __init__(self, employee):
+        self.employee = employee
+
+    @property
+    def department(self):
+        return self.employee.department
+
+    @property
+    def role(self):
+        return self.employee.role
+
+    @property
+    def is_frozen(self):
+        return self.employee.is_frozen
+
+    @property
+    def delegate(self):
+        return self.employee.get_active_delegate()
+
+    @property
+    def effective(self):
+        return self.employee.get_effective_employee()
+
+
+def _cache_timeout():
+    return getattr(settings, "EMPLOYEE_CONTEXT_CACHE_TIMEOUT", 300)
+
+
+def load_employee(user_id):
+    """Employee пользователя вместе с отделом и замещающим (из кеша или одним JOIN-запросом)."""
+    key = CACHE_KEY.format(user_id=user_id)
+    employee = cache.get(key)
+    if employee is None:
+        employee = (
+            Employee.objects.select_related(
+                "department", "delegate_to", "delegate_to__user", "delegate_to__department"
+            )
+            .filter(user_id=user_id)
+            .first()
+        ) or NO_EMPLOYEE
+        cache.set(key, employee, _cache_timeout())
+    return None if employee == NO_EMPLOYEE else employee
+
+
+def get_employee_context(request):
+    """
+    EmployeeContext текущего запроса (один раз на запрос).
+    Заодно подставляет сотрудника в request.user.employee, чтобы представления не делали повторный запрос.
+    """
+    if hasattr(request, "_employee_context"):
+        return request._employee_context
+
+    context = None
+    if request.user.is_authenticated:
+        employee = load_employee(request.user.pk)
+        if employee is not None:
+            request.user.employee = employee
+            context = EmployeeContext(employee)
+
+    request._employee_context = context
+    return context
+
+
+def invalidate_employee_context(*user_ids):
+    cache.delete_many([CACHE_KEY.format(user_id=user_id) for user_id in user_ids if user_id])
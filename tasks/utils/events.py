@@ -0,0 +1,223 @@
+"""
+Поток событий для браузера (Server-Sent Events) вместо опроса страниц.
+
+Источник — таблица StreamEvent: publish() пишет событие в той же транзакции, что и само изменение,
+поэтому событие видно только после коммита и одинаково публикуется из веб-процессов, воркера очереди
+и планировщика. Каналы: user:<id> — уведомления пользователя, card:<id> — задачи и согласование плана.
+
+Каждый ASGI-процесс держит один EventBroker: раз в SSE_POLL_INTERVAL он читает новые события (id больше
+последнего прочитанного) и раздаёт их в очереди подписанных соединений. Сколько бы вкладок ни было
+открыто, БД видит короткие запросы от процесса, а не от каждой вкладки. id выдаются при INSERT, а
+видны после коммита — на PostgreSQL более медленная транзакция может закоммитить меньший id позже,
+поэтому брокер перечитывает и окно последних SSE_REORDER_WINDOW_SECONDS секунд, пропуская уже разосланное.
+После переподключения соединение досылает пропущенное по заголовку Last-Event-ID.
+
+Пока поток выключен (SSE_ENABLED = False), события не пишутся вовсе — таблицу некому читать.
+"""
+import asyncio
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.utils import timezone
+
+QUEUE_SIZE = 100           # событий в очереди соединения; медленный клиент лишнее пропустит
+FETCH_LIMIT = 500          # событий за один запрос к БД
+RETRY_MILLISECONDS = 3000  # через сколько браузер переподключается после обрыва
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def card_channel(card_id):
+    return f"card:{card_id}"
+
+
+# --- Публикация (синхронная, из любого процесса) ---
+
+def enabled():
+    return _setting("SSE_ENABLED", False)
+
+
+def publish(channel, kind, payload=None):
+    from ..models import StreamEvent
+
+    if not enabled():
+        return None
+    return StreamEvent.objects.create(channel=channel, kind=kind, payload=payload or {})
+
+
+def publish_many(events):
+    """events — список (channel, kind, payload); один INSERT на пачку."""
+    from ..models import StreamEvent
+
+    if not enabled():
+        return []
+    return StreamEvent.objects.bulk_create([
+        StreamEvent(channel=channel, kind=kind, payload=payload or {}) for channel, kind, payload in events
+    ])
+
+
+def publish_task_change(task, old_card_id=None, deleted=False):
+    """Задача карточки создана, сменила статус/приоритет/тип/карточку или удалена."""
+    payload = {"id": task.pk, "status": task.status, "deleted": deleted}
+    card_ids = {task.card_id, old_card_id} - {None}
+    publish_many([(card_channel(card_id), "task", payload) for card_id in card_ids])
+
+
+def prune_stream_events():
+    """Удаляет события старше SSE_EVENT_RETENTION_HOURS (периодическая задача планировщика)."""
+    from ..models import StreamEvent
+
+    cutoff = timezone.now() - timedelta(hours=_setting("SSE_EVENT_RETENTION_HOURS", 24))
+    return StreamEvent.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+# --- Чтение ---
+
+def events_after(last_id, channels=None, limit=FETCH_LIMIT):
+    from ..models import StreamEvent
+
+    events = StreamEvent.objects.filter(id__gt=last_id)
+    if channels is not None:
+        events = events.filter(channel__in=channels)
+    return list(events.order_by("id")[:limit])
+
+
+def recent_events(last_id, since):
+    """События с id не больше last_id, созданные после since, — кандидаты на поздний коммит."""
+    from ..models import StreamEvent
+
+    return list(StreamEvent.objects.filter(id__lte=last_id, created_at__gte=since).order_by("id"))
+
+
+def latest_event_id():
+    from ..models import StreamEvent
+
+    return StreamEvent.objects.aggregate(last=Max("id"))["last"] or 0
+
+
+def format_event(event):
+    """Событие в формате SSE: id (для Last-Event-ID), тип и данные JSON."""
+    data = json.dumps(event.payload, ensure_ascii=False, cls=DjangoJSONEncoder)
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n"
+
+
+class EventBroker:
+    """
+    Раздача событий внутри процесса: канал -> очереди подписанных соединений.
+    Цикл чтения БД запускается с первым подписчиком и останавливается, когда подписчиков не осталось.
+    """
+
+    def __init__(self):
+        self.subscribers = {}
+        self.last_id = None
+        self.seen = {}  # id -> created_at событий из окна перечитывания
+        self.task = None
+
+    async def subscribe(self, channels):
+        if not self.running():
+            # события, опубликованные до подписки, соединение досылает само (по Last-Event-ID)
+            last_id = await sync_to_async(latest_event_id)()
+            since = self.window_start()
+            # уже видимые события окна считаем разосланными — иначе первый опрос повторил бы их
+            seen = {event.id: event.created_at for event in await sync_to_async(recent_events)(last_id, since)}
+            if not self.running():  # пока ждали БД, цикл мог запустить другой подписчик
+                self.last_id = last_id
+                self.seen = seen
+                self.task = asyncio.get_running_loop().create_task(self.run())
+        queue = asyncio.Queue(QUEUE_SIZE)
+        for channel in channels:
+            self.subscribers.setdefault(channel, set()).add(queue)
+        return queue
+
+    def running(self):
+        # у каждого event loop свой цикл чтения (в тестах loop новый на каждый тест)
+        return (
+            self.task is not None and not self.task.done()
+            and self.task.get_loop() is asyncio.get_running_loop()
+        )
+
+    def unsubscribe(self, channels, queue):
+        for channel in channels:
+            queues = self.subscribers.get(channel)
+            if queues is None:
+                continue
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[channel]
+
+    async def run(self):
+        while self.subscribers:
+            await asyncio.sleep(_setting("SSE_POLL_INTERVAL", 1.0))
+            await self.poll()
+
+    async def poll(self):
+        """Читает новые (и поздно закоммиченные) события и раскладывает по очередям подписчиков."""
+        since = self.window_start()
+        self.seen = {pk: created for pk, created in self.seen.items() if created >= since}
+        for event in await sync_to_async(recent_events)(self.last_id, since):
+            self.dispatch(event)
+        while True:
+            events = await sync_to_async(events_after)(self.last_id)
+            for event in events:
+                self.last_id = event.id
+                self.dispatch(event)
+            if len(events) < FETCH_LIMIT:
+                return
+
+    def window_start(self):
+        return timezone.now() - timedelta(seconds=_setting("SSE_REORDER_WINDOW_SECONDS", 5))
+
+    def dispatch(self, event):
+        if event.id in self.seen:
+            return
+        self.seen[event.id] = event.created_at
+        for queue in self.subscribers.get(event.channel, ()):
+            if not queue.full():
+                queue.put_nowait(event)
+
+
+broker = EventBroker()
+
+
+async def stream(channels, last_event_id=None, source=None):
+    """
+    Тело SSE-ответа: пропущенное после last_event_id, затем новые события по мере появления и
+    пинги раз в SSE_KEEPALIVE_SECONDS. Через SSE_MAX_STREAM_SECONDS поток заканчивается —
+    браузер переподключается сам, а сервер не держит соединения ушедших клиентов бесконечно.
+    """
+    source = source or broker
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _setting("SSE_MAX_STREAM_SECONDS", 300)
+    keepalive = _setting("SSE_KEEPALIVE_SECONDS", 15)
+
+    # сначала подписка, потом досылка: так между ними ничего не теряется (повторы отсекаем по id)
+    queue = await source.subscribe(channels)
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        sent = set()  # не по max(id): поздно закоммиченное событие может прийти с меньшим id
+        if last_event_id is not None:
+            for event in await sync_to_async(events_after)(last_event_id, channels):
+                sent.add(event.id)
+                yield format_event(event)
+
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=min(keepalive, remaining))
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event.id not in sent:
+                sent.add(event.id)
+                yield format_event(event)
+    finally:
+        source.unsubscribe(channels, queue)
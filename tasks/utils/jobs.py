@@ -0,0 +1,154 @@
+"""
+Очередь фоновых задач на таблице tasks_job — без Redis/Celery.
+
+enqueue("tasks.utils.previews.generate_preview", name=...) кладёт задачу в ту же транзакцию,
+что и основная запись (задача появится у воркеров только после коммита). Воркеры — команда run_worker.
+
+Захват задачи:
+- PostgreSQL: SELECT ... FOR UPDATE SKIP LOCKED — воркеры не ждут друг друга;
+- SQLite: один UPDATE ... WHERE id = (SELECT ... LIMIT 1) — атомарен, т.к. запись в БД одна на всех.
+Ошибка -> повтор с экспоненциальной задержкой; после max_attempts задача переходит в "dead".
+Попытка засчитывается при захвате: задача, на которой воркер падает целиком, тоже исчерпает попытки —
+requeue_stale_jobs (планировщик, каждые несколько минут) вернёт её в очередь или переведёт в "dead".
+"""
+import logging
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def func_path(func):
+    if isinstance(func, str):
+        return func
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def enqueue(func, *, delay=None, run_at=None, max_attempts=None, **kwargs):
+    """
+    Ставит вызов func(**kwargs) в очередь. func — функция или путь к ней; kwargs должны сериализоваться в JSON.
+    delay (секунды или timedelta) / run_at — отложенный запуск.
+    С JOBS_RUN_INLINE=True (тесты) функция выполняется сразу после коммита, без очереди.
+    """
+    from ..models import Job
+
+    path = func_path(func)
+    if _setting("JOBS_RUN_INLINE", False):
+        transaction.on_commit(lambda: import_string(path)(**kwargs))
+        return None
+
+    if run_at is None:
+        run_at = timezone.now()
+        if delay:
+            run_at += delay if isinstance(delay, timedelta) else timedelta(seconds=delay)
+    return Job.objects.create(
+        func=path,
+        kwargs=kwargs,
+        run_at=run_at,
+        max_attempts=max_attempts or _setting("JOB_MAX_ATTEMPTS", 5),
+    )
+
+
+def is_pending(func, **kwargs):
+    """Есть ли уже в очереди (или выполняется) вызов func(**kwargs) — чтобы не ставить его повторно."""
+    from ..models import Job
+
+    return Job.objects.filter(func=func_path(func), status__in=("queued", "running"), kwargs=kwargs).exists()
+
+
+def claim_job(worker_id):
+    """Забирает одну готовую к запуску задачу (status queued -> running, attempts + 1) или возвращает None."""
+    from ..models import Job
+
+    now = timezone.now()
+    ready = Job.objects.filter(status="queued", run_at__lte=now).order_by("run_at", "id")
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = ready.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status, job.locked_by, job.locked_at = "running", worker_id, now
+            job.attempts += 1
+            job.save(update_fields=["status", "locked_by", "locked_at", "attempts"])
+            return job
+
+    # уникальный маркер захвата: по нему находим именно ту строку, которую обновил наш UPDATE
+    token = f"{worker_id}:{uuid.uuid4().hex[:12]}"
+    claimed = Job.objects.filter(pk__in=ready.values("pk")[:1], status="queued").update(
+        status="running", locked_by=token, locked_at=now, attempts=F("attempts") + 1,
+    )
+    if not claimed:
+        return None
+    return Job.objects.get(locked_by=token, status="running")
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка с разбросом: 10 с, 20 с, 40 с, ... но не больше JOB_RETRY_MAX_SECONDS."""
+    base = _setting("JOB_RETRY_BASE_SECONDS", 10)
+    delay = min(base * 2 ** (attempts - 1), _setting("JOB_RETRY_MAX_SECONDS", 3600))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def run_job(job):
+    """Выполняет захваченную задачу и записывает результат: done / повтор / dead (attempts уже учтена при захвате)."""
+    try:
+        import_string(job.func)(**job.kwargs)
+    except Exception:
+        job.last_error = traceback.format_exc()[-5000:]
+        if job.attempts >= job.max_attempts:
+            job.status = "dead"
+            job.finished_at = timezone.now()
+            logger.error("Задача %s (%s) исчерпала попытки", job.pk, job.func)
+        else:
+            job.status = "queued"
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+        job.locked_by, job.locked_at = "", None
+        job.save(update_fields=["last_error", "status", "finished_at", "run_at", "locked_by", "locked_at"])
+        return False
+
+    job.status = "done"
+    job.finished_at = timezone.now()
+    job.locked_by, job.locked_at = "", None
+    job.save(update_fields=["status", "finished_at", "locked_by", "locked_at"])
+    return True
+
+
+def requeue_stale_jobs():
+    """
+    Задачи, "зависшие" в running дольше JOB_LEASE_SECONDS (воркер упал): исчерпавшие попытки -> "dead",
+    остальные — обратно в очередь. Возвращает число возвращённых.
+    """
+    from ..models import Job
+
+    now = timezone.now()
+    deadline = now - timedelta(seconds=_setting("JOB_LEASE_SECONDS", 600))
+    stale = Job.objects.filter(status="running", locked_at__lt=deadline)
+    dead = stale.filter(attempts__gte=F("max_attempts")).update(
+        status="dead", finished_at=now, locked_by="", locked_at=None,
+        last_error="Воркер не завершил задачу за JOB_LEASE_SECONDS (упал или был остановлен)",
+    )
+    if dead:
+        logger.error("Задач, исчерпавших попытки на упавших воркерах: %s", dead)
+    return stale.update(status="queued", locked_by="", locked_at=None)
+
+
+def purge_finished_jobs(older_than_days=7):
+    """Удаляет выполненные задачи старше N дней (dead оставляем для разбора)."""
+    from ..models import Job
+
+    deadline = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = Job.objects.filter(status="done", finished_at__lt=deadline).delete()
+    return deleted
@@ -1,11 +1,119 @@
+from functools import cached_property
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
 from ..models import Notification
+from .events import publish, publish_many, user_channel
+
+CACHE_KEY = "unread_notifications:{user_id}"
+LATEST_LIMIT = 3
+
+
+def _cache_key(user_id):
+    return CACHE_KEY.format(user_id=user_id)
+
+
+def _cache_timeout():
+    return getattr(settings, "UNREAD_NOTIFICATIONS_CACHE_TIMEOUT", 600)
+
+
+def _as_item(note):
+    return {"id": note.id, "message": note.message, "url": note.url, "created_at": note.created_at}
+
+
+def _event_payload(note, summary=None):
+    """Событие потока о новом уведомлении; unread — если число непрочитанных известно из кеша."""
+    payload = {"id": note.id, "message": note.message, "url": note.url}
+    if summary is not None:
+        payload["unread"] = summary["unread"]
+    return payload
+
+
+def refresh_unread_summary(user_id):
+    """Перечитывает из БД число непрочитанных и последние непрочитанные и кладёт в кеш."""
+    unread = Notification.objects.filter(user_id=user_id, is_read=False).order_by("-created_at")
+    summary = {
+        "unread": unread.count(),
+        "latest": [_as_item(note) for note in unread[:LATEST_LIMIT]],
+    }
+    cache.set(_cache_key(user_id), summary, _cache_timeout())
+    return summary
+
+
+def get_unread_summary(user_id):
+    """{"unread": int, "latest": [...]} для навбара — из кеша, при промахе из БД."""
+    summary = cache.get(_cache_key(user_id))
+    if summary is None:
+        summary = refresh_unread_summary(user_id)
+    return summary
+
+
+def drop_unread_summary(*user_ids):
+    """Сбрасывает сводки в кеше после коммита — следующий показ навбара перечитает их из БД."""
+    keys = [_cache_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
 
 
 def notify(user: User, message: str, url: str = None):
     """Создаёт уведомление пользователю."""
-    Notification.objects.create(
+    note = Notification.objects.create(
         user=user,
         message=message,
         url=url
     )
+    # сводку в кеше сбрасываем после коммита: правка "прочитать, +1, записать" теряла бы уведомления
+    # при одновременной записи из двух воркеров, а откаченная транзакция оставила бы лишнее в кеше
+    drop_unread_summary(user.pk)
+    # открытые вкладки получателя обновят бейдж из потока событий
+    publish(user_channel(user.pk), "notification", _event_payload(note))
+    return note
+
+
+def notify_many(items):
+    """
+    Массовая рассылка: items — список (user_id, message, url). Один INSERT на пачку;
+    сводки получателей в кеше сбрасываются и перечитаются при следующем показе навбара.
+    """
+    notes = Notification.objects.bulk_create([
+        Notification(user_id=user_id, message=message, url=url) for user_id, message, url in items
+    ])
+    drop_unread_summary(*{note.user_id for note in notes})
+    publish_many([(user_channel(note.user_id), "notification", _event_payload(note)) for note in notes])
+    return notes
+
+
+def mark_read(note):
+    """Отмечает уведомление прочитанным и обновляет сводку в кеше."""
+    if note.is_read:
+        return
+    note.is_read = True
+    note.save(update_fields=["is_read"])
+    # список "последних" нужно дополнить следующим непрочитанным — перечитываем
+    summary = refresh_unread_summary(note.user_id)
+    publish(user_channel(note.user_id), "unread", {"unread": summary["unread"]})
+
+
+def mark_all_read(user):
+    user.notifications.filter(is_read=False).update(is_read=True)
+    # не пишем {"unread": 0} до коммита: уведомление, созданное параллельно, пропало бы из сводки
+    drop_unread_summary(user.pk)
+    publish(user_channel(user.pk), "unread", {"unread": 0})
+
+
+class UnreadNotifications:
+    """Ленивая сводка для шаблонов: к кешу/БД обращаемся только при первом использовании."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    @cached_property
+    def summary(self):
+        return get_unread_summary(self.user_id)
+
+    def count(self):
+        return self.summary["unread"]
+
+    def latest(self):
+        return self.summary["latest"]
@@ -0,0 +1,50 @@
+"""
+Постраничный вывод по курсору (keyset): следующая страница — это "строки после последней показанной"
+по ключу сортировки, а не OFFSET. Стоимость страницы не растёт с глубиной прокрутки: БД идёт по индексу
+от курсора и останавливается, набрав страницу.
+
+Курсор — значения полей сортировки последней строки через точку ("3.1542"); поля — целые числа.
+"""
+from django.db.models import Q
+
+
+def encode_cursor(obj, fields):
+    return ".".join(str(getattr(obj, field)) for field in fields)
+
+
+def decode_cursor(cursor, fields):
+    """Значения курсора или None, если курсор пустой или испорчен (тогда — первая страница)."""
+    if not cursor:
+        return None
+    parts = cursor.split(".")
+    if len(parts) != len(fields):
+        return None
+    try:
+        return [int(part) for part in parts]
+    except ValueError:
+        return None
+
+
+def after_cursor(fields, values):
+    """(f1, f2, ...) > (v1, v2, ...) в лексикографическом порядке, в виде Q."""
+    condition = Q()
+    for i, (field, value) in enumerate(zip(fields, values)):
+        equal = Q(**{f: v for f, v in zip(fields[:i], values[:i])})
+        condition |= equal & Q(**{f"{field}__gt": value})
+    return condition
+
+
+def keyset_page(queryset, fields, cursor=None, size=50):
+    """
+    Страница queryset, упорядоченного по fields (по возрастанию; последнее поле уникально, обычно id).
+    Возвращает (объекты, курсор следующей страницы или None).
+    """
+    values = decode_cursor(cursor, fields)
+    if values is not None:
+        queryset = queryset.filter(after_cursor(fields, values))
+    # на одну строку больше — чтобы узнать, есть ли следующая страница, без COUNT
+    items = list(queryset.order_by(*fields)[: size + 1])
+    if len(items) <= size:
+        return items, None
+    items = items[:size]
+    return items, encode_cursor(items[-1], fields)
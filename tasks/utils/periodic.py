@@ -0,0 +1,146 @@
+"""
+Периодические задачи, которые запускает планировщик (run_scheduler, см. scheduler.py) через очередь jobs.
+Все они идемпотентны: повторный запуск (догон после простоя, ручной вызов) ничего не задваивает.
+"""
+import calendar
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Category, Department, Employee, EventCard, Notification, Task
+from .counters import recount_card_counters, touch_cards
+from .employee_context import invalidate_employee_context
+from .notifications import notify_many
+
+MONTHS_RU = {
+    1: "январь",
+    2: "февраль",
+    3: "март",
+    4: "апрель",
+    5: "май",
+    6: "июнь",
+    7: "июль",
+    8: "август",
+    9: "сентябрь",
+    10: "октябрь",
+    11: "ноябрь",
+    12: "декабрь",
+}
+
+REMINDER_STATUSES = ("new", "in_progress")
+
+
+def create_monthly_department_cards(today=None):
+    """Скрытая карточка "Внутренняя работа" каждому отделу на текущий месяц. Возвращает число созданных."""
+    today = today or timezone.localdate()
+    month_name = MONTHS_RU[today.month]
+
+    # ищем категорию "Внутренняя работа"
+    category = Category.objects.filter(slug="vnutrennyaya-rabota").first()
+    if not category:
+        category = Category.objects.create(name="Внутренняя работа", slug="vnutrennyaya-rabota")
+
+    # admin будет создателем
+    admin_user = get_user_model().objects.filter(username="admin").first()
+    admin_employee = getattr(admin_user, "employee", None)
+
+    start_date = today.replace(day=1)
+    end_date = today.replace(day=calendar.monthrange(today.year, today.month)[1])
+    created = 0
+
+    for dept in Department.objects.all():
+        # Проверяем, существует ли уже карточка этого отдела за текущий месяц
+        exists = EventCard.objects.filter(
+            responsible_department=dept,
+            start_date__year=today.year,
+            start_date__month=today.month,
+            title__icontains=dept.shortname,
+            visible=False
+        ).exists()
+        if exists:
+            continue
+
+        with transaction.atomic():
+            card = EventCard.objects.create(
+                title=f"{dept.shortname} {month_name.capitalize()}",
+                description="Карточка для задач внутри отдела",
+                start_date=start_date,
+                end_date=end_date,
+                responsible_department=dept,
+                created_by=admin_employee,
+                visible=False,  # 🔒 скрытая
+            )
+            card.categories.add(category)
+        created += 1
+
+    return created
+
+
+def expire_delegations(today=None):
+    """
+    Снимает истёкшие замещения (delegate_until в прошлом) одним UPDATE и сообщает сотрудникам.
+    Раньше это делалось лениво на каждом запросе (middleware, frozen_notice, my_delegation).
+    """
+    today = today or timezone.localdate()
+    expired = Employee.objects.filter(delegate_until__lt=today)
+    user_ids = list(expired.exclude(delegate_to=None).values_list("user_id", flat=True))
+
+    with transaction.atomic():
+        expired.update(delegate_to=None, delegate_until=None)
+        if user_ids:
+            notify_many([
+                (user_id, "⏳ Срок замещения истёк. Ваш аккаунт снова активен.", None) for user_id in user_ids
+            ])
+
+    # update() не шлёт сигналы — кешированный контекст сбрасываем сами
+    invalidate_employee_context(*user_ids)
+    return len(user_ids)
+
+
+def send_deadline_reminders(today=None, days=None):
+    """
+    Напоминает исполнителям (или их замещающим) о задачах со сроком в ближайшие days дней.
+    Одно напоминание на задачу в день: уже отправленные сегодня повторно не шлём.
+    """
+    today = today or timezone.localdate()
+    days = getattr(settings, "TASK_REMINDER_DAYS", 1) if days is None else days
+
+    tasks = (
+        Task.objects.filter(
+            assigned_employee__isnull=False,
+            status__in=REMINDER_STATUSES,
+            due_date__gte=today,
+            due_date__lte=today + timedelta(days=days),
+        )
+        .select_related("assigned_employee", "assigned_employee__delegate_to")
+        .order_by("due_date", "id")
+    )
+
+    items = []
+    for task in tasks:
+        employee = task.assigned_employee.get_effective()
+        message = f"⏰ Срок задачи «{task.title}» — {task.due_date:%d.%m.%Y}"
+        items.append((employee.user_id, message[:500], task.get_absolute_url()))
+    if not items:
+        return 0
+
+    start_of_day = timezone.make_aware(datetime.combine(today, time.min))
+    already_sent = set(
+        Notification.objects.filter(
+            created_at__gte=start_of_day, url__in={url for _, _, url in items}, message__startswith="⏰"
+        ).values_list("user_id", "url")
+    )
+    items = [item for item in items if (item[0], item[2]) not in already_sent]
+    notify_many(items)
+    return len(items)
+
+
+def reconcile_card_counters():
+    """Ночной полный пересчёт счётчиков карточек — исправляет возможные расхождения."""
+    count = recount_card_counters()
+    # исправленные числа должны дойти до открытых страниц: сбрасываем ETag статистики всех карточек
+    touch_cards(EventCard.objects.values_list("id", flat=True))
+    return count
@@ -0,0 +1,324 @@
+"""
+Правила доступа в одном месте: кто что может делать с задачами, карточками и сотрудниками.
+
+Правило — действие ("task.view", "card.create_task", ...) и основания, любое из которых даёт доступ:
+роль, "сотрудник указан в поле объекта", свой отдел, связь через другую таблицу, доступ к карточке
+по CardVisibility. При запуске (TasksConfig.ready) правила компилируются: поля проверяются по моделям,
+и у каждого действия есть проверка одного объекта по уже загруженным полям и Q-фильтр для queryset.
+Основания, которые по полям объекта не проверить (связи через другие таблицы), проверяются запросом.
+
+Policy — правила для конкретного сотрудника. get_policy(request) создаёт её один раз на запрос
+и запоминает результаты (сотрудник, действие, объект); allowed() проверяет пачку объектов одним
+запросом, filter() оставляет в queryset только разрешённое — для списков.
+"""
+from django.apps import apps
+from django.db.models import Q
+
+from .employee_context import get_employee_context
+from .visibility import ALL_CARDS_ROLES, card_access
+
+
+class Grant:
+    """
+    Основание доступа. check() — True/False по загруженным полям объекта или None, если нужен запрос;
+    q() — условие на queryset, Q() — "всё", None — "ничего".
+    """
+
+    def compile(self, model):
+        pass
+
+    def check(self, employee, obj):
+        return None
+
+    def q(self, employee):
+        return None
+
+
+class Role(Grant):
+    def __init__(self, *roles):
+        self.roles = frozenset(roles)
+
+    def check(self, employee, obj):
+        return employee.role in self.roles
+
+    def q(self, employee):
+        return Q() if employee.role in self.roles else None
+
+
+class Field(Grant):
+    """Сотрудник указан в поле объекта (FK на Employee; "id" — сам сотрудник)."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def compile(self, model):
+        self.attname = model._meta.get_field(self.name).attname
+
+    def check(self, employee, obj):
+        return getattr(obj, self.attname) == employee.pk
+
+    def q(self, employee):
+        return Q(**{self.attname: employee.pk})
+
+
+class Unassigned(Field):
+    """Поле не заполнено (задача ещё никому не назначена)."""
+
+    def check(self, employee, obj):
+        return getattr(obj, self.attname) is None
+
+    def q(self, employee):
+        return Q(**{f"{self.attname}__isnull": True})
+
+
+class SameDepartment(Field):
+    """Поле объекта — отдел сотрудника."""
+
+    def check(self, employee, obj):
+        return employee.department_id is not None and getattr(obj, self.attname) == employee.department_id
+
+    def q(self, employee):
+        if employee.department_id is None:
+            return None
+        return Q(**{self.attname: employee.department_id})
+
+
+class Attr(Grant):
+    """Значение поля объекта из списка (например, роль сотрудника-адресата)."""
+
+    def __init__(self, name, *values):
+        self.name, self.values = name, frozenset(values)
+
+    def compile(self, model):
+        model._meta.get_field(self.name)
+
+    def check(self, employee, obj):
+        return getattr(obj, self.name) in self.values
+
+    def q(self, employee):
+        return Q(**{f"{self.name}__in": sorted(self.values)})
+
+
+class Related(Grant):
+    """Сотрудник связан с объектом через другую таблицу (lookup до Employee) — проверяется запросом."""
+
+    def __init__(self, lookup):
+        self.lookup = lookup
+
+    def compile(self, model):
+        self.model = model
+        model.objects.filter(**{self.lookup: 0})  # неверный lookup — ошибка при запуске, а не в запросе
+
+    def q(self, employee):
+        return Q(pk__in=self.model.objects.filter(**{self.lookup: employee.pk}).values("pk"))
+
+
+class CardAccess(Grant):
+    """Карточка доступна отделу сотрудника (CardVisibility); public — и опубликованные карточки."""
+
+    def __init__(self, public=True):
+        self.public = public
+
+    def q(self, employee):
+        return Q(pk__in=card_access(employee, public=self.public).values("card_id"))
+
+
+class All(Grant):
+    def __init__(self, *grants):
+        self.grants = grants
+
+    def compile(self, model):
+        for grant in self.grants:
+            grant.compile(model)
+
+    def check(self, employee, obj):
+        result = True
+        for grant in self.grants:
+            value = grant.check(employee, obj)
+            if value is False:
+                return False
+            if value is None:
+                result = None
+        return result
+
+    def q(self, employee):
+        condition = Q()
+        for grant in self.grants:
+            value = grant.q(employee)
+            if value is None:
+                return None
+            condition &= value
+        return condition
+
+
+class Any(All):
+    def check(self, employee, obj):
+        result = False
+        for grant in self.grants:
+            value = grant.check(employee, obj)
+            if value:
+                return True
+            if value is None:
+                result = None
+        return result
+
+    def q(self, employee):
+        parts = [value for value in (grant.q(employee) for grant in self.grants) if value is not None]
+        if not parts:
+            return None
+        if any(not part for part in parts):
+            return Q()  # одно из оснований разрешает всё
+        condition = Q()
+        for part in parts:
+            condition |= part
+        return condition
+
+
+class Not(Grant):
+    def __init__(self, grant):
+        self.grant = grant
+
+    def compile(self, model):
+        self.grant.compile(model)
+
+    def check(self, employee, obj):
+        value = self.grant.check(employee, obj)
+        return None if value is None else not value
+
+    def q(self, employee):
+        value = self.grant.q(employee)
+        if value is None:
+            return Q()
+        return None if not value else ~value
+
+
+class Rule:
+    """Действие над объектами модели (model=None — действие без объекта, только по роли)."""
+
+    def __init__(self, model, *grants):
+        self.model_label, self.grant = model, Any(*grants)
+        self.model = None
+
+    def compile(self):
+        if self.model_label:
+            self.model = apps.get_model(self.model_label)
+            self.grant.compile(self.model)
+
+
+MANAGERS = ("director", "deputy")
+
+RULES = {
+    # --- Карточки ---
+    "card.create": Rule(None, Role("director", "deputy", "head", "senior")),
+    "card.view": Rule("tasks.EventCard", Role(*ALL_CARDS_ROLES), CardAccess()),
+    # план скрытой карточки видят ещё автор и участники согласования
+    "card.view_plan": Rule(
+        "tasks.EventCard", Role(*ALL_CARDS_ROLES), CardAccess(), Field("created_by"), Field("final_approver"),
+        Related("cardapproverorder__employee"),
+    ),
+    "card.create_task": Rule(
+        "tasks.EventCard",
+        Role(*MANAGERS),
+        All(Role("head", "senior"), CardAccess(public=False)),  # ответственный или расшаренный отдел
+        All(Role("staff"), SameDepartment("responsible_department")),
+    ),
+    "card.review_plan": Rule("tasks.EventCard", Role(*MANAGERS)),
+    "card.resend_plan": Rule("tasks.EventCard", Field("created_by")),
+
+    # --- Задачи ---
+    "task.view": Rule("tasks.Task", Role(*MANAGERS), Field("assigned_employee"), Field("created_by")),
+    # файлы задачи видит ещё проверяющий из задачи на проверку
+    "task.view_files": Rule(
+        "tasks.Task", Role(*MANAGERS), Field("assigned_employee"), Field("created_by"),
+        Related("review_tasks__assigned_employee"),
+    ),
+    "task.take": Rule("tasks.Task", Unassigned("assigned_employee"), Field("assigned_employee")),
+    "task.execute": Rule("tasks.Task", Field("assigned_employee")),
+    "task.review": Rule("tasks.Task", Role(*MANAGERS), Field("assigned_employee")),
+    "task.review_take": Rule("tasks.Task", Field("assigned_employee")),
+    "task.review_decide": Rule("tasks.Task", Field("assigned_employee")),  # утвердить / вернуть на доработку
+
+    # --- Кому можно назначать задачи (адресаты в TaskForm) ---
+    "employee.assign_task": Rule(
+        "tasks.Employee",
+        Role("director"),
+        All(Role("deputy"), Not(Attr("role", "director"))),
+        All(
+            Role("head", "senior"),
+            Any(SameDepartment("department"), Attr("role", "head", "senior")),
+            Not(Field("id")),
+        ),
+    ),
+}
+
+
+def compile_rules():
+    """Вызывается из TasksConfig.ready: ошибка в правилах (нет такого поля) видна сразу при запуске."""
+    for rule in RULES.values():
+        rule.compile()
+
+
+class Policy:
+    """Правила для одного сотрудника с запоминанием результатов (employee=None — запрещено всё)."""
+
+    def __init__(self, employee):
+        self.employee = employee
+        self.results = {}
+
+    def can(self, action, obj=None):
+        key = (action, None if obj is None else obj.pk)
+        if key not in self.results:
+            self.results[key] = self._check(RULES[action], obj)
+        return self.results[key]
+
+    def _check(self, rule, obj):
+        if self.employee is None:
+            return False
+        result = rule.grant.check(self.employee, obj)
+        if result is None:
+            condition = rule.grant.q(self.employee)
+            result = condition is not None and rule.model.objects.filter(condition, pk=obj.pk).exists()
+        return result
+
+    def filter(self, action, queryset):
+        """Только объекты, для которых действие разрешено (один запрос вместо проверки каждого)."""
+        condition = None if self.employee is None else RULES[action].grant.q(self.employee)
+        if condition is None:
+            return queryset.none()
+        return queryset.filter(condition)
+
+    def allowed(self, action, objects):
+        """pk объектов из списка, для которых действие разрешено: по полям, остальные — одним запросом."""
+        rule = RULES[action]
+        objects = list(objects)
+        pending = []
+        for obj in objects:
+            key = (action, obj.pk)
+            if key in self.results:
+                continue
+            result = False if self.employee is None else rule.grant.check(self.employee, obj)
+            if result is None:
+                pending.append(obj.pk)
+            else:
+                self.results[key] = result
+
+        if pending:
+            granted = set(self.filter(action, rule.model.objects.filter(pk__in=pending)).values_list("pk", flat=True))
+            for pk in pending:
+                self.results[(action, pk)] = pk in granted
+        return {obj.pk for obj in objects if self.results[(action, obj.pk)]}
+
+
+def get_policy(request, employee=None):
+    """
+    Policy на время запроса — одна на сотрудника, результаты проверок не пересчитываются.
+    По умолчанию — фактический сотрудник (с учётом замещения).
+    """
+    if employee is None:
+        context = get_employee_context(request)
+        employee = context.effective if context else None
+    policies = request.__dict__.setdefault("_policies", {})
+    key = employee.pk if employee is not None else None
+    if key not in policies:
+        policies[key] = Policy(employee)
+    return policies[key]
@@ -0,0 +1,216 @@
+"""
+Предпросмотр планов и вложений: PNG-миниатюра первой страницы и лёгкая HTML-версия.
+
+Превью строит воркер очереди задач (jobs.py) после сохранения файла; они лежат в MEDIA_ROOT/previews/
+под хешем содержимого (для файлов из хранилища по хешу), поэтому одинаковые файлы обрабатываются один раз.
+Поддерживаются docx, xlsx, pdf, изображения и текстовые файлы; для остальных (например, .doc)
+превью нет — остаётся обычное скачивание.
+"""
+import hashlib
+import logging
+import os
+import textwrap
+import threading
+
+from django.conf import settings
+from django.utils.html import escape
+
+from .jobs import enqueue, is_pending
+from .storage import CAS_PREFIX, content_storage
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_PREFIX = "previews"
+PREVIEW_KINDS = {"png": "image/png", "html": "text/html; charset=utf-8"}
+
+THUMBNAIL_SIZE = (300, 424)  # пропорции A4
+MAX_ROWS = 50       # строк таблицы xlsx/docx в превью
+MAX_COLUMNS = 20
+MAX_PARAGRAPHS = 200
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
+TEXT_EXTENSIONS = {".txt", ".csv"}
+
+
+def preview_key(name):
+    """Ключ превью: хеш содержимого для файлов cas/..., иначе хеш имени (старые файлы уникальны по имени)."""
+    parts = name.split("/")
+    if len(parts) >= 3 and parts[0] == CAS_PREFIX:
+        return parts[2]
+    return hashlib.sha256(name.encode()).hexdigest()
+
+
+def preview_name(name, kind):
+    key = preview_key(name)
+    return f"{PREVIEW_PREFIX}/{key[:2]}/{key}.{kind}"
+
+
+def preview_path(name, kind):
+    return content_storage.path(preview_name(name, kind))
+
+
+def has_preview(name, kind="png"):
+    return bool(name) and os.path.exists(preview_path(name, kind))
+
+
+# --- Извлечение содержимого: список блоков ("p", текст) / ("table", строки) ---
+
+def _cell_text(value):
+    return "" if value is None else str(value)
+
+
+def extract_docx(path):
+    import docx
+
+    document = docx.Document(path)
+    blocks = [("p", p.text) for p in document.paragraphs[:MAX_PARAGRAPHS] if p.text.strip()]
+    for table in document.tables[:3]:
+        rows = [[cell.text for cell in row.cells[:MAX_COLUMNS]] for row in table.rows[:MAX_ROWS]]
+        blocks.append(("table", rows))
+    return blocks
+
+
+def extract_xlsx(path):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = [
+            [_cell_text(value) for value in row[:MAX_COLUMNS]]
+            for row in sheet.iter_rows(max_row=MAX_ROWS, values_only=True)
+        ]
+    finally:
+        workbook.close()
+    rows = [row for row in rows if any(row)]
+    return [("p", sheet.title), ("table", rows)]
+
+
+def extract_pdf(path):
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(path)
+    blocks = []
+    for page in reader.pages[:2]:
+        blocks += [("p", line) for line in (page.extract_text() or "").splitlines() if line.strip()]
+    return blocks
+
+
+def extract_text(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return [("p", line.rstrip("\n")) for _, line in zip(range(MAX_PARAGRAPHS), f)]
+
+
+EXTRACTORS = {".docx": extract_docx, ".xlsx": extract_xlsx, ".pdf": extract_pdf}
+
+
+# --- Рендеринг ---
+
+def _font(size):
+    from PIL import ImageFont
+
+    font_path = getattr(settings, "PREVIEW_FONT_PATH", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+    try:
+        return ImageFont.truetype(font_path, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def render_thumbnail(blocks, target):
+    """Миниатюра "первой страницы": текст документа на белом листе."""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", THUMBNAIL_SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    font = _font(9)
+    y, margin, line_height = 14, 14, 12
+    for kind, value in blocks:
+        lines = [" | ".join(row) for row in value] if kind == "table" else [value]
+        for line in lines:
+            for wrapped in textwrap.wrap(line, 52) or [""]:
+                if y > THUMBNAIL_SIZE[1] - margin:
+                    break
+                draw.text((margin, y), wrapped, fill="#222222", font=font)
+                y += line_height
+    draw.rectangle([0, 0, THUMBNAIL_SIZE[0] - 1, THUMBNAIL_SIZE[1] - 1], outline="#cccccc")
+    image.save(target, "PNG", optimize=True)
+
+
+def render_image_thumbnail(path, target):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.thumbnail(THUMBNAIL_SIZE)
+        image.convert("RGB").save(target, "PNG", optimize=True)
+
+
+def render_html(blocks, title, target):
+    parts = [
+        "<!doctype html><html><head><meta charset='utf-8'>",
+        f"<title>{escape(title)}</title>",
+        "<style>body{font-family:sans-serif;max-width:960px;margin:2em auto;padding:0 1em}"
+        "table{border-collapse:collapse;margin:1em 0}td{border:1px solid #ccc;padding:2px 6px}</style>",
+        "</head><body>",
+    ]
+    for kind, value in blocks:
+        if kind == "table":
+            parts.append("<table>")
+            parts += ["<tr>" + "".join(f"<td>{escape(cell)}</td>" for cell in row) + "</tr>" for row in value]
+            parts.append("</table>")
+        else:
+            parts.append(f"<p>{escape(value)}</p>")
+    parts.append("</body></html>")
+    with open(target, "w", encoding="utf-8") as f:
+        f.write("".join(parts))
+
+
+def _atomic_target(path):
+    """Пишем во временный файл рядом и переименовываем — параллельные воркеры не увидят половину файла."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def generate_preview(name):
+    """Строит PNG и HTML превью файла хранилища. Возвращает True, если превью есть (или уже было)."""
+    if not name or has_preview(name, "png"):
+        return bool(name)
+    source = content_storage.path(name)
+    if not os.path.isfile(source):
+        return False
+
+    ext = os.path.splitext(name)[1].lower()
+    png, html = preview_path(name, "png"), preview_path(name, "html")
+    png_tmp, html_tmp = _atomic_target(png), _atomic_target(html)
+    try:
+        if ext in IMAGE_EXTENSIONS:
+            render_image_thumbnail(source, png_tmp)
+            os.replace(png_tmp, png)
+            return True
+        extractor = EXTRACTORS.get(ext) or (extract_text if ext in TEXT_EXTENSIONS else None)
+        if extractor is None:
+            return False
+        blocks = extractor(source)
+        render_html(blocks, os.path.basename(name), html_tmp)
+        render_thumbnail(blocks, png_tmp)
+        os.replace(html_tmp, html)
+        os.replace(png_tmp, png)
+        return True
+    except Exception:
+        # битый или нестандартный файл не должен ломать сохранение — просто без превью
+        logger.exception("Не удалось построить превью для %s", name)
+        return False
+    finally:
+        for tmp in (png_tmp, html_tmp):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def can_preview(name):
+    ext = os.path.splitext(name or "")[1].lower()
+    return ext in IMAGE_EXTENSIONS or ext in TEXT_EXTENSIONS or ext in EXTRACTORS
+
+
+def schedule_preview(name):
+    """Ставит построение превью в очередь: формат поддерживается, превью ещё нет и задача не стоит в очереди."""
+    if not can_preview(name) or has_preview(name) or is_pending(generate_preview, name=name):
+        return
+    enqueue(generate_preview, name=name)
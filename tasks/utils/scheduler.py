@@ -0,0 +1,161 @@
+"""
+Встроенный планировщик периодических задач вместо cron (команда run_scheduler).
+
+Расписание задаётся здесь в коде (SCHEDULE), состояние — в таблице PeriodicTask: когда следующий запуск,
+когда был последний, включена ли задача (можно выключить в админке).
+- Лидер один: процессы run_scheduler делят аренду в SchedulerLock, задачи ставит только её владелец;
+  если лидер упал, аренду через SCHEDULER_LEASE_SECONDS забирает другой.
+- Догон: если планировщик не работал и пропустил несколько запусков, задача выполняется один раз,
+  а следующий запуск считается от текущего момента (missed_runs — сколько запусков было пропущено).
+- Сами функции выполняет воркер очереди (jobs.enqueue, команда run_worker) — с повторами при ошибках.
+"""
+import os
+import socket
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .jobs import enqueue
+
+LOCK_NAME = "scheduler"
+
+
+class Schedule:
+    """
+    Одна строка расписания. Вид задаётся аргументами:
+    every=timedelta — интервал; at=time — ежедневно в это время; at + day=N — ежемесячно N-го числа.
+    Время — локальное (TIME_ZONE).
+    """
+
+    def __init__(self, name, func, *, every=None, at=None, day=None):
+        if (every is None) == (at is None):
+            raise ValueError(f"{name}: нужно указать либо every, либо at")
+        self.name, self.func, self.every, self.at, self.day = name, func, every, at, day
+
+    def next_after(self, moment):
+        """Ближайший запуск строго после moment."""
+        if self.every is not None:
+            return moment + self.every
+
+        local = timezone.localtime(moment)
+        if self.day is None:
+            candidate = self._at(local.date())
+            if candidate <= moment:
+                candidate = self._at(local.date() + timedelta(days=1))
+            return candidate
+
+        candidate = self._at(local.date().replace(day=self.day))
+        if candidate <= moment:
+            year, month = (local.year + 1, 1) if local.month == 12 else (local.year, local.month + 1)
+            candidate = self._at(local.date().replace(year=year, month=month, day=self.day))
+        return candidate
+
+    def missed_between(self, scheduled, moment):
+        """Сколько запусков по расписанию пришлось на [scheduled, moment] (для статистики догона)."""
+        count, current = 0, scheduled
+        while current <= moment and count < 1000:
+            count += 1
+            current = self.next_after(current)
+        return count
+
+    def _at(self, day):
+        return timezone.make_aware(datetime.combine(day, self.at))
+
+
+SCHEDULE = [
+    Schedule("monthly_department_cards", "tasks.utils.periodic.create_monthly_department_cards",
+             day=1, at=time(0, 5)),
+    Schedule("expire_delegations", "tasks.utils.periodic.expire_delegations", at=time(0, 10)),
+    Schedule("reconcile_card_counters", "tasks.utils.periodic.reconcile_card_counters", at=time(3, 30)),
+    Schedule("deadline_reminders", "tasks.utils.periodic.send_deadline_reminders", at=time(9, 0)),
+    Schedule("sweep_unreferenced_files", "tasks.utils.storage.sweep_unreferenced", at=time(4, 0)),
+    Schedule("prune_stream_events", "tasks.utils.events.prune_stream_events", every=timedelta(hours=1)),
+    Schedule("requeue_stale_jobs", "tasks.utils.jobs.requeue_stale_jobs", every=timedelta(minutes=5)),
+    Schedule("purge_finished_jobs", "tasks.utils.jobs.purge_finished_jobs", at=time(4, 30)),
+]
+
+
+def get_schedule():
+    return {entry.name: entry for entry in SCHEDULE}
+
+
+def default_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_leadership(owner, now=None):
+    """Берёт или продлевает аренду лидера. True — этот процесс лидер до истечения аренды."""
+    from ..models import SchedulerLock
+
+    now = now or timezone.now()
+    expires_at = now + timedelta(seconds=getattr(settings, "SCHEDULER_LEASE_SECONDS", 90))
+
+    # один условный UPDATE: продлеваем свою аренду или забираем просроченную чужую
+    taken = (
+        SchedulerLock.objects.filter(name=LOCK_NAME)
+        .filter(Q(owner=owner) | Q(expires_at__lt=now))
+        .update(owner=owner, expires_at=expires_at)
+    )
+    if taken:
+        return True
+    try:
+        with transaction.atomic():
+            SchedulerLock.objects.create(name=LOCK_NAME, owner=owner, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        return False  # аренда есть и она чужая
+
+
+def release_leadership(owner):
+    from ..models import SchedulerLock
+
+    SchedulerLock.objects.filter(name=LOCK_NAME, owner=owner).delete()
+
+
+def sync_schedule(now=None):
+    """Создаёт строки PeriodicTask для новых записей SCHEDULE. Новая задача запускается сразу (все идемпотентны)."""
+    from ..models import PeriodicTask
+
+    now = now or timezone.now()
+    existing = set(PeriodicTask.objects.values_list("name", flat=True))
+    PeriodicTask.objects.bulk_create([
+        PeriodicTask(name=name, next_run_at=now) for name in get_schedule() if name not in existing
+    ])
+
+
+def run_due(now=None):
+    """Ставит в очередь задачи, срок которых наступил. Возвращает список имён поставленных задач."""
+    from ..models import PeriodicTask
+
+    now = now or timezone.now()
+    schedule = get_schedule()
+    started = []
+    for periodic in PeriodicTask.objects.filter(enabled=True, next_run_at__lte=now):
+        entry = schedule.get(periodic.name)
+        if entry is None:
+            continue  # задача убрана из кода — строку оставляем, её можно удалить в админке
+
+        with transaction.atomic():
+            # условный UPDATE: если строку уже сдвинул другой процесс (бывший лидер), второй раз не ставим
+            moved = PeriodicTask.objects.filter(pk=periodic.pk, next_run_at=periodic.next_run_at).update(
+                next_run_at=entry.next_after(now),
+                last_run_at=now,
+                missed_runs=max(entry.missed_between(periodic.next_run_at, now) - 1, 0),
+                total_runs=F("total_runs") + 1,
+            )
+            if moved:
+                enqueue(entry.func, max_attempts=3)
+                started.append(periodic.name)
+    return started
+
+
+def tick(owner, now=None):
+    """Один шаг планировщика: продлить лидерство и, если мы лидер, запустить наступившие задачи."""
+    now = now or timezone.now()
+    if not acquire_leadership(owner, now):
+        return None
+    sync_schedule(now)
+    return run_due(now)
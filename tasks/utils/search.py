@@ -0,0 +1,371 @@
+"""
+Полнотекстовый поиск по задачам, карточкам, комментариям истории и тексту планов.
+
+Документы лежат в таблице SearchEntry (один на объект) и обновляются сигналами при сохранении.
+- SQLite: FTS5-таблица tasks_searchentry_fts с внешним содержимым (content=tasks_searchentry),
+  синхронизируется триггерами; ранжирование bm25, фрагменты — snippet().
+- PostgreSQL: tsvector по title (вес A) и body (вес B), GIN-индекс, SearchRank/SearchHeadline.
+- Прочие БД: простой icontains (без ранжирования).
+
+Морфология: FTS5 не знает русского и казахского, поэтому слова запроса обрезаются по окончаниям
+(SEARCH_STEMMING_LANGUAGES) и ищутся по префиксу: "отчётами" -> "отчет*". Токенизатор FTS5 —
+SEARCH_FTS5_TOKENIZE, конфигурация PostgreSQL — SEARCH_CONFIG; после их смены нужен rebuild_search_index.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .policy import Policy
+
+FTS_TABLE = "tasks_searchentry_fts"
+PG_INDEX = "tasks_searchentry_tsv_idx"
+MAX_BODY_LENGTH = 200_000   # текст большого плана режем — в поиске важно начало документа
+MAX_QUERY_TERMS = 10
+TITLE_WEIGHT, BODY_WEIGHT = 5.0, 1.0
+
+# маркеры совпадений во фрагменте: управляющие символы не встречаются в тексте, после escape -> <mark>
+MARK_START, MARK_END = "\x02", "\x03"
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+MIN_STEM_LENGTH = 4
+
+# окончания, которые отрезаются от слов запроса (от длинных к коротким)
+SUFFIXES = {
+    "ru": (
+        "иями", "ями", "ами", "иях", "ого", "его", "ому", "ему", "ыми", "ими", "ией", "ость",
+        "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой", "ей", "ом", "ем", "ам", "ям", "ах", "ях",
+        "ов", "ев", "ую", "юю", "ия", "ья", "ью", "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+    ),
+    "kk": (
+        "лары", "лері", "дары", "дері", "тары", "тері", "ның", "нің", "дың", "дің", "тың", "тің",
+        "дан", "ден", "тан", "тен", "нан", "нен", "мен", "бен", "пен", "лар", "лер", "дар", "дер",
+        "тар", "тер", "ға", "ге", "қа", "ке", "да", "де", "та", "те", "ы", "і",
+    ),
+}
+
+
+# --- Нормализация и запрос ---
+
+def normalize_text(text):
+    """Текст для индекса: ё -> е (unicode61 их не сближает), без управляющих символов-маркеров."""
+    text = (text or "").replace("ё", "е").replace("Ё", "Е")
+    return text.replace(MARK_START, " ").replace(MARK_END, " ")
+
+
+def _suffixes():
+    languages = getattr(settings, "SEARCH_STEMMING_LANGUAGES", ("ru", "kk"))
+    return sorted({suffix for lang in languages for suffix in SUFFIXES.get(lang, ())}, key=len, reverse=True)
+
+
+def stem(word):
+    """Грубая основа слова: отрезаем самое длинное подходящее окончание, оставляя не меньше 4 букв."""
+    for suffix in _suffixes():
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            return word[: -len(suffix)]
+    return word
+
+
+def query_terms(query):
+    words = WORD_RE.findall(normalize_text(query).lower())
+    return [stem(word) for word in words[:MAX_QUERY_TERMS]]
+
+
+def fts5_query(query):
+    """Запрос пользователя -> выражение MATCH: все слова обязательны, каждое — по префиксу основы."""
+    return " ".join(f'"{term}"*' for term in query_terms(query))
+
+
+def highlight(snippet):
+    """Фрагмент с маркерами -> безопасный HTML с <mark>."""
+    html = escape(snippet or "").replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+    return mark_safe(html)
+
+
+# --- Индекс в БД ---
+
+def backend(using=None):
+    vendor = (using or connection).vendor
+    return {"sqlite": "fts5", "postgresql": "postgres"}.get(vendor, "like")
+
+
+def pg_config():
+    return getattr(settings, "SEARCH_CONFIG", "russian")
+
+
+def create_search_index(schema_editor, model):
+    """Создаёт FTS5-таблицу с триггерами (SQLite) или GIN-индекс (PostgreSQL) и заполняет из SearchEntry."""
+    kind = backend(schema_editor.connection)
+    if kind == "postgres":
+        from django.contrib.postgres.indexes import GinIndex
+
+        # то же выражение, что в запросе (pg_vector), иначе PostgreSQL не возьмёт индекс
+        schema_editor.add_index(model, GinIndex(pg_vector(), name=PG_INDEX))
+        return
+    if kind != "fts5":
+        return
+
+    tokenize = getattr(settings, "SEARCH_FTS5_TOKENIZE", "unicode61 remove_diacritics 2")
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"title, body, content='tasks_searchentry', content_rowid='id', tokenize=\"{tokenize}\")"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON tasks_searchentry BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.id, new.title, new.body); END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON tasks_searchentry BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) "
+        f"VALUES ('delete', old.id, old.title, old.body); END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF title, body ON tasks_searchentry BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) "
+        f"VALUES ('delete', old.id, old.title, old.body); "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.id, new.title, new.body); END"
+    )
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(schema_editor, model):
+    kind = backend(schema_editor.connection)
+    if kind == "postgres":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {PG_INDEX}")
+    elif kind == "fts5":
+        for suffix in ("ai", "ad", "au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+# --- Документы ---
+
+def _entry(kind, obj, title, body, task_id=None, card_id=None, source=""):
+    from ..models import SearchEntry
+
+    return SearchEntry(
+        kind=kind, object_id=obj.pk, task_id=task_id, card_id=card_id, source=source,
+        title=normalize_text(title)[:255], body=normalize_text(body)[:MAX_BODY_LENGTH],
+    )
+
+
+def task_entry(task):
+    body = "\n".join(filter(None, [task.description, task.review_comment]))
+    return _entry("task", task, task.title, body, task_id=task.pk, card_id=task.card_id)
+
+
+def card_entry(card):
+    return _entry("card", card, card.title, card.description, card_id=card.pk)
+
+
+def history_entry(history):
+    task = history.task
+    return _entry("history", history, task.title, history.comment, task_id=task.pk, card_id=task.card_id)
+
+
+def save_entries(entries):
+    """Вставка или обновление документов одним запросом (upsert по kind + object_id)."""
+    from ..models import SearchEntry
+
+    if entries:
+        SearchEntry.objects.bulk_create(
+            entries, update_conflicts=True, unique_fields=["kind", "object_id"],
+            update_fields=["title", "body", "task", "card", "source", "updated_at"],
+        )
+
+
+def remove_entry(kind, object_id):
+    from ..models import SearchEntry
+
+    SearchEntry.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def index_task(task):
+    save_entries([task_entry(task)])
+
+
+def index_tasks(tasks):
+    save_entries([task_entry(task) for task in tasks])
+
+
+def index_card(card):
+    save_entries([card_entry(card)])
+
+
+def index_history(history):
+    # записи без комментария ("взята в работу" и т.п.) искать нечего
+    if history.comment.strip():
+        save_entries([history_entry(history)])
+    else:
+        remove_entry("history", history.pk)
+
+
+def schedule_plan_indexing(card):
+    """Текст плана извлекаем в фоне и только если файл сменился (имя в хранилище по хешу = содержимое)."""
+    from ..models import SearchEntry
+    from .jobs import enqueue
+
+    name = card.plan_file.name if card.plan_file else ""
+    if not name:
+        remove_entry("plan", card.pk)
+        return
+    if not SearchEntry.objects.filter(kind="plan", object_id=card.pk, source=name).exists():
+        enqueue(index_card_plan, card_id=card.pk)
+
+
+def index_card_plan(card_id):
+    """Фоновая задача: индексирует текст текущего файла плана карточки."""
+    from ..models import EventCard
+
+    card = EventCard.objects.filter(pk=card_id).first()
+    if card is None or not card.plan_file:
+        remove_entry("plan", card_id)
+        return
+    from .text_extraction import extract_file_text
+
+    name = card.plan_file.name
+    # текст по хешу содержимого: если этот файл уже разбирали, он не открывается повторно
+    extracted = extract_file_text(name)
+    text = extracted.text if extracted is not None else ""
+    save_entries([_entry("plan", card, card.title, text, card_id=card.pk, source=name)])
+
+
+def reindex_all(include_plans=True):
+    """Полная переиндексация (после миграции на существующей базе или смены настроек). Возвращает число документов."""
+    from ..models import EventCard, SearchEntry, Task, TaskHistory
+
+    SearchEntry.objects.exclude(kind="plan").delete()
+    count = 0
+    for chunk in _chunks(Task.objects.order_by("pk")):
+        save_entries([task_entry(task) for task in chunk])
+        count += len(chunk)
+    for chunk in _chunks(EventCard.objects.order_by("pk")):
+        save_entries([card_entry(card) for card in chunk])
+        count += len(chunk)
+        if include_plans:
+            for card in chunk:
+                schedule_plan_indexing(card)
+    histories = TaskHistory.objects.exclude(comment="").select_related("task").order_by("pk")
+    for chunk in _chunks(histories):
+        save_entries([history_entry(history) for history in chunk])
+        count += len(chunk)
+    return count
+
+
+def _chunks(queryset, size=500):
+    chunk = []
+    for obj in queryset.iterator(chunk_size=size):
+        chunk.append(obj)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# --- Права и поиск ---
+
+def visible_entries(employee):
+    """
+    Документы, которые сотрудник может видеть, — по правилам tasks.utils.policy для страниц, на которые
+    ведут результаты: задачи и их история — "task.view" (task_detail), карточки — "card.view"
+    (card_detail), тексты планов — "card.view_plan" (скачивание плана).
+    """
+    from ..models import EventCard, SearchEntry, Task
+
+    rules = Policy(employee)
+    return SearchEntry.objects.filter(
+        Q(kind__in=("task", "history"), task_id__in=rules.filter("task.view", Task.objects.all()).values("pk"))
+        | Q(kind="card", card_id__in=rules.filter("card.view", EventCard.objects.all()).values("pk"))
+        | Q(kind="plan", card_id__in=rules.filter("card.view_plan", EventCard.objects.all()).values("pk"))
+    )
+
+
+class SearchHit:
+    def __init__(self, entry, score, snippet):
+        self.entry, self.score, self.snippet = entry, score, snippet
+
+    @property
+    def url(self):
+        from django.urls import reverse
+
+        if self.entry.kind in ("task", "history"):
+            return reverse("task_detail", args=[self.entry.task_id])
+        if self.entry.kind == "plan":
+            return reverse("card_plan_download", args=[self.entry.card_id])
+        return reverse("card_detail", args=[self.entry.card_id])
+
+
+def search(employee, query, *, kinds=None, limit=20, offset=0):
+    """Найденные документы (SearchHit), лучшие первыми, только доступные сотруднику."""
+    if not query_terms(query):
+        return []
+    allowed = visible_entries(employee)
+    if kinds:
+        allowed = allowed.filter(kind__in=kinds)
+
+    kind = backend()
+    if kind == "fts5":
+        return _search_fts5(allowed, query, limit, offset)
+    if kind == "postgres":
+        return _search_postgres(allowed, query, limit, offset)
+    return _search_like(allowed, query, limit, offset)
+
+
+def _search_fts5(allowed, query, limit, offset):
+    from ..models import SearchEntry
+
+    allowed_sql, allowed_params = allowed.values("id").query.sql_with_params()
+    sql = (
+        f"SELECT rowid, bm25({FTS_TABLE}, %s, %s) AS score, "
+        f"snippet({FTS_TABLE}, -1, %s, %s, '…', 16) "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({allowed_sql}) "
+        f"ORDER BY score LIMIT %s OFFSET %s"
+    )
+    params = [TITLE_WEIGHT, BODY_WEIGHT, MARK_START, MARK_END, fts5_query(query),
+              *allowed_params, limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    entries = SearchEntry.objects.in_bulk([row[0] for row in rows])
+    # bm25 в SQLite отрицательный: чем меньше, тем лучше
+    return [SearchHit(entries[pk], -score, highlight(snippet)) for pk, score, snippet in rows if pk in entries]
+
+
+def pg_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    config = pg_config()
+    return SearchVector("title", weight="A", config=config) + SearchVector("body", weight="B", config=config)
+
+
+def _search_postgres(allowed, query, limit, offset):
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+
+    config = pg_config()
+    ts_query = SearchQuery(normalize_text(query), config=config, search_type="websearch")
+    vector = pg_vector()
+    entries = (
+        allowed.annotate(document=vector)
+        .filter(document=ts_query)
+        .annotate(
+            score=SearchRank(vector, ts_query),
+            snippet=SearchHeadline(
+                "body", ts_query, config=config, start_sel=MARK_START, stop_sel=MARK_END, max_words=30,
+            ),
+        )
+        .order_by("-score", "-id")[offset:offset + limit]
+    )
+    return [SearchHit(entry, entry.score, highlight(entry.snippet or entry.title)) for entry in entries]
+
+
+def _search_like(allowed, query, limit, offset):
+    condition = Q()
+    for term in query_terms(query):
+        condition &= Q(title__icontains=term) | Q(body__icontains=term)
+    entries = allowed.filter(condition).order_by("-updated_at")[offset:offset + limit]
+    return [SearchHit(entry, 0, highlight(entry.body[:200])) for entry in entries]
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# все файлы лежат в одном каталоге по хешу содержимого: cas/ab/<sha256>/<имя первой загрузки>
+CAS_PREFIX = "cas"
+HASH_CHUNK_SIZE = 64 * 1024
+
+# поля, которые ссылаются на файлы хранилища (для подсчёта ссылок перед удалением)
+FILE_FIELDS = (
+    ("tasks.EventCard", "plan_file"),
+    ("tasks.Task", "attachment"),
+    ("tasks.TaskAttachment", "file"),
+)
+
+
+def content_digest(content):
+    """SHA-256 содержимого файла (django File; читается кусками, позиция возвращается в начало)."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def digest_dir(digest):
+    return f"{CAS_PREFIX}/{digest[:2]}/{digest}"
+
+
+def count_references(name):
+    """Сколько записей в БД ссылается на файл (по всем FILE_FIELDS)."""
+    total = 0
+    for model_label, field_name in FILE_FIELDS:
+        model = apps.get_model(model_label)
+        total += model._default_manager.filter(**{field_name: name}).count()
+    return total
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище с дедупликацией: файл сохраняется один раз под SHA-256 своего содержимого.
+    Повторная загрузка того же содержимого (в т.ч. под другим именем) возвращает уже сохранённый файл.
+    Имя первой загрузки сохраняется в пути, поэтому ссылки и скачивание показывают понятное имя.
+
+    delete() удаляет файл только когда на него не осталось ссылок в БД (см. FILE_FIELDS) и он не моложе
+    CONTENT_STORAGE_GRACE_SECONDS. Повторная загрузка обновляет mtime файла: имя уже отдано, а запись
+    со ссылкой ещё не закоммичена — удаление такой файл пропустит, а sweep_unreferenced проверит позже.
+    """
+
+    def _save(self, name, content):
+        digest = content_digest(content)
+        directory = digest_dir(digest)
+        existing = self.existing_name(directory)
+        if existing and self.touch(existing):
+            return existing
+        return super()._save(f"{directory}/{os.path.basename(name)}", content)
+
+    def touch(self, name):
+        """Отметить повторное использование файла (mtime = сейчас); False — файл уже удалён."""
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def is_recent(self, name):
+        """Файл сохранён или переиспользован позже, чем CONTENT_STORAGE_GRACE_SECONDS назад."""
+        grace = getattr(settings, "CONTENT_STORAGE_GRACE_SECONDS", 15 * 60)
+        try:
+            return os.path.getmtime(self.path(name)) > time.time() - grace
+        except FileNotFoundError:
+            return False
+
+    def existing_name(self, directory):
+        if not self.exists(directory):
+            return None
+        _, files = self.listdir(directory)
+        return f"{directory}/{sorted(files)[0]}" if files else None
+
+    def delete(self, name):
+        if name and count_references(name) == 0 and not self.is_recent(name):
+            super().delete(name)
+            self.remove_empty_dirs(name)
+
+    def remove_empty_dirs(self, name):
+        directory = os.path.dirname(name)
+        while directory and directory != CAS_PREFIX:
+            try:
+                os.rmdir(self.path(directory))
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def delete_unreferenced(name):
+    content_storage.delete(name)
+    if not content_storage.exists(name):
+        # файл удалён окончательно — извлечённый из него текст больше не нужен
+        from .text_extraction import forget_text
+        forget_text(name)
+
+
+def release_file(name):
+    """Удалить файл в фоне после коммита, если это была последняя ссылка на него."""
+    if name:
+        from .jobs import enqueue
+        enqueue(delete_unreferenced, name=name)
+
+
+def sweep_unreferenced():
+    """
+    Периодически (планировщик): удаляет файлы хранилища, на которые нет ссылок в БД, — в т.ч. пропущенные
+    delete_unreferenced из-за периода ожидания. Возвращает число удалённых файлов.
+    """
+    root = content_storage.path(CAS_PREFIX)
+    if not os.path.isdir(root):
+        return 0
+    referenced = set()
+    for model_label, field_name in FILE_FIELDS:
+        model = apps.get_model(model_label)
+        referenced.update(model._default_manager.exclude(**{field_name: ""}).values_list(field_name, flat=True))
+
+    removed = 0
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            name = os.path.relpath(os.path.join(directory, filename), content_storage.location).replace(os.sep, "/")
+            if name in referenced or content_storage.is_recent(name):
+                continue
+            delete_unreferenced(name)  # заново считает ссылки: запись могла появиться после выборки выше
+            removed += not content_storage.exists(name)
+    return removed
@@ -0,0 +1,72 @@
+from django.db import transaction
+
+from ..models import Task, TaskHistory
+from .counters import track_tasks_created
+from .events import card_channel, publish
+from .notifications import notify_many
+from .previews import schedule_preview
+from .search import index_tasks
+from .text_extraction import schedule_text_extraction
+
+
+def store_task_attachment(uploaded):
+    """Сохраняет загруженный файл в хранилище Task.attachment один раз и возвращает его имя."""
+    field = Task._meta.get_field("attachment")
+    name = field.generate_filename(Task(), uploaded.name)
+    return field.storage.save(name, uploaded, max_length=field.max_length)
+
+
+def create_tasks_for_recipients(card, created_by, recipients, *, title, description="",
+                                due_date=None, google_drive_link=None, attachment=None):
+    """
+    Отдельная задача каждому адресату одной транзакцией и постоянным числом запросов:
+    bulk_create для задач, записей истории, связей recipients и уведомлений.
+    Загруженный файл сохраняется один раз, все задачи ссылаются на одно имя файла.
+    Сигналы post_save при bulk_create не срабатывают — историю, счётчики карточки, поисковый индекс
+    и событие потока ведём здесь.
+    """
+    recipients = list(recipients)
+    stored_name = store_task_attachment(attachment) if attachment else None
+
+    try:
+        with transaction.atomic():
+            tasks = Task.objects.bulk_create([
+                Task(
+                    card=card,
+                    title=title,
+                    description=description,
+                    created_by=created_by,
+                    assigned_employee=recipient,
+                    status="new",
+                    due_date=due_date,
+                    google_drive_link=google_drive_link,
+                    priority="normal",
+                    attachment=stored_name,
+                )
+                for recipient in recipients
+            ])
+
+            TaskHistory.objects.bulk_create([
+                TaskHistory(task=task, employee=created_by, action="created") for task in tasks
+            ])
+            Task.recipients.through.objects.bulk_create([
+                Task.recipients.through(task_id=task.id, employee_id=task.assigned_employee_id) for task in tasks
+            ])
+            track_tasks_created(tasks)
+            if card is not None and tasks:
+                # одно событие потока на всю пачку, а не по событию на задачу
+                publish(card_channel(card.id), "tasks", {"created": len(tasks)})
+            index_tasks(tasks)
+            schedule_preview(stored_name)
+            schedule_text_extraction(stored_name)
+            notify_many([
+                (recipient.user_id, f"Вам назначена задача: {task.title}", task.get_absolute_url())
+                for recipient, task in zip(recipients, tasks)
+            ])
+    except Exception:
+        # транзакция откатилась — файл больше никому не нужен
+        if stored_name:
+            Task._meta.get_field("attachment").storage.delete(stored_name)
+        raise
+
+    return tasks
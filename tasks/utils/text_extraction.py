@@ -0,0 +1,211 @@
+"""
+Извлечение текста из планов и вложений (docx, xlsx, pdf, txt/csv) для поиска и других функций.
+
+Текст хранится в ExtractedText под SHA-256 содержимого: один и тот же файл, загруженный в разные
+карточки и задачи, обрабатывается один раз, а повторный запуск обработанный файл пропускает.
+Извлекает воркер очереди (extract_file_text) после сохранения файла; get_text() отдаёт готовый текст
+без открытия файла.
+
+Извлечение потоковое: xlsx читается в режиме read_only построчно, pdf — по страницам, и как только
+набрано TEXT_EXTRACTION_MAX_CHARS символов, чтение прекращается (truncated=True). Поэтому большая
+таблица не загружается в память целиком.
+"""
+import hashlib
+import logging
+import os
+import re
+import unicodedata
+
+from django.conf import settings
+
+from .jobs import enqueue, is_pending
+from .storage import CAS_PREFIX, HASH_CHUNK_SIZE, content_storage
+
+logger = logging.getLogger(__name__)
+
+SPACES_RE = re.compile(r"[^\S\t\n]+")  # табуляцию оставляем — это разделитель ячеек
+CONTROL_RE = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# --- Потоковые извлекатели: генераторы строк текста ---
+
+def iter_docx(path):
+    import docx
+    from docx.table import Table
+
+    document = docx.Document(path)
+    # абзацы и таблицы в порядке следования в документе
+    for block in document.iter_inner_content():
+        if isinstance(block, Table):
+            for row in block.rows:
+                yield "\t".join(cell.text for cell in row.cells)
+        else:
+            yield block.text
+
+
+def iter_xlsx(path):
+    import openpyxl
+
+    max_rows = _setting("TEXT_EXTRACTION_MAX_ROWS", 100_000)
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        for sheet in workbook.worksheets:
+            yield sheet.title
+            for row in sheet.iter_rows(max_row=max_rows, values_only=True):
+                yield "\t".join("" if value is None else str(value) for value in row)
+    finally:
+        # в read_only режиме файл открыт до close(), в том числе если генератор бросили на середине
+        workbook.close()
+
+
+def iter_pdf(path):
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(path)
+    for page in reader.pages[:_setting("TEXT_EXTRACTION_MAX_PAGES", 500)]:
+        yield page.extract_text() or ""
+
+
+def iter_text(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        yield from f
+
+
+EXTRACTORS = {
+    ".docx": iter_docx,
+    ".xlsx": iter_xlsx,
+    ".pdf": iter_pdf,
+    ".txt": iter_text,
+    ".csv": iter_text,
+}
+
+
+def is_supported(name):
+    return os.path.splitext(name or "")[1].lower() in EXTRACTORS
+
+
+# --- Нормализация и сборка ---
+
+def normalize_line(line):
+    """NFC, без управляющих символов и повторных пробелов; ячейки таблиц разделены табуляцией."""
+    line = unicodedata.normalize("NFC", line)
+    line = CONTROL_RE.sub(" ", line)
+    return SPACES_RE.sub(" ", line).strip()
+
+
+def collect_text(lines, max_chars):
+    """Склеивает непустые строки, пока не наберётся max_chars. Возвращает (текст, обрезан ли)."""
+    parts, size = [], 0
+    try:
+        for raw in lines:
+            for line in raw.splitlines():
+                line = normalize_line(line)
+                if not line:
+                    continue
+                if size + len(line) > max_chars:
+                    parts.append(line[: max(max_chars - size, 0)])
+                    return "\n".join(parts), True
+                parts.append(line)
+                size += len(line) + 1
+    finally:
+        if hasattr(lines, "close"):
+            lines.close()  # закрывает файл/книгу, если остановились раньше конца
+    return "\n".join(parts), False
+
+
+def file_digest(name):
+    """SHA-256 содержимого: у файлов хранилища по хешу он в имени, остальные читаем кусками."""
+    digest = _name_digest(name)
+    if digest:
+        return digest
+    digest = hashlib.sha256()
+    with content_storage.open(name, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# --- API ---
+
+def extract_file_text(name, force=False):
+    """
+    Извлекает и сохраняет текст файла хранилища (фоновая задача). Уже обработанное содержимое
+    пропускается, если не force. Возвращает ExtractedText или None (файла нет / формат не поддерживается).
+    """
+    from ..models import ExtractedText
+
+    if not is_supported(name) or not content_storage.exists(name):
+        return None
+    digest = file_digest(name)
+    if not force:
+        existing = ExtractedText.objects.filter(digest=digest).first()
+        if existing is not None:
+            return existing
+
+    extractor = EXTRACTORS[os.path.splitext(name)[1].lower()]
+    try:
+        text, truncated = collect_text(
+            extractor(content_storage.path(name)), _setting("TEXT_EXTRACTION_MAX_CHARS", 2_000_000),
+        )
+        status, error = "ok", ""
+    except Exception as exc:
+        # битый файл: запоминаем, чтобы не разбирать его снова при каждом сохранении
+        logger.exception("Не удалось извлечь текст из %s", name)
+        text, truncated, status, error = "", False, "error", str(exc)[:500]
+
+    values = {"source_name": name[:255], "text": text, "truncated": truncated, "status": status, "error": error}
+    if force:
+        return ExtractedText.objects.update_or_create(digest=digest, defaults=values)[0]
+    # параллельный воркер мог успеть раньше — тогда просто оставляем его результат
+    result = ExtractedText(digest=digest, **values)
+    ExtractedText.objects.bulk_create([result], ignore_conflicts=True)
+    return result
+
+
+def _name_digest(name):
+    """Хеш из имени файла хранилища по хешу (cas/ab/<sha256>/...), для остальных — None."""
+    parts = (name or "").split("/")
+    if len(parts) >= 3 and parts[0] == CAS_PREFIX:
+        return parts[2]
+    return None
+
+
+def get_text(name):
+    """Готовый текст файла (без открытия файла) или None, если его ещё не извлекли."""
+    from ..models import ExtractedText
+
+    if not name:
+        return None
+    texts = ExtractedText.objects.filter(status="ok")
+    digest = _name_digest(name)
+    texts = texts.filter(digest=digest) if digest else texts.filter(source_name=name)
+    return texts.values_list("text", flat=True).first()
+
+
+def schedule_text_extraction(name):
+    """Ставит извлечение текста в очередь, если формат поддерживается и это содержимое ещё не обработано."""
+    from ..models import ExtractedText
+
+    if not is_supported(name):
+        return
+    digest = _name_digest(name)
+    done = ExtractedText.objects.filter(digest=digest)
+    if not digest:
+        # файл, загруженный до хранилища по хешу, узнаём по имени
+        done = ExtractedText.objects.filter(source_name=name[:255])
+    if done.exists() or is_pending(extract_file_text, name=name):
+        return
+    enqueue(extract_file_text, name=name)
+
+
+def forget_text(name):
+    """Удаляет извлечённый текст удалённого файла хранилища по хешу."""
+    from ..models import ExtractedText
+
+    digest = _name_digest(name)
+    if digest:
+        ExtractedText.objects.filter(digest=digest).delete()
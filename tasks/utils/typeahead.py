@@ -0,0 +1,132 @@
+"""
+Поиск сотрудников по первым буквам (typeahead) для форм выбора адресатов.
+
+Индекс в памяти процесса: отсортированный массив (слово, id сотрудника) по фамилии, имени, должности и
+отделу; поиск по префиксу — bisect, без запросов к БД. Индекс собирается одним запросом и привязан к
+версии справочника сотрудников (tasks.utils.directory): сигналы Employee / User / Department меняют
+версию, и каждый процесс при следующем поиске пересобирает свой индекс.
+
+Кому можно назначать задачи, решает то же правило, что у TaskForm ("employee.assign_task" из
+tasks.utils.policy); оно проверяется по полям записи индекса, тоже без запросов.
+"""
+import re
+import threading
+from bisect import bisect_left
+
+from .directory import directory_version
+
+ASSIGN_ACTION = "employee.assign_task"
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text):
+    return (text or "").lower().replace("ё", "е")
+
+
+def words(text):
+    return WORD_RE.findall(normalize(text))
+
+
+class Entry:
+    """Сотрудник в индексе: поля для правил доступа (id, role, department_id) и данные для ответа."""
+
+    __slots__ = ("id", "role", "department_id", "sort_key", "data")
+
+    def __init__(self, employee):
+        user = employee.user
+        self.id = employee.id
+        self.role = employee.role
+        self.department_id = employee.department_id
+        self.sort_key = (normalize(user.last_name), normalize(user.first_name), employee.id)
+        self.data = {
+            "id": employee.id,
+            "name": f"{user.first_name} {user.last_name}".strip() or user.username,
+            "position": employee.position,
+            "department": employee.department.name if employee.department else "",
+        }
+
+    @property
+    def pk(self):
+        return self.id
+
+
+class EmployeeIndex:
+    def __init__(self, employees, version=None):
+        self.version = version
+        self.entries = {}
+        tokens = set()
+        for employee in employees:
+            entry = Entry(employee)
+            self.entries[entry.id] = entry
+            user = employee.user
+            department = employee.department.name if employee.department else ""
+            for text in (user.last_name, user.first_name, employee.position, department):
+                tokens.update((word, entry.id) for word in words(text))
+        self.tokens = sorted(tokens)
+        self.ordered = sorted(self.entries.values(), key=lambda entry: entry.sort_key)
+
+    def ids_for_prefix(self, prefix):
+        ids = set()
+        position = bisect_left(self.tokens, (prefix,))
+        while position < len(self.tokens) and self.tokens[position][0].startswith(prefix):
+            ids.add(self.tokens[position][1])
+            position += 1
+        return ids
+
+    def search(self, query, allowed=None, limit=DEFAULT_LIMIT):
+        """
+        Сотрудники, у которых каждое слово запроса — начало одного из слов (фамилия, имя, должность,
+        отдел), по алфавиту. Пустой запрос — первые по алфавиту. allowed(entry) — фильтр доступа.
+        """
+        prefixes = words(query)
+        if prefixes:
+            ids = None
+            for prefix in sorted(prefixes, key=len, reverse=True):  # длинные префиксы отсекают больше
+                matched = self.ids_for_prefix(prefix)
+                ids = matched if ids is None else ids & matched
+                if not ids:
+                    return []
+            candidates = sorted((self.entries[pk] for pk in ids), key=lambda entry: entry.sort_key)
+        else:
+            candidates = self.ordered
+
+        results = []
+        for entry in candidates:
+            if allowed is None or allowed(entry):
+                results.append(entry.data)
+                if len(results) >= limit:
+                    break
+        return results
+
+
+def build_index(version=None):
+    from ..models import Employee
+
+    return EmployeeIndex(Employee.objects.select_related("user", "department"), version)
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """Индекс процесса; пересобирается, если справочник сотрудников сменил версию."""
+    global _index
+    version = directory_version()
+    index = _index
+    if index is None or index.version != version:
+        with _lock:
+            if _index is None or _index.version != version:
+                _index = build_index(version)
+            index = _index
+    return index
+
+
+def search_recipients(policy, query, limit=DEFAULT_LIMIT):
+    """Кому из найденных сотрудник policy может назначить задачу (правила TaskForm)."""
+    if policy.employee is None:
+        return []
+    return get_index().search(query, lambda entry: policy.can(ASSIGN_ACTION, entry), limit)
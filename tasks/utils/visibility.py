@@ -0,0 +1,72 @@
+"""
+Кому видна карточка мероприятия.
+
+Правило одно: директор и заместители видят всё, остальные — опубликованные карточки (visible),
+карточки своего отдела и расшаренные с ним. Вместо OR по полям карточки и M2M shared_departments
+(с DISTINCT) оно материализовано в таблице CardVisibility, и проверка — поиск по индексу
+(department, card). Таблицу поддерживают сигналы: сохранение карточки и изменения shared_departments;
+bulk_create и QuerySet.update их обходят — после них нужно вызвать refresh_card_visibility().
+Проверки и выборки доступных карточек — правило "card.view" в tasks.utils.policy (CardAccess).
+"""
+from django.db import transaction
+from django.db.models import Q
+
+ALL_CARDS_ROLES = ("director", "deputy")
+
+
+def card_visibility_rows(card, shared_department_ids):
+    """Строки доступа для карточки: (card_id, department_id); department_id=None — видна всем."""
+    departments = set(shared_department_ids)
+    if card.responsible_department_id:
+        departments.add(card.responsible_department_id)
+    if card.visible:
+        departments.add(None)
+    return [(card.pk, department_id) for department_id in departments]
+
+
+def refresh_card_visibility(card_ids=None, card_model=None, visibility_model=None):
+    """
+    Пересобирает строки доступа карточек (всех, если card_ids не передан).
+    Модели можно передать явно (для data-миграций). Возвращает число карточек.
+    """
+    if card_model is None or visibility_model is None:
+        from tasks.models import CardVisibility, EventCard
+        card_model, visibility_model = card_model or EventCard, visibility_model or CardVisibility
+
+    cards = card_model.objects.only("id", "visible", "responsible_department_id")
+    rows = visibility_model.objects.all()
+    if card_ids is not None:
+        card_ids = list(card_ids)
+        cards, rows = cards.filter(id__in=card_ids), rows.filter(card_id__in=card_ids)
+
+    shared = {}
+    links = card_model.shared_departments.through.objects.all()
+    if card_ids is not None:
+        links = links.filter(eventcard_id__in=card_ids)
+    for card_id, department_id in links.values_list("eventcard_id", "department_id"):
+        shared.setdefault(card_id, []).append(department_id)
+
+    cards = list(cards)
+    with transaction.atomic():
+        rows.delete()
+        visibility_model.objects.bulk_create([
+            visibility_model(card_id=card_id, department_id=department_id)
+            for card in cards
+            for card_id, department_id in card_visibility_rows(card, shared.get(card.pk, ()))
+        ], batch_size=500)
+    return len(cards)
+
+
+def card_access(employee, public=True):
+    """Строки CardVisibility, дающие сотруднику доступ: его отдела и (public) опубликованных карточек."""
+    from tasks.models import CardVisibility
+
+    access = Q()
+    if employee.department_id:
+        access |= Q(department_id=employee.department_id)
+    if public:
+        access |= Q(department__isnull=True)
+    if not access:
+        return CardVisibility.objects.none()
+    return CardVisibility.objects.filter(access)
+
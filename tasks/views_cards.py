@@ -1,19 +1,29 @@
 from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
-import json
 from .models import EventCard, Employee, Department, CardApproverOrder, Task, TaskAttachment
 from .forms import EventCardForm, PlanReviewForm
-from .decorators import role_required
-from django.db.models import Q, Case, When, IntegerField
+from .decorators import policy_required
+from django.db.models import Q
+from django.template.loader import render_to_string
 from tasks.utils.notifications import notify
+from tasks.utils.employee_context import get_employee_context
+from tasks.utils.pagination import keyset_page
+from tasks.utils.counters import CARD_STATS, aggregate_stats
+from tasks.utils.policy import get_policy
+from .views_directory import directory_url
+
+TASK_PAGE_SIZE = 50
+TASK_PAGE_FIELDS = ("list_rank", "id")
 
 
 
 # Карточки мероприятий
-@role_required("director", "deputy", "head", "senior")
+@policy_required("card.create")
 def card_create(request):
     if request.method == "POST":
         form = EventCardForm(request.POST, request.FILES)
@@ -95,68 +105,102 @@ def card_create(request):
         initial = {"responsible_department": getattr(request.user.employee, "department", None)}
         form = EventCardForm(initial=initial)
 
-    # --- Данные для выбора сотрудников и отделов (в модальном окне) ---
-    employees_qs = Employee.objects.select_related("user").all().order_by("user__last_name", "user__first_name")
-    employees_list = []
-    for e in employees_qs:
-        name = (f"{e.user.first_name} {e.user.last_name}".strip() or e.user.username)
-        if e.position:
-            name = f"{name} — {e.position}"
-        employees_list.append({"id": e.id, "name": name})
-
-    departments_qs = Department.objects.all().order_by("name")
-    depts_list = [{"id": d.id, "name": d.name} for d in departments_qs]
-
+    # сотрудники и отделы для выбора в модальном окне — справочник, который браузер загружает один раз
     return render(request, "tasks/card_create.html", {
         "form": form,
-        "employees_json": json.dumps(employees_list, ensure_ascii=False),
-        "departments_json": json.dumps(depts_list, ensure_ascii=False),
+        "directory_url": directory_url(),
     })
 
 
 
-@login_required
-def card_detail(request, card_id):
-    card = get_object_or_404(EventCard, pk=card_id)
-    employee = request.user.employee
-    effective_emp = employee.get_effective_employee()
-
-    if not card.visible:
-        if not (
-                effective_emp.role in ("director", "deputy") or
-                card.responsible_department == effective_emp.department or
-                card.shared_departments.filter(id=effective_emp.department_id).exists()
-        ):
-            messages.error(request, "У вас нет доступа к этой карточке.")
-            return redirect("task_list")
-
-    # --- Базовый queryset ---
-    tasks_qs = card.tasks.select_related("assigned_employee", "assigned_department", "created_by")
-
-    # --- Новый фильтр: владелец (mine / department / all) ---
-    owner_filter = request.GET.get("owner", "mine")
-
+def owner_tasks(card, owner_filter, employee):
+    """Задачи карточки с фильтром по владельцу (mine / department / all)."""
+    tasks_qs = card.tasks.all()
     if owner_filter == "mine":
+        # адресаты — подзапросом, а не JOIN: иначе задача с несколькими адресатами повторяется в списке
         tasks_qs = tasks_qs.filter(
-            Q(assigned_employee=effective_emp) |
-            Q(recipients=effective_emp)
+            Q(assigned_employee=employee) |
+            Q(pk__in=Task.recipients.through.objects.filter(employee=employee).values("task_id"))
         )
     elif owner_filter == "department":
         tasks_qs = tasks_qs.filter(
-            Q(assigned_department=effective_emp.department) |
-            Q(assigned_employee__department=effective_emp.department)
+            Q(assigned_department=employee.department) |
+            Q(assigned_employee__department=employee.department)
         )
     # если "all" — ничего не фильтруем
+    return tasks_qs
+
+
+def card_stats_data(card, owner_filter, employee):
+    """
+    Счётчики задач по статусам и типам (учитывают owner_filter) и прогресс карточки.
+    Без фильтра по владельцу — готовые счётчики карточки, иначе — один агрегирующий запрос.
+    """
+    counters = card.get_counters()
+    if owner_filter in ("mine", "department"):
+        stats = aggregate_stats(owner_tasks(card, owner_filter, employee))
+    else:
+        stats = {name: getattr(counters, name) for name in CARD_STATS}
+    stats["progress"] = card.progress
+    return stats
+
+
+def card_stats_etag(card, owner_filter, employee):
+    """
+    ETag статистики: версия карточки растёт при любом изменении её задач и адресатов.
+    Для mine / department результат зависит ещё и от того, кто смотрит.
+    """
+    parts = [card.pk, card.get_counters().version]
+    if owner_filter in ("mine", "department"):
+        parts += [owner_filter, employee.pk, employee.department_id or 0]
+    return quote_etag("-".join(str(part) for part in parts))
+
+
+@login_required
+def card_stats(request, card_id):
+    """Статистика карточки для опроса со страницы: 304, если у карточки ничего не менялось."""
+    card = get_object_or_404(EventCard.objects.select_related("counters"), pk=card_id)
+    effective_emp = get_employee_context(request).effective
+    if not get_policy(request).can("card.view", card):
+        return JsonResponse({"error": "Нет доступа к этой карточке"}, status=403)
+
+    owner_filter = request.GET.get("owner", "mine")
+    etag = card_stats_etag(card, owner_filter, effective_emp)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(card_stats_data(card, owner_filter, effective_emp))
+    response["ETag"] = etag
+    # браузер хранит ответ, но каждый раз переспрашивает сервер (If-None-Match)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
-    # --- Счётчики задач по статусам и типам (учитывают owner_filter) ---
-    stats = {
-        "total": tasks_qs.count(),
-        "new": tasks_qs.filter(task_type="regular", status="new").count(),
-        "in_progress": tasks_qs.filter(task_type="regular", status__in=["in_progress","sent_for_review","under_review"]).count(),
-        "done": tasks_qs.filter(task_type="regular", status="done").count(),
-        "urgent": tasks_qs.filter(task_type="regular", priority="urgent").exclude(status="done").count(),
-        "review": tasks_qs.filter(task_type__in=["approval","review"]).count(),
-    }
+
+@login_required
+def card_detail(request, card_id):
+    # старый опрос счётчиков (?count=1) — теперь отдельная точка с ETag
+    if request.GET.get("count") == "1":
+        return card_stats(request, card_id)
+
+    card = get_object_or_404(EventCard.objects.select_related("counters"), pk=card_id)
+    effective_emp = get_employee_context(request).effective
+
+    if not get_policy(request).can("card.view", card):
+        messages.error(request, "У вас нет доступа к этой карточке.")
+        return redirect("task_list")
+
+    # --- Базовый queryset: фильтр по владельцу (mine / department / all) ---
+    owner_filter = request.GET.get("owner", "mine")
+    tasks_qs = owner_tasks(card, owner_filter, effective_emp).select_related(
+        "assigned_employee__user", "assigned_department", "created_by__user", "created_by__department",
+    )
+
+    ajax = request.GET.get("ajax") == "1"
+    cursor = request.GET.get("cursor")
+
+    # --- Счётчики задач (нужны только полной странице, не подгрузке следующих страниц) ---
+    stats = None
+    if not ajax:
+        stats = card_stats_data(card, owner_filter, effective_emp)
 
     # --- Фильтрация по статусу ---
     filter_type = request.GET.get("filter", "all")
@@ -172,42 +216,38 @@ def card_detail(request, card_id):
     elif filter_type == "done":
         tasks_qs = tasks_qs.filter(task_type="regular", status="done")
 
-    # --- Сортировка ---
-    tasks = tasks_qs.order_by(
-        Case(
-            When(task_type="all", then=0),
-            When(task_type="review", then=1),
-            When(priority="urgent", then=2),
-            When(status="new", then=3),
-            When(status="in_progress", then=4),
-            When(status="done", then=5),
-            default=6,
-            output_field=IntegerField(),
-        )
-    )
-
-    # --- Прогресс ---
-    total = card.tasks.count()
-    done = card.tasks.filter(status="done").count()
-    progress = int((done / total) * 100) if total > 0 else 0
+    # --- Сортировка и страница ---
+    # согласования, срочные, новые, в работе, выполненные (Task.list_rank), внутри — по id;
+    # страницы по курсору: сколько ни листай, запрос идёт по индексу (card, list_rank, id)
+    tasks, next_cursor = keyset_page(tasks_qs, TASK_PAGE_FIELDS, cursor, TASK_PAGE_SIZE)
 
     # --- AJAX ---
-    if request.GET.get("ajax") == "1":
+    if ajax and cursor:
+        # следующая страница для бесконечной прокрутки: строки списка + курсор
+        return JsonResponse({
+            "html": render_to_string("tasks/_task_rows.html", {"tasks": tasks}, request=request),
+            "next_cursor": next_cursor,
+        })
+    if ajax:
         return render(request, "tasks/_task_list.html", {
             "tasks": tasks,
-            "stats": stats,
+            "next_cursor": next_cursor,
             "filter_type": filter_type,
         })
-    if request.GET.get("count") == "1":
-        return JsonResponse(stats)
+
+    # --- Прогресс ---
+    counters = card.get_counters()
+    progress = int((counters.closed / counters.total) * 100) if counters.total > 0 else 0
 
     return render(request, "tasks/card_detail.html", {
         "card": card,
         "tasks": tasks,
+        "next_cursor": next_cursor,
         "progress": progress,
         "filter_type": filter_type,
         "owner_filter": owner_filter,
         "stats": stats,    # 👈 добавим в контекст
+        "stats_etag": card_stats_etag(card, owner_filter, effective_emp),
     })
 
 
@@ -220,7 +260,7 @@ def plan_review(request, card_id):
     emp = request.user.employee
     effective_emp = emp.get_effective_employee()
 
-    if effective_emp.role not in ("deputy", "director"):
+    if not get_policy(request, effective_emp).can("card.review_plan", card):
         messages.error(request, "У вас нет прав на просмотр этой страницы.")
         return redirect("card_detail", card_id=card.id)
 
@@ -41,14 +41,9 @@ def frozen_notice(request):
     """
     Если пользователь временно передал полномочия — доступ к системе ограничен.
     """
+    # истёкшие замещения снимает планировщик (expire_delegations), is_frozen сам учитывает дату
     employee = request.user.employee
 
-    # Если срок замещения истёк, сразу очистим его
-    if employee.delegate_until and employee.delegate_until < timezone.now().date():
-        employee.delegate_to = None
-        employee.delegate_until = None
-        employee.save(update_fields=["delegate_to", "delegate_until"])
-
     return render(request, "tasks/frozen_notice.html", {"employee": employee})
 
 
@@ -61,12 +56,6 @@ def my_delegation(request):
     """
     employee = request.user.employee
 
-    # Автоочистка старых замещений
-    if employee.delegate_until and employee.delegate_until < timezone.now().date():
-        employee.delegate_to = None
-        employee.delegate_until = None
-        employee.save(update_fields=["delegate_to", "delegate_until"])
-
     # 👥 Список возможных замещающих — только коллеги из отдела
     colleagues = (
         Employee.objects.filter(department=employee.department)
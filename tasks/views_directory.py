@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from tasks.utils.directory import directory_snapshot, directory_version
+from tasks.utils.employee_context import get_employee_context
+from tasks.utils.policy import get_policy
+from tasks.utils.typeahead import DEFAULT_LIMIT, MAX_LIMIT, search_recipients
+
+
+# =============================
+# СПРАВОЧНИК СОТРУДНИКОВ ДЛЯ ФОРМ
+# =============================
+
+def directory_url():
+    """Адрес справочника текущей версии — его подставляют страницы с формами выбора."""
+    return f"{reverse('employee_directory')}?v={directory_version()}"
+
+
+@login_required
+def employee_directory(request):
+    """
+    Справочник JSON. По адресу с актуальной ?v= ответ неизменен — браузер держит его max-age
+    и больше не спрашивает; без версии или с устаревшей — переспрашивает (If-None-Match -> 304).
+    """
+    version, body = directory_snapshot()
+    etag = quote_etag(version)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    if request.GET.get("v") == version:
+        max_age = getattr(settings, "EMPLOYEE_DIRECTORY_MAX_AGE", 365 * 24 * 60 * 60)
+        patch_cache_control(response, private=True, max_age=max_age, immutable=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+def employee_search(request):
+    """
+    Поиск адресатов по первым буквам фамилии, имени, должности или отдела (?q=, ?limit=).
+    Только те, кому сотрудник может назначить задачу, — те же правила, что у TaskForm.
+    """
+    limit = request.GET.get("limit", "")
+    limit = min(int(limit), MAX_LIMIT) if limit.isdigit() and int(limit) > 0 else DEFAULT_LIMIT
+    context = get_employee_context(request)
+    # TaskForm проверяет самого сотрудника (user.employee), а не того, кого он замещает
+    policy = get_policy(request, context.employee if context else None)
+    return JsonResponse({"results": search_recipients(policy, request.GET.get("q", ""), limit)})
@@ -0,0 +1,51 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+
+from .models import EventCard
+from tasks.utils.events import card_channel, stream, user_channel
+from tasks.utils.policy import get_policy
+
+
+# =============================
+# ПОТОК СОБЫТИЙ (SSE)
+# =============================
+
+def stream_channels(request):
+    """Каналы соединения: уведомления пользователя и, если ?card=<id> ему доступна, события карточки."""
+    if not request.user.is_authenticated:
+        return None
+    channels = [user_channel(request.user.pk)]
+
+    card_id = request.GET.get("card", "")
+    if card_id.isdigit():
+        card = EventCard.objects.filter(pk=card_id).first()
+        if card is not None and get_policy(request).can("card.view", card):
+            channels.append(card_channel(card.pk))
+    return channels
+
+
+def parse_last_event_id(request):
+    value = request.headers.get("Last-Event-ID", "")
+    return int(value) if value.isdigit() else None
+
+
+async def event_stream(request):
+    """
+    SSE: одно долгое соединение вместо опроса счётчиков и уведомлений.
+    Асинхронное представление — под ASGI ожидающее соединение не занимает поток.
+    """
+    if not getattr(settings, "SSE_ENABLED", False):
+        # под WSGI поток занял бы воркер до конца соединения; 204 — EventSource не переподключается
+        return HttpResponse(status=204)
+    channels = await sync_to_async(stream_channels)(request)
+    if channels is None:
+        # 204 — EventSource больше не переподключается (401 он бы повторял)
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(
+        stream(channels, parse_last_event_id(request)), content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx не должен буферизовать поток
+    return response
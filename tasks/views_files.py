@@ -0,0 +1,63 @@
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseForbidden
+from django.shortcuts import get_object_or_404
+
+from .models import EventCard, Task, TaskAttachment
+from tasks.utils.downloads import serve_file, serve_path
+from tasks.utils.previews import PREVIEW_KINDS, preview_name, preview_path
+from tasks.utils.policy import get_policy
+
+
+# =============================
+# СКАЧИВАНИЕ ФАЙЛОВ С ПРОВЕРКОЙ ПРАВ
+# =============================
+
+def _serve(request, field_file):
+    """Файл целиком или, с ?preview=png|html, его превью (если уже построено)."""
+    kind = request.GET.get("preview")
+    if kind is None:
+        return serve_file(request, field_file)
+    if kind not in PREVIEW_KINDS:
+        raise Http404
+    return serve_path(
+        request, preview_name(field_file.name, kind), preview_path(field_file.name, kind),
+        as_attachment=False, content_type=PREVIEW_KINDS[kind],
+    )
+
+
+
+@login_required
+def card_plan_download(request, card_id):
+    card = get_object_or_404(EventCard, pk=card_id)
+    if not card.plan_file:
+        raise Http404
+    # те же правила, что у card_detail, плюс автор и участники согласования скрытой карточки
+    if not get_policy(request).can("card.view_plan", card):
+        return HttpResponseForbidden("Нет доступа к плану мероприятия.")
+    return _serve(request, card.plan_file)
+
+
+@login_required
+def task_attachment_download(request, task_id):
+    task = get_object_or_404(Task, pk=task_id)
+    if not task.attachment:
+        raise Http404
+    policy = get_policy(request)
+    allowed = (
+        policy.can("task.view_files", task)
+        # к задаче на согласование прикреплён план — доступ как к плану карточки
+        or (task.task_type == "approval" and task.card and policy.can("card.view_plan", task.card))
+    )
+    if not allowed:
+        return HttpResponseForbidden("Нет доступа к вложению.")
+    return _serve(request, task.attachment)
+
+
+@login_required
+def execution_file_download(request, attachment_id):
+    attachment = get_object_or_404(TaskAttachment.objects.select_related("task"), pk=attachment_id)
+    if not attachment.file:
+        raise Http404
+    if not get_policy(request).can("task.view_files", attachment.task):
+        return HttpResponseForbidden("Нет доступа к файлу.")
+    return _serve(request, attachment.file)
@@ -0,0 +1,43 @@
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
+
+from .models import SearchEntry
+from tasks.utils.employee_context import get_employee_context
+from tasks.utils.search import search
+
+PAGE_SIZE = 20
+
+
+# =============================
+# ПОЛНОТЕКСТОВЫЙ ПОИСК
+# =============================
+
+@login_required
+def search_view(request):
+    """Поиск по задачам, карточкам, комментариям и планам — только среди доступного сотруднику."""
+    query = request.GET.get("q", "").strip()
+    kind = request.GET.get("kind", "")
+    kinds = dict(SearchEntry.KIND_CHOICES)
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+
+    context = get_employee_context(request)
+    hits = []
+    if query and context is not None:
+        # на одну запись больше страницы — чтобы знать, есть ли следующая
+        hits = search(
+            context.effective, query,
+            kinds=[kind] if kind in kinds else None,
+            limit=PAGE_SIZE + 1, offset=(page - 1) * PAGE_SIZE,
+        )
+
+    return render(request, "tasks/search.html", {
+        "query": query,
+        "kind": kind,
+        "kinds": kinds,
+        "hits": hits[:PAGE_SIZE],
+        "page": page,
+        "has_next": len(hits) > PAGE_SIZE,
+    })
@@ -1,31 +1,35 @@
 from datetime import timedelta
-from django.db.models import Q
+from django.db.models import Q, Count
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.db import transaction
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-from tasks.utils.notifications import notify
-import json
+from tasks.utils.notifications import notify, get_unread_summary, mark_read, mark_all_read
+from tasks.utils.employee_context import get_employee_context
+from tasks.utils.task_fanout import create_tasks_for_recipients
+from tasks.utils.storage import release_file
+from tasks.utils.policy import get_policy
 
 from .models import Task, TaskHistory, EventCard, Employee, CardApproverOrder, Category, TaskAttachment, Notification
 from .forms import TaskForm
-from .decorators import role_required
 
 
 # =============================
 # СПИСОК И ПРОСМОТР ЗАДАЧ
 # =============================
 
+# связи, которые шаблоны списков выводят в каждой строке задачи
+TASK_ROW_RELATED = ("card", "created_by__user", "created_by__department")
+
 @login_required
 def task_list(request):
     """Главная страница — срочные задачи и доска мероприятий"""
-    try:
-        employee = request.user.employee
-    except Employee.DoesNotExist:
+    employee_context = get_employee_context(request)
+    if employee_context is None:
         return render(request, "tasks/no_employee.html")
 
-    effective_employee = employee.get_effective_employee()
+    effective_employee = employee_context.effective
 
     categories = Category.objects.all().order_by("name")
 
@@ -51,7 +55,7 @@ def task_list(request):
         Q(due_date__isnull=False),
         Q(due_date__lte=urgent_deadline),
         Q(status__in=["new", "in_progress"])  # показываем только новые задачи
-    ).distinct().order_by("due_date")
+    ).distinct().select_related(*TASK_ROW_RELATED).order_by("due_date")
 
     if filter_emp:
         urgent_tasks_qs = urgent_tasks_qs.filter(
@@ -64,7 +68,7 @@ def task_list(request):
     approval_tasks_qs = Task.objects.filter(
         assigned_employee=effective_employee,
         task_type__in=["approval", "review"]
-    ).exclude(status="done").order_by("-created_at")
+    ).exclude(status="done").select_related(*TASK_ROW_RELATED).order_by("-created_at")
 
     if filter_emp:
         approval_tasks_qs = approval_tasks_qs.filter(
@@ -80,7 +84,7 @@ def task_list(request):
         Q(cc=effective_employee),
         Q(due_date__isnull=False),
         Q(status__in=["under_review","sent_for_review"])  # показываем только новые задачи
-    ).distinct().order_by("due_date")
+    ).distinct().select_related(*TASK_ROW_RELATED).order_by("due_date")
 
     if filter_emp:
         review_tasks_qs = review_tasks_qs.filter(
@@ -96,7 +100,7 @@ def task_list(request):
         Q(cc=effective_employee),
         Q(due_date__isnull=False),
         Q(status="rejected")  # показываем только новые задачи
-    ).distinct().order_by("due_date")
+    ).distinct().select_related(*TASK_ROW_RELATED).order_by("due_date")
 
     if filter_emp:
         rejected_tasks_qs = rejected_tasks_qs.filter(
@@ -106,35 +110,33 @@ def task_list(request):
     rejected_tasks = rejected_tasks_qs
 
     # 📋 Все карточки мероприятий (видны всем)
-    cards_qs = EventCard.objects.all().prefetch_related("tasks", "categories").order_by("-start_date")
-
-    if effective_employee.role not in ("director", "deputy"):
-        cards_qs = cards_qs.filter(
-            Q(visible=True) |
-            Q(responsible_department=effective_employee.department) |
-            Q(shared_departments=effective_employee.department)
-        ).distinct()
-
-    cards_all=cards_qs.count()
+    # Фильтры по M2M/обратным связям делаем через id__in, чтобы не размножать строки
+    # и не мешать агрегации счётчиков ниже (без DISTINCT и JOIN-ов на фильтрах).
+    # Доступ — по материализованной таблице CardVisibility (одно условие по индексу вместо OR по M2M)
+    cards_qs = get_policy(request).filter("card.view", EventCard.objects.all()).select_related(
+        "responsible_department", "counters",
+    ).prefetch_related("categories")
+
+    cards_all = cards_qs.count()
     # фильтр по категории
     if active_category:
-        cards_qs = cards_qs.filter(categories=active_category)
+        cards_qs = cards_qs.filter(
+            id__in=EventCard.categories.through.objects.filter(category=active_category).values("eventcard_id")
+        )
 
     # фильтр по сотруднику, если задан
     if filter_emp:
         cards_qs = cards_qs.filter(
-            Q(created_by=filter_emp) | Q(tasks__assigned_employee=filter_emp)
-        ).distinct()
+            Q(created_by=filter_emp) |
+            Q(id__in=Task.objects.filter(assigned_employee=filter_emp).values("card_id"))
+        )
 
-    cards = cards_qs.distinct()
+    # 📊 Бейджи и прогресс читаются из CardCounters (select_related), по дедлайну считаем здесь же
+    cards = cards_qs.annotate(
+        urgent_count=Count("tasks", filter=Q(tasks__status="new", tasks__due_date__lte=urgent_deadline)),
+    ).order_by("-start_date")
 
-    # 📊 Добавляем счётчики задач для бейджей
-    for card in cards:
-        tasks = card.tasks.all()
-        card.approval_count = tasks.filter(task_type__in=["approval", "review"], status="new").count()
-        card.urgent_count = tasks.filter(status="new", due_date__lte=today + timedelta(days=3)).count()
-        card.other_count = tasks.exclude(status="done").count()
-        card.done_count = tasks.filter(status="done").count()
+    categories = categories.annotate(cards_count=Count("cards"))
 
     return render(request, "tasks/task_list.html", {
         "urgent_tasks": urgent_tasks,
@@ -157,11 +159,7 @@ def task_detail(request, task_id):
     employee = request.user.employee
     card=task.card
     # Проверяем доступ (если нужно ограничить видимость)
-    if (
-        employee.role not in ("director", "deputy")
-        and task.assigned_employee != employee
-        and task.created_by != employee
-    ):
+    if not get_policy(request, employee).can("task.view", task):
         messages.error(request, "У вас нет доступа к этой задаче.")
         return redirect("task_list")
 
@@ -200,60 +198,29 @@ def task_create_for_card(request, card_id):
                 messages.error(request, "Выберите хотя бы одного адресата.")
                 return redirect("task_create_for_card", card_id=card.id)
 
-            # Создаём отдельную задачу для каждого адресата
-            for recipient in recipients:
-                task = Task.objects.create(
-                    card=card,
-                    title=form.cleaned_data["title"],
-                    description=form.cleaned_data["description"],
-                    created_by=emp,
-                    assigned_employee=recipient,
-                    status="new",
-                    due_date=form.cleaned_data["due_date"],
-                    google_drive_link=google_drive_link,
-                    priority="normal",
-                )
-
-                # Добавляем файл, если загружен
-                if attachment:
-                    task.attachment = attachment
-                    task.save(update_fields=["attachment"])
-
-                # Добавляем адресата в M2M (чтобы отобразилось в списках)
-                task.recipients.add(recipient)
-
-                notify(task.assigned_employee.user, f"Вам назначена задача: {task.title}", task.get_absolute_url())
+            # Отдельная задача каждому адресату — пачкой, файл сохраняется один раз
+            create_tasks_for_recipients(
+                card, emp, recipients,
+                title=form.cleaned_data["title"],
+                description=form.cleaned_data["description"],
+                due_date=form.cleaned_data["due_date"],
+                google_drive_link=google_drive_link,
+                attachment=attachment,
+            )
 
             messages.success(request, f"Создано {len(recipients)} задач(и) по выбранным адресатам.")
             return redirect("card_detail", card_id=card.id)
     else:
         form = TaskForm(user=request.user)
 
-    employees_qs = Employee.objects.select_related("user").order_by("user__last_name", "user__first_name")
-    employees_list = [
-        {"id": e.id, "name": f"{e.user.first_name} {e.user.last_name} ({e.position or '—'})"}
-        for e in employees_qs
-    ]
     return render(request, "tasks/create_task.html", {
         "form": form,
         "card": card,
-        "employees_json": json.dumps(employees_list, ensure_ascii=False),
     })
 
 
 
 
-# 🧩 Вспомогательная функция для повторного использования
-def _get_employees_list():
-    employees_qs = Employee.objects.select_related("user").all().order_by("user__last_name", "user__first_name")
-    return [
-        {"id": e.id, "name": f"{e.user.first_name} {e.user.last_name} ({e.position or '—'})"}
-        for e in employees_qs
-    ]
-
-
-
-
 
 @login_required
 def take_task(request, task_id):
@@ -261,7 +228,7 @@ def take_task(request, task_id):
     emp = request.user.employee
     effective_emp = emp.get_effective_employee()
 
-    if task.assigned_employee and task.assigned_employee != effective_emp:
+    if not get_policy(request, effective_emp).can("task.take", task):
         messages.error(request, "Эта задача уже назначена другому сотруднику.")
         return redirect("task_list")
 
@@ -294,7 +261,7 @@ def task_execute(request, task_id):
     employee = request.user.employee
 
     # Проверка доступа
-    if task.assigned_employee != employee:
+    if not get_policy(request, employee).can("task.execute", task):
         messages.error(request, "Вы не можете выполнить эту задачу.")
         return redirect("task_detail", task_id=task.id)
 
@@ -336,11 +303,9 @@ def task_execute(request, task_id):
 
         # --- Ищем последнюю задачу на проверку выполнения ---
         last_review = (
-            Task.objects.filter(
-                card=task.card,
+            task.review_tasks.filter(
                 task_type="review",
                 assigned_employee=task.created_by,
-                description__icontains=f"[orig_task_id:{task.id}]"
             )
             .order_by("-created_at")
             .first()
@@ -351,11 +316,11 @@ def task_execute(request, task_id):
             review_task = Task.objects.create(
                 title=f"Проверить выполнение задачи «{task.title}»",
                 description=(
-                    f"[orig_task_id:{task.id}]\n"
                     f"Исполнитель {employee.user.get_full_name() or employee.user.username} "
                     f"отправил материалы на согласование.\n\n{description or ''}"
                 ),
                 card=task.card,
+                reviews_task=task,
                 assigned_employee=task.created_by,
                 created_by=employee,
                 task_type="review",
@@ -372,7 +337,6 @@ def task_execute(request, task_id):
         else:
             # --- Если review ещё не завершена — просто обновляем её ---
             last_review.description = (
-                f"[orig_task_id:{task.id}]\n"
                 f"Исполнитель обновил выполнение задачи.\n\n{description or last_review.description}"
             )
             last_review.status = "new"
@@ -397,9 +361,6 @@ def task_execute(request, task_id):
     return render(request, "tasks/task_execute.html", {"task": task})
 
 
-
-import re
-
 @login_required
 def task_review(request, task_id):
     """
@@ -407,11 +368,11 @@ def task_review(request, task_id):
     Проверяющий видит только последние файлы/ссылки исполнителя,
     прикреплённые при последней отправке на согласование.
     """
-    review_task = get_object_or_404(Task, id=task_id)
+    review_task = get_object_or_404(Task.objects.select_related("reviews_task"), id=task_id)
     reviewer = request.user.employee
 
     # 🔒 Проверка доступа
-    if review_task.assigned_employee != reviewer and reviewer.role not in ("director", "deputy"):
+    if not get_policy(request, reviewer).can("task.review", review_task):
         messages.error(request, "У вас нет доступа к этой задаче.")
         return redirect("task_list")
 
@@ -419,24 +380,8 @@ def task_review(request, task_id):
         messages.error(request, "Это не задача на согласование исполнения.")
         return redirect("task_detail", task_id=review_task.id)
 
-    # --- Ищем исходную задачу по маркеру ---
-    base_task = None
-    if review_task.description:
-        m = re.search(r"\[orig_task_id\s*:\s*(\d+)\]", review_task.description)
-        if m:
-            try:
-                base_task = Task.objects.filter(id=int(m.group(1))).first()
-            except ValueError:
-                base_task = None
-
-    # --- Если не нашли по маркеру, fallback по названию ---
-    if not base_task:
-        trimmed = review_task.title.replace("Проверить выполнение задачи", "").strip(" «»\"'")
-        if trimmed:
-            base_task = Task.objects.filter(
-                card=review_task.card,
-                title__icontains=trimmed
-            ).exclude(id=review_task.id).order_by("-created_at").first()
+    # --- Исходная задача ---
+    base_task = review_task.reviews_task
 
     # --- Собираем данные для шаблона ---
     attachments = []
@@ -474,7 +419,7 @@ def task_review(request, task_id):
 @transaction.atomic
 def task_review_take(request, task_id):
     """Проверяющий берёт задачу на проверку."""
-    review_task = get_object_or_404(Task, id=task_id)
+    review_task = get_object_or_404(Task.objects.select_related("reviews_task"), id=task_id)
     reviewer = request.user.employee
 
     # Проверяем тип задачи
@@ -483,15 +428,12 @@ def task_review_take(request, task_id):
         return redirect("task_list")
 
     # Проверяем, что это его задача
-    if review_task.assigned_employee != reviewer:
+    if not get_policy(request, reviewer).can("task.review_take", review_task):
         messages.error(request, "Вы не можете взять эту задачу в работу.")
         return redirect("task_list")
 
     # Находим исходную задачу
-    base_task = None
-    m = re.search(r"\[orig_task_id\s*:\s*(\d+)\]", review_task.description or "")
-    if m:
-        base_task = Task.objects.filter(id=int(m.group(1))).first()
+    base_task = review_task.reviews_task
 
     # Обновляем статусы
     review_task.status = "in_progress"
@@ -510,14 +452,15 @@ def task_review_take(request, task_id):
 @transaction.atomic
 def task_review_approve(request, task_id):
     """Проверяющий утверждает выполнение задачи."""
-    review_task = get_object_or_404(Task, id=task_id)
+    review_task = get_object_or_404(Task.objects.select_related("reviews_task"), id=task_id)
     reviewer = request.user.employee
 
+    if review_task.task_type != "review" or not get_policy(request, reviewer).can("task.review_decide", review_task):
+        messages.error(request, "Вы не можете утвердить эту задачу.")
+        return redirect("task_list")
+
     # Поиск исходной задачи
-    base_task = None
-    m = re.search(r"\[orig_task_id\s*:\s*(\d+)\]", review_task.description or "")
-    if m:
-        base_task = Task.objects.filter(id=int(m.group(1))).first()
+    base_task = review_task.reviews_task
 
     comment = request.POST.get("comment", "").strip()
 
@@ -532,11 +475,11 @@ def task_review_approve(request, task_id):
         base_task.save(update_fields=["status", "review_comment"])
         TaskHistory.objects.create(task=base_task, employee=reviewer, action="approved", comment=comment or "Задача согласована и завершена.")
 
-    notify(
-        base_task.assigned_employee.user,
-        f"Задача «{base_task.title}» утверждена",
-        base_task.get_absolute_url()
-    )
+        notify(
+            base_task.assigned_employee.user,
+            f"Задача «{base_task.title}» утверждена",
+            base_task.get_absolute_url()
+        )
 
     messages.success(request, "Задача утверждена и отмечена как выполненная ✅")
     return redirect("task_list")
@@ -545,14 +488,15 @@ def task_review_approve(request, task_id):
 @transaction.atomic
 def task_review_reject(request, task_id):
     """Проверяющий возвращает задачу исполнителю на доработку."""
-    review_task = get_object_or_404(Task, id=task_id)
+    review_task = get_object_or_404(Task.objects.select_related("reviews_task"), id=task_id)
     reviewer = request.user.employee
 
+    if review_task.task_type != "review" or not get_policy(request, reviewer).can("task.review_decide", review_task):
+        messages.error(request, "Вы не можете вернуть эту задачу на доработку.")
+        return redirect("task_list")
+
     # Ищем исходную задачу
-    base_task = None
-    m = re.search(r"\[orig_task_id\s*:\s*(\d+)\]", review_task.description or "")
-    if m:
-        base_task = Task.objects.filter(id=int(m.group(1))).first()
+    base_task = review_task.reviews_task
 
     comment = request.POST.get("comment", "").strip()
 
@@ -740,13 +684,14 @@ def reject_plan(request, task_id):
 def send_plan_again(request, card_id):
     card = get_object_or_404(EventCard, id=card_id)
     emp = request.user.employee
-    if card.created_by != emp:
+    if not get_policy(request, emp).can("card.resend_plan", card):
         messages.error(request, "Вы не являетесь создателем карточки.")
         return redirect("card_detail", card_id=card.id)
 
     if request.method == "POST":
         new_file = request.FILES.get("plan_file")
 
+        old_plan = card.plan_file.name
         if new_file:
             card.plan_file = new_file
 
@@ -754,6 +699,9 @@ def send_plan_again(request, card_id):
         card.visible = False
         card.current_approver_index = 0
         card.save()
+        if card.plan_file.name != old_plan:
+            # старый план удалится, если на него больше никто не ссылается
+            release_file(old_plan)
         # Первый согласующий
         first_rel = card.cardapproverorder_set.order_by("order").first()
         if first_rel:
@@ -833,7 +781,7 @@ def complete_task(request, task_id):
 @login_required
 def notifications_list(request):
     notes = request.user.notifications.order_by("-created_at")
-    unread_count = notes.filter(is_read=False).count()
+    unread_count = get_unread_summary(request.user.pk)["unread"]
     return render(request, "notifications/list.html", {
         "notes": notes,
         "unread_count": unread_count
@@ -843,8 +791,7 @@ def notifications_list(request):
 @login_required
 def notification_read(request, note_id):
     n = get_object_or_404(Notification, id=note_id, user=request.user)
-    n.is_read = True
-    n.save(update_fields=["is_read"])
+    mark_read(n)
 
     if n.url:
         return redirect(n.url)
@@ -853,5 +800,5 @@ def notification_read(request, note_id):
 
 @login_required
 def notifications_read_all(request):
-    request.user.notifications.filter(is_read=False).update(is_read=True)
+    mark_all_read(request.user)
     return redirect("notifications")